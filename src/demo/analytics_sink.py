@@ -0,0 +1,328 @@
+"""
+Buffered analytics log writer with rotation and compression
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import shutil
+import atexit
+import asyncio
+import logging
+import threading
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from config import (
+    ANALYTICS_LOG_FILE, ANALYTICS_QUEUE_SIZE, ANALYTICS_OVERFLOW, ANALYTICS_BLOCK_TIMEOUT,
+    ANALYTICS_BATCH_SIZE, ANALYTICS_FLUSH_INTERVAL, ANALYTICS_MAX_BYTES, ANALYTICS_ROTATE_DAILY,
+    ANALYTICS_COMPRESSION, ANALYTICS_FSYNC
+)
+
+try:
+    import zstandard
+except ImportError:  # Optional; segments are gzipped instead
+    zstandard = None
+
+# File suffix of rotated segments for each compression
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+_STOP = object()
+
+
+def segment_pattern(path: str) -> "re.Pattern":
+    """Regex matching the rotated segments of a log: <log>.<YYYYMMDD>.<n>[.gz|.zst]"""
+    return re.compile(re.escape(os.path.basename(path)) + r"\.(\d{8})\.(\d+)(\.gz|\.zst)?$")
+
+
+def list_segments(path: str) -> List[str]:
+    """Rotated, fully written segments of a log, oldest first (in-progress compressions are skipped)"""
+    directory = os.path.dirname(path) or "."
+    pattern = segment_pattern(path)
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = pattern.match(name)
+        if match:
+            found.append((match.group(1), int(match.group(2)), name))
+    names = {name for _, _, name in found}
+    return [
+        os.path.join(directory, name) for day, seq, name in sorted(found)
+        # While a segment is compressed both files exist; the plain one is authoritative until then
+        if not (name.endswith((".gz", ".zst")) and name.rsplit(".", 1)[0] in names)
+    ]
+
+
+def compress_segment(path: str, compression: str) -> str:
+    """
+    Compress a rotated segment and remove the original
+
+    The compressed copy is written under a temporary name and renamed, so
+    a reader never sees a partial file.
+
+    Returns:
+        Path of the compressed segment (the original path for "none")
+    """
+    if compression == "none":
+        return path
+    target = path + COMPRESSION_SUFFIXES[compression]
+    temporary = target + ".tmp"
+    with open(path, "rb") as source:
+        if compression == "zstd":
+            with open(temporary, "wb") as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw) as compressed:
+                    shutil.copyfileobj(source, compressed)
+        else:
+            with gzip.open(temporary, "wb", compresslevel=6) as compressed:
+                shutil.copyfileobj(source, compressed)
+    os.replace(temporary, target)
+    os.remove(path)
+    return target
+
+
+class AnalyticsSink:
+    """
+    Queues analytics events in memory and appends them to a JSONL log off the request path.
+
+    emit() only puts the event on a bounded queue. A writer thread takes
+    events off the queue, serializes them and appends each batch with a
+    single write, flushing once a batch is full or the oldest waiting
+    event has waited the flush interval. When the queue is full, events
+    are dropped and counted (or, with the "block" overflow policy, the
+    caller waits briefly first; async callers wait through emit_async so
+    the event loop is never held up).
+
+    The log is rotated to <log>.<YYYYMMDD>.<n> when it reaches the size
+    limit or the day changes, and rotated segments are compressed in a
+    separate thread so writing continues meanwhile. If another worker
+    process rotates the shared log, the writer notices the file was
+    replaced and reopens it. close() writes whatever is queued and fsyncs
+    the log; it also runs at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        path: str = ANALYTICS_LOG_FILE,
+        queue_size: int = ANALYTICS_QUEUE_SIZE,
+        overflow: str = ANALYTICS_OVERFLOW,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        flush_interval: float = ANALYTICS_FLUSH_INTERVAL,
+        max_bytes: int = ANALYTICS_MAX_BYTES,
+        rotate_daily: bool = ANALYTICS_ROTATE_DAILY,
+        compression: str = ANALYTICS_COMPRESSION,
+        fsync: bool = ANALYTICS_FSYNC
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        if compression == "zstd" and zstandard is None:
+            self.logger.warning("zstandard is not installed; compressing analytics segments with gzip")
+            compression = "gzip"
+        self.compression = compression
+        self.fsync = fsync
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._compressor: Optional[ThreadPoolExecutor] = None
+        self._file = None
+        self._day: Optional[date] = None
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._counts = {"enqueued": 0, "dropped": 0, "blocked": 0, "written": 0, "batches": 0,
+                        "rotations": 0, "reopened": 0, "errors": 0}
+
+    def start(self) -> None:
+        """Start the writer thread (emit starts it on first use)"""
+        with self._start_lock:
+            if self._thread is not None or self._closed:
+                return
+            self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics-compress")
+            self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def emit(self, event: Dict[str, Any]) -> bool:
+        """
+        Queue an event for writing
+
+        With the "block" overflow policy this may wait for space in the
+        queue, so coroutines must use emit_async instead.
+
+        Args:
+            event: JSON-serializable record; it must not be changed afterwards
+
+        Returns:
+            False if the event was dropped because the queue is full or the sink is closed
+        """
+        queued = self._offer(event)
+        return self._put_waiting(event) if queued is None else queued
+
+    async def emit_async(self, event: Dict[str, Any]) -> bool:
+        """
+        Queue an event for writing from a coroutine
+
+        A wait for space under the "block" overflow policy runs in a worker
+        thread, so the event loop keeps serving other requests meanwhile.
+
+        Args:
+            event: JSON-serializable record; it must not be changed afterwards
+
+        Returns:
+            False if the event was dropped because the queue is full or the sink is closed
+        """
+        queued = self._offer(event)
+        return await asyncio.to_thread(self._put_waiting, event) if queued is None else queued
+
+    def _offer(self, event: Dict[str, Any]) -> Optional[bool]:
+        """Queue an event without waiting; None when the "block" policy has to wait for space"""
+        if self._closed:
+            self._count("dropped")
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow != "block":
+                self._count("dropped")
+                return False
+            return None
+        self._count("enqueued")
+        return True
+
+    def _put_waiting(self, event: Dict[str, Any]) -> bool:
+        self._count("blocked")
+        try:
+            self._queue.put(event, timeout=ANALYTICS_BLOCK_TIMEOUT)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write every queued event, fsync the log and wait for pending compressions"""
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._compressor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while True:
+            event = self._queue.get()
+            batch = [event]
+            if event is not _STOP:
+                # Collect more until the batch is full or the flush interval has passed
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            stopping = batch[-1] is _STOP
+            events = batch[:-1] if stopping else batch
+            if events:
+                self._write(events)
+            if stopping:
+                self._close_file()
+                return
+
+    def _write(self, events: List[Dict[str, Any]]) -> None:
+        lines = []
+        for event in events:
+            try:
+                lines.append(json.dumps(event, default=str))
+            except (TypeError, ValueError) as e:
+                self._count("errors")
+                self.logger.error(f"Dropping unserializable analytics event: {str(e)}")
+        data = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+        try:
+            self._open_for(datetime.now().date())
+            if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+                self._rotate()
+                self._open_for(datetime.now().date())
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._count("written", len(lines))
+            self._count("batches")
+        except OSError as e:
+            self._count("errors")
+            self.logger.error(f"Error writing analytics batch: {str(e)}")
+
+    def _open_for(self, today: date) -> None:
+        """Open the log, reopening it if another process rotated it and rotating it on a new day"""
+        if self._file is not None:
+            try:
+                replaced = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                self._count("reopened")
+                self._close_file()
+        if self._file is None:
+            self._file = open(self.path, "ab", buffering=0)
+            size = self._file.tell()
+            self._day = datetime.fromtimestamp(os.fstat(self._file.fileno()).st_mtime).date() if size else today
+        if self.rotate_daily and self._day != today and self._file.tell():
+            self._rotate()
+            self._open_for(today)
+
+    def _rotate(self) -> None:
+        """Rename the log to the next free segment name and queue it for compression"""
+        day = (self._day or datetime.now().date()).strftime("%Y%m%d")
+        self._close_file()
+        sequence = 1 + max(
+            (int(match.group(2)) for name in os.listdir(os.path.dirname(self.path) or ".")
+             for match in [segment_pattern(self.path).match(name)] if match and match.group(1) == day),
+            default=0
+        )
+        segment = f"{self.path}.{day}.{sequence}"
+        try:
+            os.rename(self.path, segment)
+        except FileNotFoundError:
+            return  # Another process rotated it first
+        self._count("rotations")
+        if self.compression != "none":
+            self._compressor.submit(self._compress, segment)
+
+    def _compress(self, segment: str) -> None:
+        try:
+            compress_segment(segment, self.compression)
+        except OSError as e:
+            self._count("errors")
+            self.logger.error(f"Error compressing analytics segment {segment}: {str(e)}")
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        try:
+            os.fsync(self._file.fileno())
+        except OSError:
+            pass
+        self._file.close()
+        self._file = None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._counts[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """Get event counters and the current queue depth"""
+        with self._stats_lock:
+            counts = dict(self._counts)
+        return {**counts, "queued": self._queue.qsize(), "compression": self.compression}
@@ -0,0 +1,352 @@
+"""
+Day-partitioned columnar store compacted from rotated analytics log segments
+"""
+
+import os
+import gzip
+import json
+import shutil
+import logging
+import threading
+from datetime import date, datetime
+from collections import Counter
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+import numpy as np
+from analytics_sink import list_segments
+from intent_matcher import IntentMatcher
+from config import ANALYTICS_LOG_FILE, ANALYTICS_STORE_DIR
+
+try:
+    import zstandard
+except ImportError:  # Optional; .zst segments can't be read without it
+    zstandard = None
+
+# Column name -> kind. "category" columns are dictionary encoded, "text"
+# columns are stored as offsets into one UTF-8 blob.
+SCHEMA = {
+    "timestamp": "timestamp",
+    "conversation_id": "category",
+    "brand": "category",
+    "intent": "category",
+    "user_agent": "category",
+    "input_tokens": "int",
+    "output_tokens": "int",
+    "cache_read_input_tokens": "int",
+    "cache_creation_input_tokens": "int",
+    "user_message": "text",
+    "assistant_response": "text"
+}
+
+TOKEN_COLUMNS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+MANIFEST = "_manifest.json"
+
+
+def _open_segment(path: str):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise OSError(f"zstandard is not installed; can't read {path}")
+        return zstandard.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def event_row(entry: Dict[str, Any], matcher: Optional[IntentMatcher] = None) -> Dict[str, Any]:
+    """
+    Typed column values for one log entry
+
+    Brand and intent come from the entry's metadata when it has them and
+    are otherwise extracted from the user message with the intent matcher.
+    """
+    metadata = entry.get("metadata") or {}
+    usage = metadata.get("usage") or {}
+    brand, intent = metadata.get("brand"), metadata.get("intent")
+    if matcher is not None and (brand is None or intent is None):
+        matched = matcher.match(entry.get("user_message") or "")
+        brand = brand or matched.make
+        intent = intent or matched.intent
+    row = {
+        "timestamp": datetime.fromisoformat(entry["timestamp"]),
+        "conversation_id": metadata.get("conversation_id"),
+        "brand": brand,
+        "intent": intent,
+        "user_agent": metadata.get("user_agent"),
+        "user_message": entry.get("user_message") or "",
+        "assistant_response": entry.get("assistant_response") or ""
+    }
+    for column in TOKEN_COLUMNS:
+        row[column] = int(usage.get(column) or 0)
+    return row
+
+
+def write_part(directory: str, rows: List[Dict[str, Any]], source: str) -> None:
+    """
+    Write rows as one columnar part directory, replacing any earlier copy
+
+    The part is written under a temporary name and renamed into place, so
+    readers see either the whole part or none of it.
+    """
+    temporary = directory + ".tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for column, kind in SCHEMA.items():
+        values = [row[column] for row in rows]
+        target = os.path.join(temporary, column)
+        if kind == "timestamp":
+            np.save(target + ".npy", np.array(values, dtype="datetime64[us]"))
+        elif kind == "int":
+            np.save(target + ".npy", np.array(values, dtype=np.int64))
+        elif kind == "category":
+            dictionary: Dict[Any, int] = {}
+            codes = np.array(
+                [-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values],
+                dtype=np.int32
+            )
+            np.save(target + ".npy", codes)
+            with open(target + ".dict.json", "w") as f:
+                json.dump(list(dictionary), f)
+        else:
+            encoded = [value.encode("utf-8") for value in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            np.save(target + ".npy", offsets)
+            with open(target + ".bin", "wb") as f:
+                f.write(b"".join(encoded))
+    with open(os.path.join(temporary, "_meta.json"), "w") as f:
+        json.dump({"rows": len(rows), "source": source, "schema": SCHEMA}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temporary, directory)
+
+
+class AnalyticsStore:
+    """
+    Columnar, day-partitioned copy of the analytics log.
+
+    compact() turns each rotated (closed) log segment into one part per
+    day under <root>/day=YYYY-MM-DD/part-<segment>/, with one file per
+    column: timestamps, token counts, dictionary-encoded categories
+    (conversation, brand, intent, user agent) and UTF-8 text blobs with
+    offsets. A manifest records which segments were compacted, so a run
+    only reads new segments, and re-running one (say, after a crash
+    before the manifest was saved) rewrites the same parts.
+
+    Queries prune partitions by directory name and load only the columns
+    they use, memory-mapped; counts over a category column are bincounts
+    of its codes, so rows are never decoded or parsed as JSON.
+    """
+
+    def __init__(
+        self,
+        root: str = ANALYTICS_STORE_DIR,
+        log_path: str = ANALYTICS_LOG_FILE,
+        matcher: Optional[IntentMatcher] = None
+    ):
+        """
+        Args:
+            root: Directory holding the partitions
+            log_path: Active analytics log; its rotated segments are compacted
+            matcher: Intent matcher used for entries logged without brand and intent
+        """
+        self.logger = logging.getLogger(__name__)
+        self.root = root
+        self.log_path = log_path
+        self.matcher = matcher
+        self._lock = threading.Lock()
+
+    def _manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.root, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"segments": {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Compact rotated segments not compacted yet
+
+        A segment is identified by its name without the compression
+        suffix, so compressing it after it was compacted doesn't make it
+        new again.
+
+        Returns:
+            Counts of segments compacted and skipped, rows written and
+            unreadable lines
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            manifest = self._manifest()
+            counts = {"segments": 0, "skipped": 0, "rows": 0, "bad_lines": 0}
+            for path in list_segments(self.log_path):
+                name = os.path.basename(path)
+                segment = name.rsplit(".", 1)[0] if name.endswith((".gz", ".zst")) else name
+                if segment in manifest["segments"]:
+                    counts["skipped"] += 1
+                    continue
+                try:
+                    days, bad_lines = self._read_segment(path)
+                except OSError as e:
+                    self.logger.error(f"Error reading analytics segment {path}: {str(e)}")
+                    continue
+                for day, rows in days.items():
+                    write_part(os.path.join(self.root, f"day={day}", f"part-{segment}"), rows, name)
+                manifest["segments"][segment] = {
+                    "rows": sum(len(rows) for rows in days.values()),
+                    "days": sorted(days),
+                    "bad_lines": bad_lines
+                }
+                self._save_manifest(manifest)
+                counts["segments"] += 1
+                counts["rows"] += manifest["segments"][segment]["rows"]
+                counts["bad_lines"] += bad_lines
+            return counts
+
+    def _read_segment(self, path: str) -> Tuple[Dict[str, List[Dict[str, Any]]], int]:
+        """Rows of a segment grouped by the day of their timestamp"""
+        days: Dict[str, List[Dict[str, Any]]] = {}
+        bad_lines = 0
+        with _open_segment(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = event_row(json.loads(line), self.matcher)
+                except (ValueError, KeyError, TypeError):
+                    bad_lines += 1
+                    continue
+                days.setdefault(row["timestamp"].date().isoformat(), []).append(row)
+        return days, bad_lines
+
+    def days(self, start: Optional[date] = None, end: Optional[date] = None) -> List[str]:
+        """Partition days from start to end inclusive, from directory names only"""
+        if not os.path.isdir(self.root):
+            return []
+        found = sorted(name[4:] for name in os.listdir(self.root) if name.startswith("day="))
+        return [
+            day for day in found
+            if (start is None or day >= start.isoformat()) and (end is None or day <= end.isoformat())
+        ]
+
+    def _parts(self, start: Optional[date], end: Optional[date]) -> Iterable[Tuple[str, str]]:
+        for day in self.days(start, end):
+            directory = os.path.join(self.root, f"day={day}")
+            for name in sorted(os.listdir(directory)):
+                if name.startswith("part-") and not name.endswith(".tmp"):
+                    yield day, os.path.join(directory, name)
+
+    @staticmethod
+    def _column(part: str, column: str) -> np.ndarray:
+        return np.load(os.path.join(part, column + ".npy"), mmap_mode="r")
+
+    @staticmethod
+    def _dictionary(part: str, column: str) -> List[Any]:
+        with open(os.path.join(part, column + ".dict.json")) as f:
+            return json.load(f)
+
+    def read(self, columns: List[str], start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """
+        Load columns for the days from start to end
+
+        Args:
+            columns: Column names from SCHEMA
+            start, end: Inclusive day range (None for open-ended)
+
+        Returns:
+            {column: array}; category and text columns come back as object
+            arrays of decoded values (None for missing categories)
+        """
+        unknown = set(columns) - set(SCHEMA)
+        if unknown:
+            raise ValueError(f"Unknown analytics columns: {', '.join(sorted(unknown))}")
+        pieces: Dict[str, List[np.ndarray]] = {column: [] for column in columns}
+        for _, part in self._parts(start, end):
+            for column in columns:
+                kind = SCHEMA[column]
+                values = self._column(part, column)
+                if kind == "category":
+                    dictionary = np.array(self._dictionary(part, column) + [None], dtype=object)
+                    values = dictionary[values]  # code -1 picks the trailing None
+                elif kind == "text":
+                    with open(os.path.join(part, column + ".bin"), "rb") as f:
+                        blob = f.read()
+                    values = np.array(
+                        [blob[a:b].decode("utf-8") for a, b in zip(values[:-1], values[1:])], dtype=object
+                    )
+                pieces[column].append(np.asarray(values))
+        return {
+            column: np.concatenate(arrays) if arrays else np.array([], dtype=object)
+            for column, arrays in pieces.items()
+        }
+
+    def count_by(self, column: str, start: Optional[date] = None, end: Optional[date] = None) -> Dict[Any, int]:
+        """Rows per value of a category column, most common first (missing values are not counted)"""
+        if SCHEMA.get(column) != "category":
+            raise ValueError(f"{column} is not a category column")
+        totals: Counter = Counter()
+        for _, part in self._parts(start, end):
+            codes = self._column(part, column)
+            counts = np.bincount(codes[codes >= 0])
+            for value, count in zip(self._dictionary(part, column), counts):
+                if count:
+                    totals[value] += int(count)
+        return dict(totals.most_common())
+
+    def token_usage(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        by: Optional[str] = None
+    ) -> Dict[Any, Dict[str, int]]:
+        """
+        Token totals, overall or per value of a category column
+
+        Returns:
+            {group: {token column: total}}; the group is "all" without by
+        """
+        if by is not None and SCHEMA.get(by) != "category":
+            raise ValueError(f"{by} is not a category column")
+        totals: Dict[Any, Counter] = {}
+        for _, part in self._parts(start, end):
+            if by is None:
+                group = totals.setdefault("all", Counter())
+                for column in TOKEN_COLUMNS:
+                    group[column] += int(self._column(part, column).sum())
+                continue
+            codes = self._column(part, by)
+            dictionary = self._dictionary(part, by)
+            known = codes >= 0
+            for column in TOKEN_COLUMNS:
+                sums = np.bincount(codes[known], weights=self._column(part, column)[known], minlength=len(dictionary))
+                for value, total in zip(dictionary, sums):
+                    if total:
+                        totals.setdefault(value, Counter())[column] += int(total)
+        return {group: dict(counts) for group, counts in totals.items()}
+
+    def daily(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Dict[str, int]]:
+        """Messages and distinct conversations per day"""
+        result = {}
+        for day in self.days(start, end):
+            messages = 0
+            conversations = set()
+            for _, part in self._parts(date.fromisoformat(day), date.fromisoformat(day)):
+                codes = self._column(part, "conversation_id")
+                messages += len(codes)
+                dictionary = self._dictionary(part, "conversation_id")
+                conversations.update(dictionary[code] for code in np.unique(codes[codes >= 0]))
+            result[day] = {"messages": messages, "conversations": len(conversations)}
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get compacted segment, row and partition counts"""
+        segments = self._manifest()["segments"]
+        return {
+            "segments": len(segments),
+            "rows": sum(entry["rows"] for entry in segments.values()),
+            "days": len(self.days())
+        }
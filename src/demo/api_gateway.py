@@ -2,21 +2,65 @@
 API Gateway to manage multiple data sources
 """
 
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Awaitable, Callable, Optional, Set
 from datetime import datetime
+from http_pool import session_registry
+from circuit_breaker import breaker_registry, CircuitOpenError
+from singleflight import singleflight_registry, flight_key
+from spec_cache import SpecCache, spec_key, STALE
+from config import SPEC_PREWARM_CONCURRENCY, INVENTORY_API_URL
 
 class APIGateway:
     """Gateway for managing multiple API endpoints"""
     
-    def __init__(self):
+    # Result name -> upstream name for each vehicle data source
+    VEHICLE_SOURCES = {
+        "inventory": "inventory",
+        "specs": "car",
+        "safety": "nhtsa"
+    }
+    
+    # Sources backed by the persistent spec cache
+    CACHED_SOURCES = ("specs", "safety")
+    
+    def __init__(self, spec_cache: Optional[SpecCache] = None):
         self.logger = logging.getLogger(__name__)
         self.base_urls = {
-            "inventory": "http://localhost:5001",  # Inventory DB API
+            "inventory": INVENTORY_API_URL,  # Inventory service (inventory_service.py)
             "car": "https://car-api.example.com",  # CarAPI
             "nhtsa": "https://api.nhtsa.gov"       # NHTSA API
         }
+        self.spec_cache = spec_cache if spec_cache is not None else SpecCache()
+        # Background revalidations in flight, by cache key
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        
+    def vehicle_sources(self, query: Dict[str, Any]) -> Dict[str, Awaitable[Dict[str, Any]]]:
+        """
+        Build one request per healthy vehicle data source, without awaiting them
+        
+        Sources whose circuit breaker is open are left out so no time is
+        spent on an upstream that is known to be failing, unless the spec
+        cache can still answer for them.
+        
+        Args:
+            query: Search parameters like make, model, year
+            
+        Returns:
+            Coroutines keyed by result name ("inventory", "specs", "safety")
+        """
+        fetchers = {
+            "inventory": self.get_inventory_data,
+            "specs": self.get_car_specs,
+            "safety": self.get_safety_ratings
+        }
+        return {
+            name: fetchers[name](session_registry.get(upstream), query)
+            for name, upstream in self.VEHICLE_SOURCES.items()
+            if breaker_registry.get(upstream).available() or self._is_cached(name, query)
+        }
         
     async def get_vehicle_data(self, query: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -28,22 +72,16 @@ class APIGateway:
         Returns:
             Combined data from all sources
         """
-        results = {}
-        
-        async with aiohttp.ClientSession() as session:
-            # Get data concurrently from all sources
-            tasks = [
-                self.get_inventory_data(session, query),
-                self.get_car_specs(session, query),
-                self.get_safety_ratings(session, query)
-            ]
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Combine results
-            results["inventory"] = responses[0] if not isinstance(responses[0], Exception) else {}
-            results["specs"] = responses[1] if not isinstance(responses[1], Exception) else {}
-            results["safety"] = responses[2] if not isinstance(responses[2], Exception) else {}
-            
+        sources = self.vehicle_sources(query)
+        
+        # Get data concurrently from all sources over the shared pooled sessions
+        responses = await asyncio.gather(*sources.values(), return_exceptions=True)
+        
+        # Combine results; failed and skipped sources are empty
+        results = {name: {} for name in self.VEHICLE_SOURCES}
+        for name, response in zip(sources, responses):
+            if not isinstance(response, Exception):
+                results[name] = response
         return results
         
     async def get_inventory_data(
@@ -52,53 +90,193 @@ class APIGateway:
         query: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Get current inventory data"""
-        try:
-            async with session.get(
-                f"{self.base_urls['inventory']}/vehicles",
-                params=query
-            ) as response:
-                return await response.json()
-        except Exception as e:
-            self.logger.error(f"Inventory API error: {str(e)}")
-            return {}
+        return await self._get_json("inventory", session, "/vehicles", query)
             
     async def get_car_specs(
         self,
         session: aiohttp.ClientSession,
         query: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Get vehicle specifications"""
-        try:
-            async with session.get(
-                f"{self.base_urls['car']}/specs",
-                params=query
-            ) as response:
-                return await response.json()
-        except Exception as e:
-            self.logger.error(f"CarAPI error: {str(e)}")
-            return {}
+        """Get vehicle specifications (served from the spec cache when possible)"""
+        return await self._cached(
+            self._cache_key("specs", query),
+            lambda: self._fetch_car_specs(session, query)
+        )
             
     async def get_safety_ratings(
         self,
         session: aiohttp.ClientSession,
         query: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Get NHTSA safety ratings"""
-        try:
-            make = query.get("make", "")
-            model = query.get("model", "")
-            year = query.get("year", datetime.now().year)
+        """Get NHTSA safety ratings (served from the spec cache when possible)"""
+        return await self._cached(
+            self._cache_key("safety", query),
+            lambda: self._fetch_safety_ratings(session, query)
+        )
+        
+    async def _fetch_car_specs(self, session: aiohttp.ClientSession, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch specifications from CarAPI"""
+        params = {key: query[key] for key in ("make", "model", "year") if query.get(key)}
+        return await self._get_json("car", session, "/specs", params)
+        
+    async def _fetch_safety_ratings(self, session: aiohttp.ClientSession, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch safety ratings from NHTSA"""
+        return await self._get_json("nhtsa", session, "/api/SafetyRatings", {
+            "make": query.get("make", ""),
+            "model": query.get("model", ""),
+            "modelYear": query.get("year") or datetime.now().year,
+            "format": "json"
+        })
+        
+    def _cache_key(self, kind: str, query: Dict[str, Any]) -> Optional[str]:
+        """Spec cache key for a query, or None if it does not name a specific model"""
+        if not (query.get("make") and query.get("model")):
+            return None
+        # NHTSA ratings are per model year and default to the current one
+        year = query.get("year") or (datetime.now().year if kind == "safety" else None)
+        return spec_key(kind, query["make"], query["model"], year)
+        
+    def _is_cached(self, name: str, query: Dict[str, Any]) -> bool:
+        key = self._cache_key(name, query) if name in self.CACHED_SOURCES else None
+        return key is not None and key in self.spec_cache
+        
+    async def _cached(
+        self,
+        key: Optional[str],
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Stale-while-revalidate lookup in the persistent spec cache
+        
+        Fresh entries are returned directly. Stale entries are returned
+        immediately while a background task refreshes them. Misses are
+        fetched and stored.
+        
+        Args:
+            key: Spec cache key, or None to bypass the cache
+            fetch: Coroutine function fetching the value from the upstream
+            
+        Returns:
+            Cached or freshly fetched value
+        """
+        if key is None:
+            return await fetch()
+        
+        cached = self.spec_cache.get(key)
+        if cached is not None:
+            value, freshness = cached
+            if freshness == STALE:
+                self._revalidate(key, fetch)
+            return value
+        
+        value = await fetch()
+        if value:
+            self.spec_cache.set(key, value)
+        return value
+        
+    def _revalidate(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        """Refresh a stale entry in the background, once per key at a time"""
+        if key in self._refreshing:
+            return
+        
+        async def refresh():
+            try:
+                value = await fetch()
+                if value:
+                    self.spec_cache.set(key, value)
+            except Exception as e:
+                self.logger.warning(f"Background refresh of {key} failed: {str(e)}")
+            finally:
+                self._refreshing.pop(key, None)
+        
+        # The task is held here so it is not garbage collected or cancelled with the request
+        self._refreshing[key] = asyncio.ensure_future(refresh())
+        
+    async def prewarm_specs(self, vehicles: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Fetch and store specs and safety ratings for a list of vehicles
+        
+        Existing entries are refreshed. Requests run with bounded concurrency
+        so a large inventory does not flood the upstreams.
+        
+        Args:
+            vehicles: Vehicle records with make, model and year (e.g. InventoryDB.get_inventory())
+            
+        Returns:
+            Counts of unique vehicles, stored entries and failures
+        """
+        queries = {}
+        for vehicle in vehicles:
+            query = {"make": vehicle["make"], "model": vehicle["model"], "year": vehicle.get("year")}
+            queries[spec_key("vehicle", query["make"], query["model"], query["year"])] = query
+        
+        semaphore = asyncio.Semaphore(SPEC_PREWARM_CONCURRENCY)
+        fetchers = {
+            "specs": (self._fetch_car_specs, "car"),
+            "safety": (self._fetch_safety_ratings, "nhtsa")
+        }
+        
+        async def warm(kind: str, query: Dict[str, Any]) -> bool:
+            fetch, upstream = fetchers[kind]
+            async with semaphore:
+                try:
+                    value = await fetch(session_registry.get(upstream), query)
+                except Exception:
+                    return False
+                if value:
+                    self.spec_cache.set(self._cache_key(kind, query), value)
+                return bool(value)
+        
+        results = await asyncio.gather(*(
+            warm(kind, query) for query in queries.values() for kind in self.CACHED_SOURCES
+        ))
+        return {
+            "vehicles": len(queries),
+            "stored": sum(results),
+            "failed": len(results) - sum(results)
+        }
+        
+    async def _get_json(
+        self,
+        upstream: str,
+        session: aiohttp.ClientSession,
+        path: str,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        GET a JSON document through the upstream's circuit breaker
+        
+        Identical concurrent requests share one upstream call.
+        
+        Args:
+            upstream: Upstream name (key of base_urls, HTTP_TIMEOUTS and the breaker)
+            session: Pooled session for the upstream, carrying its timeouts
+            path: Request path
+            params: Query parameters
+            
+        Returns:
+            Decoded JSON response
             
-            async with session.get(
-                f"{self.base_urls['nhtsa']}/api/SafetyRatings",
-                params={
-                    "make": make,
-                    "model": model,
-                    "modelYear": year,
-                    "format": "json"
-                }
-            ) as response:
+        Raises:
+            CircuitOpenError: If the upstream's breaker is open
+            aiohttp.ClientError, asyncio.TimeoutError: On request failure
+        """
+        async def fetch() -> Dict[str, Any]:
+            async with session.get(f"{self.base_urls[upstream]}{path}", params=params) as response:
+                response.raise_for_status()
                 return await response.json()
-        except Exception as e:
-            self.logger.error(f"NHTSA API error: {str(e)}")
-            return {}
\ No newline at end of file
+        
+        async def call() -> Dict[str, Any]:
+            try:
+                return await breaker_registry.get(upstream).call(fetch)
+            except CircuitOpenError:
+                raise
+            except asyncio.TimeoutError:
+                self.logger.error(f"{upstream} API error: request timed out")
+                raise
+            except Exception as e:
+                self.logger.error(f"{upstream} API error: {str(e)}")
+                raise
+        
+        key = flight_key(path, *sorted(f"{name}={value}" for name, value in params.items()))
+        return await singleflight_registry.get(upstream).do(key, call)
@@ -3,24 +3,43 @@ API Router to manage requests between UI and endpoints
 """
 
 import logging
-import asyncio
 from datetime import datetime
 import pytz
-from typing import Dict, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator, Union
 from api_gateway import APIGateway
 from claude_client import ClaudeClient
-from realtime_client import RealtimeClient
+from perplexity_client import PerplexityClient
 from knowledge_base import KnowledgeBase
+from inventory_db import InventoryDB, INVENTORY_FILTERS
+from intent_matcher import QueryIntent
+from query_normalizer import NormalizedQuery
+from conversation_store import ConversationStore
+from fan_out import FanOutScheduler
+from comparison_engine import ComparisonEngine, vehicle_label
+from recommender import VehicleRecommender
+from finance_engine import FinanceEngine, format_payment
+from http_pool import session_registry
+from circuit_breaker import breaker_registry
+from singleflight import singleflight_registry
+from config import TIMEZONE, RECOMMENDER_TOP_K
+
+# Source outcome for upstreams skipped because their breaker is open
+CIRCUIT_OPEN = "circuit_open"
 
 class APIRouter:
     """Router for managing API requests"""
     
-    def __init__(self):
+    def __init__(self, conversation_store: Optional[ConversationStore] = None):
         self.logger = logging.getLogger(__name__)
         self.gateway = APIGateway()
-        self.claude = ClaudeClient()
-        self.realtime = RealtimeClient()
+        self.claude = ClaudeClient(store=conversation_store)
+        self.perplexity = PerplexityClient()
         self.knowledge = KnowledgeBase()
+        self.inventory = InventoryDB(search_index=self.knowledge.fuzzy_index)
+        self.fan_out = FanOutScheduler()
+        self.comparison = ComparisonEngine(self.inventory, self.gateway.spec_cache)
+        self.recommender = VehicleRecommender.for_inventory(self.inventory)
+        self.finance = FinanceEngine(self.inventory)
         
     async def process_request(
         self,
@@ -32,77 +51,41 @@ class APIRouter:
         
         Args:
             message: User's message
-            context: Additional context like session info
+            context: Additional context like session info and conversation_id
             
         Returns:
             Combined response from all endpoints
         """
         try:
-            # Check cache for common queries
-            cached_response = self.knowledge.get_cached_response(message.lower())
-            if cached_response:
-                return {"response": cached_response, "source": "cache"}
-                
-            # Extract query parameters
-            query = self.extract_vehicle_params(message)
+            normalized = self.knowledge.normalize(message)
+            local_response = self.answer_locally(normalized)
+            if local_response:
+                return local_response
             
-            # Get dealership info if relevant
-            dealership_info = {}
-            brand = query.get("make") if query else None
+            enhanced_context = await self.gather_context(message, context, normalized.intent)
             
-            if any(keyword in message.lower() for keyword in ["hours", "location", "contact", "about", "services"]):
-                category = next((k for k in ["hours", "services"] if k in message.lower()), "main")
-                dealership_info = self.knowledge.get_dealership_info(category, brand)
-                
-                # Cache and return formatted dealership info
-                if dealership_info:
-                    response = self.format_dealership_response(dealership_info, category)
-                    self.knowledge.cache_response(message.lower(), response)
-                    return {"response": response, "source": "knowledge_base"}
-            
-            # Get data from multiple sources
-            vehicle_data = {}
-            perplexity_data = {}
-            
-            if query:
-                # Run API calls concurrently
-                vehicle_data = await self.gateway.get_vehicle_data(query)
-                perplexity_data = await self.perplexity.get_realtime_info(message)
-            
-            # Enhance Claude prompt with real-time data
-            enhanced_context = {
-                "vehicle_data": vehicle_data,
-                "realtime_info": perplexity_data,
-                "session": context.get("session", {}) if context else {}
-            }
-            
-            # Get real-time data and Claude response concurrently
-            realtime_data, claude_response = await asyncio.gather(
-                self.realtime.get_realtime_info(message),
-                self.claude.send_message(message, context=enhanced_context)
+            conversation_id = context.get("conversation_id") if context else None
+            claude_response = await self.claude.send_message(
+                message,
+                conversation_id=conversation_id,
+                context=enhanced_context
             )
             
-            # Use real-time data for time-sensitive queries
-            if "date" in message.lower() or "time" in message.lower():
-                return {
-                    "response": f"Today's date and time is {realtime_data['current_time']}",
-                    "source": "realtime"
-                }
+            # Without Claude, answer from the knowledge base and local inventory
+            if claude_response.get("error"):
+                return self.fallback_response(normalized.intent, claude_response["error"])
             
             # Combine responses with priority to real-time info
             final_response = {
                 "response": claude_response.get("response", ""),
                 "conversation_id": claude_response.get("conversation_id", ""),
-                "realtime_data": perplexity_response.get("response", ""),
-                "timestamp": datetime.now(pytz.timezone('America/Chicago')).strftime('%B %d, %Y %H:%M:%S %Z')
+                "usage": claude_response.get("usage", {}),
+                "realtime_data": enhanced_context["realtime_info"].get("response", ""),
+                "sources": enhanced_context["sources"],
+                "brownout": enhanced_context["brownout"],
+                "timestamp": datetime.now(pytz.timezone(TIMEZONE)).strftime('%B %d, %Y %H:%M:%S %Z')
             }
             
-            # Combine LLM responses with real-time info
-            current_time = datetime.now(pytz.timezone('America/Chicago'))
-            
-            if "date" in message.lower() or "time" in message.lower():
-                final_response["response"] = f"Today's date is {current_time.strftime('%B %d, %Y')} {current_time.strftime('%Z')}"
-            
             return final_response
             
         except Exception as e:
@@ -111,6 +94,336 @@ class APIRouter:
                 "error": "Failed to process request",
                 "details": str(e)
             }
+    
+    async def process_request_stream(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a request and stream the response as it is generated
+        
+        Args:
+            message: User's message
+            context: Additional context like session info and conversation_id
+            
+        Yields:
+            {"type": "delta", "text": ...} events, then one {"type": "done", ...}
+            event with the complete response and usage
+        """
+        try:
+            normalized = self.knowledge.normalize(message)
+            local_response = self.answer_locally(normalized)
+            if local_response:
+                yield {"type": "delta", "text": local_response["response"]}
+                yield {"type": "done", **local_response}
+                return
+            
+            enhanced_context = await self.gather_context(message, context, normalized.intent)
+            conversation_id = context.get("conversation_id") if context else None
+            
+            streamed = False
+            async for event in self.claude.stream_message(
+                message,
+                conversation_id=conversation_id,
+                context=enhanced_context
+            ):
+                if event["type"] == "delta":
+                    streamed = True
+                elif event.get("error") and not streamed:
+                    fallback = self.fallback_response(normalized.intent, event["error"])
+                    yield {"type": "delta", "text": fallback["response"]}
+                    event = {"type": "done", **fallback}
+                else:
+                    event["sources"] = enhanced_context["sources"]
+                    event["brownout"] = enhanced_context["brownout"]
+                yield event
+                
+        except Exception as e:
+            self.logger.error(f"Error processing streaming request: {str(e)}")
+            yield {
+                "type": "done",
+                "response": "I'm sorry, I couldn't process your request.",
+                "error": "Failed to process request",
+                "details": str(e)
+            }
+    
+    def answer_locally(self, message: Union[str, NormalizedQuery]) -> Optional[Dict[str, Any]]:
+        """
+        Answer from local data, the response cache or the knowledge base
+        without calling upstreams
+        
+        Args:
+            message: User's message, or its already normalized form
+            
+        Returns:
+            Response dict, or None if the message needs the LLM
+        """
+        normalized = self.knowledge.normalize(message)
+        
+        # Cheap intents are answered before the cache so they are never stale
+        routed = self.route_intent(normalized.intent)
+        if routed:
+            return routed
+        
+        # Check cache for common queries
+        cached_response = self.knowledge.get_cached_response(normalized)
+        if cached_response:
+            return {"response": cached_response, "source": "cache"}
+        
+        # Get dealership info if that is all the message asks for; anything about a vehicle needs the LLM
+        if normalized.knowledge_only:
+            dealership_info = self.knowledge.get_dealership_info(normalized.category, normalized.brand)
+            
+            # Cache and return formatted dealership info
+            if dealership_info:
+                response = self.format_dealership_response(dealership_info, normalized.category)
+                self.knowledge.cache_response(normalized, response)
+                return {"response": response, "source": "knowledge_base"}
+        
+        return None
+    
+    def route_intent(self, intent: Optional[QueryIntent]) -> Optional[Dict[str, Any]]:
+        """
+        Answer date/time and inventory count questions from local data
+        
+        Args:
+            intent: Result of the intent matcher
+            
+        Returns:
+            Response dict, or None if the intent is not routed locally
+        """
+        if intent is None:
+            return None
+        
+        if intent.intent == "date_time":
+            now = datetime.now(pytz.timezone(TIMEZONE))
+            return {
+                "response": f"Today's date and time is {now.strftime('%B %d, %Y %H:%M:%S %Z')}",
+                "source": "realtime"
+            }
+        
+        if intent.intent == "inventory_count":
+            return {
+                "response": self.format_inventory_count(intent),
+                "source": "inventory"
+            }
+        
+        # "What's my payment on a Rogue?" comes from the precomputed payment table
+        if intent.intent == "financing" and (intent.make or intent.model):
+            payments = self.find_payments(intent)
+            if payments:
+                return {
+                    "response": self.format_payments(intent, payments),
+                    "source": "finance"
+                }
+        
+        return None
+    
+    def format_inventory_count(self, intent: QueryIntent) -> str:
+        """Format an inventory count answer for the requested make/model"""
+        vehicles = self.inventory.query(status="available", **self.inventory_filters(intent.to_params()))
+        label = intent.model or (intent.make.title() if intent.make else "")
+        noun = "vehicle" if len(vehicles) == 1 else "vehicles"
+        answer = f"We currently have {len(vehicles)} {label + ' ' if label else ''}{noun} available."
+        alternatives = None if vehicles else self.find_alternatives(intent.to_params())
+        if alternatives:
+            answer += " Similar vehicles in stock: " + ", ".join(
+                f"{vehicle_label(car)} (${car['price']:,})" for car in alternatives
+            ) + "."
+        return answer
+    
+    def find_payments(self, intent: QueryIntent, limit: int = 5) -> List[Dict[str, Any]]:
+        """Lowest monthly payments for the vehicles, down payment and term asked about"""
+        payments = []
+        for make, model in intent.models or [(intent.make, None)]:
+            payments.extend(self.finance.payments_for(
+                make=make, model=model, down=intent.down_payment, months=intent.term_months, limit=limit
+            ))
+        return sorted(payments, key=lambda row: row["payment"])[:limit]
+    
+    def format_payments(self, intent: QueryIntent, payments: List[Dict[str, Any]]) -> str:
+        """Format estimated payments for in-stock vehicles"""
+        lines = ["Here are estimated monthly payments on vehicles we have in stock:"]
+        lines.extend(f"- {format_payment(row)}" for row in payments)
+        lines.append(
+            "Payments exclude tax, title and fees, and are subject to credit approval; "
+            "lease payments with a different amount down are approximate."
+        )
+        return "\n".join(lines)
+    
+    async def gather_context(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        intent: Optional[QueryIntent] = None
+    ) -> Dict[str, Any]:
+        """
+        Gather vehicle and real-time data used to enhance the Claude prompt
+        
+        Args:
+            message: User's message
+            context: Additional context like session info
+            intent: Already extracted intent, to avoid matching the message again
+            
+        Returns:
+            Enhanced context for ClaudeClient
+        """
+        if intent is None:
+            intent = self.knowledge.intent_matcher.match(message)
+        query = self.extract_vehicle_params(message, intent)
+        sources = {}
+        skipped = []
+        
+        # Launch every enrichment source at once; whatever misses the deadline is dropped
+        if query:
+            vehicle_sources = self.gateway.vehicle_sources(query)
+            skipped = [name for name in self.gateway.VEHICLE_SOURCES if name not in vehicle_sources]
+            sources.update(vehicle_sources)
+            sources["perplexity"] = self.perplexity.get_realtime_info(message)
+        fan_out = await self.fan_out.run(sources)
+        results = fan_out["results"]
+        source_status = {**fan_out["sources"], **dict.fromkeys(skipped, CIRCUIT_OPEN)}
+        
+        vehicle_data = {
+            name: results[name] for name in self.gateway.VEHICLE_SOURCES if name in results
+        }
+        
+        # Brownout: every vehicle backend is tripped, so use local inventory instead
+        brownout = bool(query) and len(skipped) == len(self.gateway.VEHICLE_SOURCES)
+        if brownout:
+            self.logger.warning("Vehicle data backends unavailable; using local inventory")
+            vehicle_data = self.local_vehicle_data(query)
+        
+        return {
+            "vehicle_data": vehicle_data,
+            "realtime_info": results.get("perplexity", {}),
+            "vehicle_query": query,
+            "comparison": self.compare_vehicles(intent),
+            "alternatives": self.find_alternatives(query),
+            "payments": self.find_payments(intent) if "financing" in intent.intents else None,
+            "sources": source_status,
+            "brownout": brownout,
+            "session": context.get("session", {}) if context else {}
+        }
+    
+    def compare_vehicles(self, intent: QueryIntent) -> Optional[Dict[str, Any]]:
+        """Comparison table for the in-stock models named in a comparison question"""
+        if intent.intent != "compare" or len(intent.models) < 2:
+            return None
+        comparison = self.comparison.compare(self.comparison.vehicles_for_models(intent.models))
+        return comparison if comparison["attributes"] else None
+    
+    def find_alternatives(self, query: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Closest in-stock vehicles of any brand when the requested model has none available
+        
+        The reference is a unit of the model from inventory (sold or
+        pending) if there is one, otherwise the make, model, body style,
+        year and budget from the query.
+        
+        Returns:
+            Vehicles with a "similarity" score, or None if the model is in stock
+        """
+        make, model = query.get("make"), query.get("model")
+        if not model or self.inventory.query(make=make, model=model, status="available", limit=1):
+            return None
+        known = self.inventory.query(make=make, model=model, limit=1)
+        reference = known[0] if known else {
+            "make": make,
+            "model": model,
+            "body_style": query.get("body_style"),
+            "year": query.get("year"),
+            "price": query.get("max_price") or query.get("min_price")
+        }
+        alternatives = [
+            dict(vehicle, similarity=similarity)
+            for vehicle, similarity in self.recommender.similar(reference, k=RECOMMENDER_TOP_K)
+        ]
+        return alternatives or None
+    
+    def local_vehicle_data(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Vehicle context from the local inventory database"""
+        return {
+            "inventory": {
+                "vehicles": self.inventory.query(status="available", **self.inventory_filters(query)),
+                "source": "local"
+            },
+            "offers": self.inventory.get_offers(query.get("make"), query.get("model"))
+        }
+    
+    @staticmethod
+    def inventory_filters(query: Dict[str, Any]) -> Dict[str, Any]:
+        """Vehicle search parameters that InventoryDB.query can filter on"""
+        return {
+            name: value for name, value in query.items()
+            if name in INVENTORY_FILTERS and value is not None
+        }
+    
+    def fallback_response(self, intent: Optional[QueryIntent], error: str) -> Dict[str, Any]:
+        """
+        Answer from the knowledge base and local inventory when Claude is unavailable
+        
+        Args:
+            intent: Result of the intent matcher
+            error: Error reported by the Claude client
+            
+        Returns:
+            Response dict marked as degraded
+        """
+        make = intent.make if intent else None
+        model = intent.model if intent else None
+        vehicles = self.local_vehicle_data({"make": make, "model": model})["inventory"]["vehicles"]
+        offers = self.inventory.get_offers(make, model) if make else []
+        main_info = self.knowledge.get_dealership_info("main").get("main", {})
+        
+        lines = ["I can't reach all of our systems right now, but here is what I can tell you."]
+        if make or model:
+            if vehicles:
+                lines.append("\nAvailable now:")
+                lines.extend(
+                    f"- {car['year']} {car['make']} {car['model']} {car.get('trim', '')}".rstrip()
+                    + f", ${car['price']:,}"
+                    for car in vehicles[:5]
+                )
+            elif model:
+                alternatives = self.find_alternatives({"make": make, "model": model}) or []
+                if alternatives:
+                    lines.append(f"\nWe're out of the {model} right now; similar vehicles available now:")
+                    lines.extend(
+                        f"- {vehicle_label(car)}, ${car['price']:,}" for car in alternatives
+                    )
+            if offers:
+                lines.append("\nCurrent offers:")
+                for offer in offers[:3]:
+                    lines.append(f"- {offer['title']}: {offer['description']}")
+        lines.append(
+            f"\nFor anything else, call us at {main_info.get('phone', '')} "
+            f"or visit {main_info.get('location', '')}."
+        )
+        
+        return {
+            "response": "\n".join(lines),
+            "source": "local_fallback",
+            "degraded": True,
+            "error": error
+        }
+            
+    def get_stats(self) -> Dict[str, Any]:
+        """Collect cache and pool counters from the router's components"""
+        return {
+            "response_cache": self.knowledge.cache_stats(),
+            "prompt_cache": self.claude.cache_stats(),
+            "conversations": self.claude.store.stats(),
+            "http_pool": session_registry.stats(),
+            "enrichment": self.fan_out.stats(),
+            "circuit_breakers": breaker_registry.stats(),
+            "spec_cache": self.gateway.spec_cache.stats(),
+            "single_flight": singleflight_registry.stats(),
+            "comparison": self.comparison.stats(),
+            "recommender": self.recommender.stats(),
+            "finance": self.finance.stats()
+        }
             
     def format_dealership_response(self, info: Dict[str, Any], category: str) -> str:
         """Format dealership information into a response"""
@@ -140,27 +453,26 @@ Phone: {main_info.get('phone', '')}
 Website: {main_info.get('website', '')}
 """
 
-    def extract_vehicle_params(self, message: str) -> Dict[str, Any]:
-        """Extract vehicle-related parameters from message"""
-        params = {}
-        message = message.lower()
-        
-        # Extract brand/make
-        makes = ["nissan", "audi", "mercedes", "porsche", "volkswagen", "volvo"]
-        for make in makes:
-            if make in message:
-                params["make"] = make
-                # Get brand-specific tone for responses
-                params["tone"] = self.knowledge.get_brand_tone(make)
-                # Get popular models for the brand
-                params["models"] = self.knowledge.get_brand_models(make)
-                break
-        
-        # Extract common topics
-        topics = ["inventory", "price", "test drive", "service", "special", "offer"]
-        for topic in topics:
-            if topic in message:
-                params["topic"] = topic
-                break
+    def extract_vehicle_params(
+        self,
+        message: str,
+        intent: Optional[QueryIntent] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract vehicle search parameters from a message
+        
+        Args:
+            message: User's message
+            intent: Already extracted intent, if available
+            
+        Returns:
+            Scalar search parameters (make, model, year, price range,
+            body style) plus the primary topic
+        """
+        if intent is None:
+            intent = self.knowledge.intent_matcher.match(message)
         
+        params = intent.to_params()
+        if intent.intent:
+            params["topic"] = intent.intent
         return params
\ No newline at end of file
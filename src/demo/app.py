@@ -1,36 +1,68 @@
 """
 Web application for the Jack Ingram Motors Chatbot Demo
+
+Served as an ASGI app so every request shares one long-lived event loop.
 """
 
 import os
 import json
+import uuid
+import asyncio
 import logging
 from datetime import datetime
 import pytz
-from flask import Flask, request, jsonify, render_template, session
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, request, jsonify, render_template, session, make_response
 from api_router import APIRouter
-from config import PORT, HOST, DEBUG, ENABLE_ANALYTICS, ANALYTICS_LOG_FILE, DEALERSHIP_INFO
-from claude_client import ClaudeClient
+from config import PORT, HOST, DEBUG, ENABLE_ANALYTICS, DEALERSHIP_INFO, CRAWL_ENABLED
+from conversation_store import ConversationStore
+from http_pool import session_registry
+from snapshot_store import snapshot_store
+from crawl_scheduler import CrawlScheduler
+from realtime_client import RealtimeClient
+from analytics_sink import AnalyticsSink
+from analytics_store import AnalyticsStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__, static_url_path='', static_folder='static')
+# Initialize Quart app (Flask-compatible, ASGI-native)
+app = Quart(__name__, static_url_path='', static_folder='static')
 app.secret_key = os.urandom(24)  # For session management
 
+# Per-conversation history shared by all requests in this process
+conversation_store = ConversationStore()
+
 # Initialize API router
-api_router = APIRouter()
+api_router = APIRouter(conversation_store=conversation_store)
+
+# Keeps the dealership site snapshot fresh outside the request path
+crawl_scheduler = CrawlScheduler(snapshot_store, web=RealtimeClient())
+
+# Writes analytics events from a background thread so requests never wait on disk
+analytics_sink = AnalyticsSink()
+
+@app.before_serving
+async def start_crawler():
+    """Start crawling dealership sites in the background"""
+    if CRAWL_ENABLED:
+        crawl_scheduler.start()
+
+@app.after_serving
+async def close_http_sessions():
+    """Stop the crawler, close pooled upstream connections and flush analytics on shutdown"""
+    await crawl_scheduler.stop()
+    crawl_scheduler.web.scraper.shutdown()
+    await session_registry.close()
+    await asyncio.to_thread(analytics_sink.close)
 
-# Initialize Claude client
-claude_client = ClaudeClient()
+def new_conversation_id():
+    """Create a unique conversation ID for a new session"""
+    return f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
 # Analytics tracking
-def log_interaction(user_message, assistant_response, metadata=None):
-    """Log user-assistant interactions for analytics"""
+async def log_interaction(user_message, assistant_response, metadata=None):
+    """Queue a user-assistant interaction for the analytics log"""
     if not ENABLE_ANALYTICS:
         return
     
@@ -41,22 +73,17 @@ def log_interaction(user_message, assistant_response, metadata=None):
         "assistant_response": assistant_response,
         "metadata": metadata or {}
     }
-    
-    try:
-        with open(ANALYTICS_LOG_FILE, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception as e:
-        logger.error(f"Error logging analytics: {str(e)}")
+    await analytics_sink.emit_async(log_entry)
 
 @app.route('/')
-def index():
+async def index():
     """Render the main chatbot interface"""
-    return render_template('index.html', dealership_info=DEALERSHIP_INFO)
+    return await render_template('index.html', dealership_info=DEALERSHIP_INFO)
 
 @app.route('/api/chat', methods=['POST'])
-def chat():
+async def chat():
     """API endpoint for chatbot interactions"""
-    data = request.json
+    data = await request.get_json(silent=True) or {}
     user_message = data.get('message', '')
     
     if not user_message:
@@ -65,57 +92,142 @@ def chat():
     # Get conversation ID from session or create new one
     conversation_id = session.get('conversation_id')
     if not conversation_id:
-        # Reset conversation for new sessions
-        claude_client.reset_conversation()
-        session['conversation_id'] = f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # New sessions start with an empty history in the store
+        conversation_id = new_conversation_id()
+        session['conversation_id'] = conversation_id
+    
+    # Process message through API router on the server's event loop
+    response_data = await api_router.process_request(
+        user_message,
+        context={"session": session, "conversation_id": conversation_id}
+    )
+    
+    # Log interaction for analytics
+    metadata = {
+        "conversation_id": session.get('conversation_id'),
+        "timestamp": datetime.now().isoformat(),
+        "user_agent": request.headers.get('User-Agent'),
+        "usage": response_data.get("usage", {})
+    }
+    await log_interaction(user_message, response_data.get("response", ""), metadata)
+    
+    return jsonify({
+        "response": response_data.get("response", "I'm sorry, I couldn't process your request."),
+        "conversation_id": session.get('conversation_id')
+    })
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Server-sent events endpoint that streams the response as it is generated"""
+    data = await request.get_json(silent=True) or {}
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    conversation_id = session.get('conversation_id')
+    if not conversation_id:
+        conversation_id = new_conversation_id()
+        session['conversation_id'] = conversation_id
     
-    # Create event loop for async operations
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    user_agent = request.headers.get('User-Agent')
+    router_context = {"session": dict(session), "conversation_id": conversation_id}
     
-    try:
-        # Process message through API router
-        response_data = loop.run_until_complete(api_router.process_request(
-            user_message,
-            context={"session": session}
-        ))
+    async def events():
+        final_event = {}
+        streamed = False
+        async for event in api_router.process_request_stream(user_message, context=router_context):
+            if event["type"] == "delta":
+                streamed = True
+                yield format_sse("delta", {"text": event["text"]})
+            else:
+                final_event = event
         
-        # Log interaction for analytics
+        # Errors arrive as a final response with no deltas
+        if not streamed and final_event.get("response"):
+            yield format_sse("delta", {"text": final_event["response"]})
+        
+        # Log the completed interaction once the stream has finished
         metadata = {
-            "conversation_id": session.get('conversation_id'),
+            "conversation_id": conversation_id,
             "timestamp": datetime.now().isoformat(),
-            "user_agent": request.headers.get('User-Agent'),
-            "usage": response_data.get("usage", {})
+            "user_agent": user_agent,
+            "usage": final_event.get("usage", {})
         }
-        log_interaction(user_message, response_data.get("response", ""), metadata)
+        await log_interaction(user_message, final_event.get("response", ""), metadata)
         
-        return jsonify({
-            "response": response_data.get("response", "I'm sorry, I couldn't process your request."),
-            "conversation_id": session.get('conversation_id')
+        yield format_sse("done", {
+            "conversation_id": conversation_id,
+            "error": final_event.get("error")
         })
-        
-    finally:
-        loop.close()
+    
+    response = await make_response(events(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Disable proxy buffering so deltas arrive immediately
+    })
+    response.timeout = None
+    return response
+
+def format_sse(event, data):
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
 
 @app.route('/api/reset', methods=['POST'])
-def reset_conversation():
+async def reset_conversation():
     """Reset the conversation history"""
-    claude_client.reset_conversation()
-    session['conversation_id'] = f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    conversation_id = session.get('conversation_id')
+    if conversation_id:
+        api_router.claude.reset_conversation(conversation_id)
+    session['conversation_id'] = new_conversation_id()
     return jsonify({"status": "success", "message": "Conversation reset"})
 
 @app.route('/api/dealership-info', methods=['GET'])
-def get_dealership_info():
+async def get_dealership_info():
     """Return dealership information"""
     return jsonify(DEALERSHIP_INFO)
 
+@app.route('/api/stats', methods=['GET'])
+async def get_stats():
+    """Return cache and connection pool counters for monitoring"""
+    return jsonify({
+        **api_router.get_stats(),
+        "crawler": crawl_scheduler.stats(),
+        "analytics": analytics_sink.stats()
+    })
+
 @app.route('/health')
-def health_check():
+async def health_check():
     """Health check endpoint for DigitalOcean App Platform"""
     return jsonify({"status": "healthy"}), 200
 
+@app.cli.command("prewarm-specs")
+def prewarm_specs():
+    """Fill the spec cache with specs and safety ratings for every vehicle in inventory"""
+    async def prewarm():
+        try:
+            return await api_router.gateway.prewarm_specs(api_router.inventory.get_inventory())
+        finally:
+            await session_registry.close()
+    
+    result = asyncio.run(prewarm())
+    logger.info(
+        f"Prewarmed spec cache for {result['vehicles']} vehicles: "
+        f"{result['stored']} entries stored, {result['failed']} failed"
+    )
+
+@app.cli.command("compact-analytics")
+def compact_analytics():
+    """Convert rotated analytics log segments into the day-partitioned columnar store"""
+    store = AnalyticsStore(matcher=api_router.knowledge.intent_matcher)
+    counts = store.compact()
+    logger.info(
+        f"Compacted {counts['segments']} analytics segments ({counts['rows']} rows, "
+        f"{counts['bad_lines']} unreadable lines); {counts['skipped']} already compacted"
+    )
+
 def run_app():
-    """Run the Flask application"""
+    """Run the application with Quart's development server"""
     app.run(host=HOST, port=PORT, debug=DEBUG)
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+"""
+Circuit breakers with rolling error/latency windows for upstream sources
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional, TypeVar
+from config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_FAILURES,
+    BREAKER_FAILURE_RATE,
+    BREAKER_OPEN_DURATION,
+    BREAKER_SLOW_CALL_RATIO,
+    HTTP_TIMEOUTS
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Tracks the recent health of one upstream and stops calling it when it fails.
+
+    Calls are kept in a rolling time window. Errors and calls slower than the
+    slow-call threshold both count as failures. Once the window holds enough
+    failures at a high enough rate the breaker opens and calls are rejected
+    without touching the network. After the open duration a single half-open
+    probe is let through: success closes the breaker, failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = BREAKER_WINDOW,
+        min_failures: int = BREAKER_MIN_FAILURES,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        open_duration: float = BREAKER_OPEN_DURATION,
+        slow_call_threshold: Optional[float] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.window = window
+        self.min_failures = min_failures
+        self.failure_rate = failure_rate
+        self.open_duration = open_duration
+        self.slow_call_threshold = slow_call_threshold
+        self._lock = threading.Lock()
+        # (finished_at, failed, latency) for calls inside the window
+        self._calls: deque = deque()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._opened = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cooldown has passed"""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through (does not reserve the probe)"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == CLOSED or (state == HALF_OPEN and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """Reserve permission for one call; in half-open state only one probe is allowed"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        """
+        Record the outcome of a call
+
+        Args:
+            success: Whether the call completed without error
+            latency: Call duration in seconds
+        """
+        now = time.monotonic()
+        failed = not success or (self.slow_call_threshold is not None and latency >= self.slow_call_threshold)
+        with self._lock:
+            if self._current_state(now) == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.logger.info(f"Circuit {self.name} closed after successful probe")
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self._failures = 0
+                return
+
+            self._calls.append((now, failed, latency))
+            self._failures += failed
+            self._prune(now)
+            if (
+                self._state == CLOSED
+                and self._failures >= self.min_failures
+                and self._failures / len(self._calls) >= self.failure_rate
+            ):
+                self._open(now)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a call through the breaker
+
+        Args:
+            fn: Zero-argument coroutine function performing the call
+
+        Returns:
+            The call's result
+
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Cancelled by a caller's deadline (single-flight cancels the call once every
+            # waiter gave up): the upstream was too slow to be useful
+            self.record(False, time.monotonic() - started)
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    def _current_state(self, now: float) -> str:
+        """State with the open -> half-open transition applied (lock held)"""
+        if self._state == OPEN and now - self._opened_at >= self.open_duration:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _open(self, now: float) -> None:
+        self.logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+        self._state = OPEN
+        self._opened_at = now
+        self._opened += 1
+
+    def _prune(self, now: float) -> None:
+        """Drop calls that have left the rolling window (lock held)"""
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, failed, _ = self._calls.popleft()
+            self._failures -= failed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get state, windowed error rate and latency"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            latencies = sorted(latency for _, _, latency in self._calls)
+            calls = len(latencies)
+            return {
+                "state": state,
+                "calls": calls,
+                "failures": self._failures,
+                "error_rate": self._failures / calls if calls else 0.0,
+                "p50_ms": round(latencies[calls // 2] * 1000, 1) if calls else None,
+                "p95_ms": round(latencies[min(calls - 1, int(calls * 0.95))] * 1000, 1) if calls else None,
+                "rejected": self._rejected,
+                "times_opened": self._opened
+            }
+
+
+class CircuitBreakerRegistry:
+    """Process-wide breakers, one per upstream name"""
+
+    def __init__(self, timeouts: Optional[Dict[str, Dict[str, float]]] = None):
+        self.timeouts = timeouts or HTTP_TIMEOUTS
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Get the breaker for an upstream, creating it on first use"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                # Calls that use most of the upstream's timeout budget count as failures
+                total = self.timeouts.get(name, self.timeouts.get("default", {})).get("total")
+                slow_call_threshold = total * BREAKER_SLOW_CALL_RATIO if total else None
+                breaker = CircuitBreaker(name, slow_call_threshold=slow_call_threshold)
+                self._breakers[name] = breaker
+            return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        """Get stats for every breaker"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in sorted(breakers.items())}
+
+# Shared registry used by every client in the process
+breaker_registry = CircuitBreakerRegistry()
@@ -3,15 +3,30 @@ API client for interacting with the Anthropic Claude API with enhanced error han
 """
 
 import json
-import requests
+import asyncio
+import aiohttp
 import logging
-from typing import Dict, List, Any, Optional
+from datetime import datetime
+import pytz
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
 from config import (
     ANTHROPIC_API_URL,
     ANTHROPIC_VERSION,
     MODEL,
-    SYSTEM_PROMPT
+    SYSTEM_PROMPT,
+    TIMEZONE,
+    SUMMARY_MODEL,
+    SUMMARY_MAX_TOKENS,
+    SCRAPE_PROMPT_RECORDS
 )
+from conversation_store import ConversationStore
+from context_window import ContextWindow
+from knowledge_base import KnowledgeBase
+from http_pool import session_registry
+from snapshot_store import SnapshotStore, snapshot_store
+from comparison_engine import format_comparison, vehicle_label
+from finance_engine import format_payment
+from web_scraper import format_records
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,71 +35,79 @@ logger = logging.getLogger(__name__)
 class ClaudeClient:
     """Client for interacting with Anthropic's Claude API with improved error handling"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Claude client with API credentials"""
+    # Conversation used when callers don't supply their own ID
+    DEFAULT_CONVERSATION_ID = "default"
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        store: Optional[ConversationStore] = None,
+        snapshots: Optional[SnapshotStore] = None
+    ):
+        """Initialize the Claude client with API credentials, a conversation store and the site snapshot"""
         from config import ANTHROPIC_API_KEY
         self.api_url = ANTHROPIC_API_URL
         self.headers = {
             "x-api-key": api_key or ANTHROPIC_API_KEY,
-            "anthropic-version": "2023-06-01",
+            "anthropic-version": ANTHROPIC_VERSION,
             "content-type": "application/json"
         }
-        self.system_prompt = SYSTEM_PROMPT
+        # Static prompt prefix; identical on every request so the API can cache it
+        self.system_prompt = f"{SYSTEM_PROMPT.strip()}\n\n{KnowledgeBase().format_prompt_context()}"
         self.model = MODEL
-        self.conversation_history: List[Dict[str, str]] = []
+        self.store = store if store is not None else ConversationStore()
+        self.context_window = ContextWindow(self.store, self.summarize)
+        # Crawled dealership site data, refreshed in the background by CrawlScheduler
+        self.snapshots = snapshots if snapshots is not None else snapshot_store
+        self.prompt_cache_stats = {
+            "requests": 0,
+            "hits": 0,
+            "writes": 0,
+            "misses": 0,
+            "input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0
+        }
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """History of the default conversation"""
+        return self.store.get_history(self.DEFAULT_CONVERSATION_ID)
     
-    def send_message(self, user_message: str, max_tokens: int = 1024) -> Dict[str, Any]:
+    @conversation_history.setter
+    def conversation_history(self, messages: List[Dict[str, str]]) -> None:
+        self.store.replace(self.DEFAULT_CONVERSATION_ID, messages)
+    
+    async def send_message(
+        self,
+        user_message: str,
+        max_tokens: int = 1024,
+        conversation_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Send a message to Claude and get a response with enhanced error handling
         
         Args:
             user_message: The user's message text
             max_tokens: Maximum number of tokens in the response
+            conversation_id: Conversation whose history is sent and updated
+            context: Additional context like vehicle data gathered by the router
             
         Returns:
             Dict containing the response and metadata
         """
+        conversation_id = conversation_id or self.DEFAULT_CONVERSATION_ID
+        context = context or {}
+        
         try:
-            # Get real-time context from MCP
-            mcp_client = MCPClient()
-            realtime_info = await mcp_client.get_realtime_info(user_message)
-            
-            # Enhance user message with real-time context
-            enhanced_message = f"""User message: {user_message}
-
-Available real-time information:
-- Current inventory: {realtime_info.get('inventory', {})}
-- Service availability: {realtime_info.get('service', {})}
-- Latest offers: {realtime_info.get('offers', {})}
-- Related updates: {realtime_info.get('search', {})}
-"""
-            
-            # Send request to API
-            logger.info(f"Sending request to Claude API: {user_message[:50]}...")
-            
-            payload = {
-                "model": self.model,
-                "max_tokens": max_tokens,
-                "system": self.system_prompt,
-                "messages": self.conversation_history + [
-                    {"role": "user", "content": enhanced_message}
-                ]
-            }
+            payload = await self._build_payload(user_message, max_tokens, conversation_id, context)
             
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=payload
-            )
-            
-            # Log the full response for debugging
-            logger.info(f"API Response Status: {response.status_code}")
-            logger.info(f"API Response Headers: {response.headers}")
+            status_code, response_data = await self._post(payload)
             
             # Check for authentication errors specifically
-            if response.status_code == 401:
-                error_data = response.json()
-                error_message = error_data.get("error", {}).get("message", "Authentication failed")
+            if status_code == 401:
+                error_message = response_data.get("error", {}).get("message", "Authentication failed")
                 logger.error(f"Authentication error: {error_message}")
                 return {
                     "response": f"I'm experiencing an authentication issue with the Claude API. Error: {error_message}. Please contact support with this information.",
@@ -93,8 +116,14 @@ Available real-time information:
                 }
             
             # Check for other error status codes
-            response.raise_for_status()
-            response_data = response.json()
+            if status_code >= 400:
+                error_detail = json.dumps(response_data)
+                logger.error(f"HTTP Error {status_code}: {error_detail}")
+                return {
+                    "response": f"I encountered an error communicating with the Claude API (HTTP {status_code}). Technical details: {error_detail}",
+                    "error": response_data.get("error", {}).get("message", f"HTTP {status_code}"),
+                    "status_code": status_code
+                }
             
             # Extract the assistant's message
             content_list = response_data.get("content", [])
@@ -107,8 +136,8 @@ Available real-time information:
                 assistant_message = "Sorry, I couldn't process your request."
             
             # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
+            self.store.append_turn(conversation_id, user_message, assistant_message)
+            self._record_usage(response_data.get("usage", {}))
             
             return {
                 "response": assistant_message,
@@ -117,26 +146,14 @@ Available real-time information:
                 "usage": response_data.get("usage", {})
             }
             
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP Error: {str(e)}")
-            status_code = e.response.status_code if hasattr(e, 'response') else 0
-            error_detail = ""
-            
-            # Try to extract error details from response
-            try:
-                error_json = e.response.json() if hasattr(e, 'response') else {}
-                error_detail = json.dumps(error_json)
-                logger.error(f"Error details: {error_detail}")
-            except:
-                error_detail = str(e)
-            
+        except asyncio.TimeoutError:
+            logger.error("Request Error: Claude API request timed out")
             return {
-                "response": f"I encountered an error communicating with the Claude API (HTTP {status_code}). Technical details: {error_detail}",
-                "error": str(e),
-                "status_code": status_code
+                "response": "I'm having trouble connecting to the Claude API. Technical details: the request timed out.",
+                "error": "timeout"
             }
             
-        except requests.exceptions.RequestException as e:
+        except aiohttp.ClientError as e:
             logger.error(f"Request Error: {str(e)}")
             return {
                 "response": f"I'm having trouble connecting to the Claude API. Technical details: {str(e)}",
@@ -150,7 +167,293 @@ Available real-time information:
                 "error": str(e)
             }
     
-    def reset_conversation(self) -> None:
-        """Reset the conversation history"""
-        self.conversation_history = []
+    async def stream_message(
+        self,
+        user_message: str,
+        max_tokens: int = 1024,
+        conversation_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Send a message to Claude and stream the response as it is generated
+        
+        Args:
+            user_message: The user's message text
+            max_tokens: Maximum number of tokens in the response
+            conversation_id: Conversation whose history is sent and updated
+            context: Additional context like vehicle data gathered by the router
+            
+        Yields:
+            {"type": "delta", "text": ...} events for each text delta, followed by a
+            final {"type": "done", ...} event carrying the same fields as send_message
+        """
+        conversation_id = conversation_id or self.DEFAULT_CONVERSATION_ID
+        context = context or {}
+        message_id = ""
+        model = self.model
+        usage: Dict[str, Any] = {}
+        chunks: List[str] = []
+        
+        try:
+            payload = await self._build_payload(user_message, max_tokens, conversation_id, context)
+            payload["stream"] = True
+            
+            session = session_registry.get("anthropic")
+            async with session.post(self.api_url, headers=self.headers, json=payload) as response:
+                logger.info(f"API Stream Status: {response.status}")
+                if response.status >= 400:
+                    try:
+                        error_data = await response.json(content_type=None)
+                    except json.JSONDecodeError:
+                        error_data = {"error": {"message": await response.text()}}
+                    error_message = error_data.get("error", {}).get("message", f"HTTP {response.status}")
+                    logger.error(f"HTTP Error {response.status}: {error_message}")
+                    yield {
+                        "type": "done",
+                        "response": f"I encountered an error communicating with the Claude API (HTTP {response.status}). Technical details: {error_message}",
+                        "error": error_message,
+                        "status_code": response.status
+                    }
+                    return
+                
+                async for event in self._iter_events(response):
+                    event_type = event.get("type")
+                    if event_type == "content_block_delta":
+                        delta = event.get("delta", {})
+                        if delta.get("type") == "text_delta" and delta.get("text"):
+                            chunks.append(delta["text"])
+                            yield {"type": "delta", "text": delta["text"]}
+                    elif event_type == "message_start":
+                        message = event.get("message", {})
+                        message_id = message.get("id", "")
+                        model = message.get("model", model)
+                        usage.update(message.get("usage", {}))
+                    elif event_type == "message_delta":
+                        usage.update(event.get("usage", {}))
+                    elif event_type == "error":
+                        raise RuntimeError(event.get("error", {}).get("message", "Stream error"))
+            
+            assistant_message = "".join(chunks) or "Sorry, I couldn't process your request."
+            
+            # History is only finalized once the stream completes
+            self.store.append_turn(conversation_id, user_message, assistant_message)
+            self._record_usage(usage)
+            
+            yield {
+                "type": "done",
+                "response": assistant_message,
+                "conversation_id": message_id,
+                "model": model,
+                "usage": usage
+            }
+            
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Stream Error: {str(e)}")
+            yield {
+                "type": "done",
+                "response": f"I'm having trouble connecting to the Claude API. Technical details: {str(e) or 'the request timed out'}",
+                "error": str(e) or "timeout"
+            }
+        
+        except Exception as e:
+            logger.error(f"Unexpected streaming error: {str(e)}")
+            yield {
+                "type": "done",
+                "response": "I encountered an unexpected error. Please try again later or contact support.",
+                "error": str(e)
+            }
+    
+    async def _iter_events(self, response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+        """Decode server-sent events from a streaming Messages API response"""
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data:
+                yield json.loads(data)
+    
+    async def _build_payload(
+        self,
+        user_message: str,
+        max_tokens: int,
+        conversation_id: str,
+        context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the Messages API request body for a user turn"""
+        # Latest crawl of the brand's site (or the group site); a single in-memory read
+        snapshot = self.snapshots.latest()
+        brand = context.get("vehicle_query", {}).get("make") or "main"
+        site_data = snapshot.data.get(brand, {})
+        # Page records scraped from the group site, narrowed to the brand when one was asked about
+        website = format_records(
+            site_data.get("website") or snapshot.data.get("main", {}).get("website", {}),
+            brand=None if brand == "main" else brand,
+            limit=SCRAPE_PROMPT_RECORDS
+        )
+        crawled_at = (
+            datetime.fromtimestamp(snapshot.created_at, pytz.timezone(TIMEZONE)).strftime('%B %d, %Y %H:%M %Z')
+            if snapshot.version else "not yet available"
+        )
+        
+        # Enhance user message with real-time context
+        enhanced_message = f"""User message: {user_message}
+
+Available real-time information (website data as of {crawled_at}):
+- Current inventory: {site_data.get('inventory', {})}
+- Latest offers: {site_data.get('offers', {})}
+- Vehicle data: {context.get('vehicle_data', {})}
+"""
+        if website:
+            enhanced_message += f"""
+Vehicles and offers listed on our website:
+{website}
+"""
+        if context.get("comparison"):
+            enhanced_message += f"""
+Side-by-side comparison of in-stock vehicles (narrate this; don't recompute it):
+{format_comparison(context['comparison'])}
+"""
+        if context.get("payments"):
+            payments = "\n".join(f"- {format_payment(row)}" for row in context["payments"])
+            enhanced_message += f"""
+Estimated monthly payments from our payment calculator (quote these; don't do payment math yourself):
+{payments}
+"""
+        if context.get("alternatives"):
+            alternatives = "\n".join(
+                f"- {vehicle_label(car)}, ${car['price']:,} (similarity {car['similarity']})"
+                for car in context["alternatives"]
+            )
+            enhanced_message += f"""
+The requested model is out of stock. Closest vehicles we have available (offer these instead):
+{alternatives}
+"""
+        
+        # Recent turns within the token budget, older turns as a running summary
+        window = await self.context_window.build(conversation_id)
+        
+        # Send request to API
+        logger.info(f"Sending request to Claude API: {user_message[:50]}...")
+        
+        return {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "system": self._build_system(window["summary"]),
+            "messages": self._mark_cache_breakpoint(window["messages"]) + [
+                {"role": "user", "content": enhanced_message}
+            ]
+        }
+    
+    def _build_system(self, summary: str = "") -> List[Dict[str, Any]]:
+        """
+        Build the system prompt as a cached static prefix plus a small dynamic suffix
+        
+        Args:
+            summary: Running summary of earlier turns, if any
+            
+        Returns:
+            System content blocks for the Messages API
+        """
+        current_date = datetime.now(pytz.timezone(TIMEZONE)).strftime('%B %d, %Y')
+        dynamic = f"Today's date is {current_date} (US Central Time)"
+        if summary:
+            dynamic += f"\n\nSummary of the earlier conversation with this customer:\n{summary}"
+        
+        return [
+            {"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": dynamic}
+        ]
+    
+    def _mark_cache_breakpoint(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Mark the end of the prior history so the next turn can reuse the cached prefix"""
+        if not messages:
+            return messages
+        last = messages[-1]
+        return messages[:-1] + [{
+            "role": last["role"],
+            "content": [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+        }]
+    
+    def _record_usage(self, usage: Dict[str, Any]) -> None:
+        """Update prompt cache hit/miss accounting from a response's usage block"""
+        stats = self.prompt_cache_stats
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        cache_creation = usage.get("cache_creation_input_tokens") or 0
+        
+        stats["requests"] += 1
+        stats["input_tokens"] += usage.get("input_tokens") or 0
+        stats["cache_read_input_tokens"] += cache_read
+        stats["cache_creation_input_tokens"] += cache_creation
+        if cache_read:
+            stats["hits"] += 1
+        elif cache_creation:
+            stats["writes"] += 1
+        else:
+            stats["misses"] += 1
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get prompt cache accounting with the hit rate"""
+        stats = dict(self.prompt_cache_stats)
+        stats["hit_rate"] = stats["hits"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+    
+    async def summarize(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """
+        Fold older conversation turns into a running summary
+        
+        Args:
+            summary: Current running summary (may be empty)
+            messages: Turns to fold in, oldest first
+            
+        Returns:
+            Updated summary text
+        """
+        transcript = "\n".join(f"{m['role'].title()}: {m['content']}" for m in messages)
+        prompt = f"""Update the running summary of a customer's chat with a car dealership assistant.
+Keep vehicles, budgets, trade-ins, financing details, appointments and contact details the customer mentioned.
+Reply with the updated summary only.
+
+Current summary:
+{summary or "(none)"}
+
+New conversation turns:
+{transcript}"""
+        
+        status_code, response_data = await self._post({
+            "model": SUMMARY_MODEL,
+            "max_tokens": SUMMARY_MAX_TOKENS,
+            "messages": [{"role": "user", "content": prompt}]
+        })
+        if status_code >= 400:
+            raise RuntimeError(f"Summary request failed with HTTP {status_code}")
+        
+        return "".join(
+            content.get("text", "")
+            for content in response_data.get("content", [])
+            if content.get("type") == "text"
+        ).strip()
+    
+    async def _post(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        POST a payload to the Messages API over the pooled keep-alive session
+        
+        Args:
+            payload: Request body
+            
+        Returns:
+            Tuple of HTTP status code and decoded JSON body
+        """
+        session = session_registry.get("anthropic")
+        async with session.post(self.api_url, headers=self.headers, json=payload) as response:
+            logger.info(f"API Response Status: {response.status}")
+            try:
+                response_data = await response.json(content_type=None)
+            except json.JSONDecodeError:
+                response_data = {"error": {"message": await response.text()}}
+            return response.status, response_data or {}
+    
+    def reset_conversation(self, conversation_id: Optional[str] = None) -> None:
+        """Reset the history of a single conversation"""
+        self.store.reset(conversation_id or self.DEFAULT_CONVERSATION_ID)
         logger.info("Conversation history has been reset")
\ No newline at end of file
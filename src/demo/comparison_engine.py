@@ -0,0 +1,240 @@
+"""
+Vectorized side-by-side vehicle comparison over a column matrix of specs
+"""
+
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from inventory_db import InventoryDB
+from spec_cache import SpecCache, spec_key
+
+# Compared attributes: (name, unit, 1 if higher is better else -1)
+ATTRIBUTES = [
+    ("price", "$", -1),
+    ("mpg", "mpg", 1),
+    ("range_miles", "mi", 1),
+    ("horsepower", "hp", 1),
+    ("seating", "seats", 1),
+    ("cargo_cu_ft", "cu ft", 1),
+    ("safety_stars", "stars", 1)
+]
+
+ATTRIBUTE_NAMES = [name for name, _, _ in ATTRIBUTES]
+
+# Spec document keys (inventory records, CarAPI and NHTSA responses) for each attribute
+SPEC_KEYS = {
+    "price": ("price", "msrp", "base_msrp"),
+    "mpg": ("mpg", "mpg_combined", "combined_mpg", "mpge", "combined_mpge"),
+    "range_miles": ("range_miles", "range", "electric_range", "ev_range"),
+    "horsepower": ("horsepower", "hp", "horsepower_hp"),
+    "seating": ("seating", "seats", "seating_capacity"),
+    "cargo_cu_ft": ("cargo_cu_ft", "cargo_space", "cargo_capacity", "cargo_volume"),
+    "safety_stars": ("safety_stars", "overall_rating", "OverallRating")
+}
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def spec_row(*documents: Optional[Dict[str, Any]]) -> List[float]:
+    """
+    Normalized attribute values from spec documents, first document first
+
+    City/highway MPG pairs are averaged when no combined figure is given.
+    NHTSA responses are read from their first "Results" entry.
+
+    Returns:
+        One value per attribute, NaN where unknown
+    """
+    row = [np.nan] * len(ATTRIBUTES)
+    for document in documents:
+        if not document:
+            continue
+        if isinstance(document.get("Results"), list) and document["Results"]:
+            document = document["Results"][0]
+        for position, name in enumerate(ATTRIBUTE_NAMES):
+            if not np.isnan(row[position]):
+                continue
+            for key in SPEC_KEYS[name]:
+                if key in document:
+                    row[position] = _number(document[key])
+                    if not np.isnan(row[position]):
+                        break
+        position = ATTRIBUTE_NAMES.index("mpg")
+        if np.isnan(row[position]) and "mpg_city" in document and "mpg_highway" in document:
+            row[position] = (_number(document["mpg_city"]) + _number(document["mpg_highway"])) / 2
+    return row
+
+
+def vehicle_label(vehicle: Dict[str, Any]) -> str:
+    return " ".join(str(vehicle[key]) for key in ("year", "make", "model", "trim") if vehicle.get(key))
+
+
+class ComparisonEngine:
+    """
+    Compares inventory vehicles attribute by attribute in one NumPy pass.
+
+    Specs for every inventory vehicle are kept in a float matrix with one
+    column per attribute (NaN where unknown), built from the inventory
+    records and whatever the spec cache holds. It is rebuilt only when the
+    inventory has changed since the last build. A comparison slices the
+    rows it needs and computes rankings, differences from the best value
+    and winners for all attributes at once, so Claude gets a compact table
+    to narrate instead of raw spec documents.
+    """
+
+    def __init__(self, inventory: InventoryDB, spec_cache: Optional[SpecCache] = None):
+        self.logger = logging.getLogger(__name__)
+        self.inventory = inventory
+        self.spec_cache = spec_cache
+        # +1 where higher is better, -1 where lower is better
+        self.direction = np.array([sign for _, _, sign in ATTRIBUTES], dtype=float)
+        self.matrix = np.empty((0, len(ATTRIBUTES)))
+        self.ids: List[str] = []
+        self.body_styles = np.array([], dtype=object)
+        self.available = np.array([], dtype=bool)
+        self._rows: Dict[str, int] = {}
+        self._version: Optional[int] = None
+
+    def refresh(self, force: bool = False) -> None:
+        """Rebuild the spec matrix if the inventory changed"""
+        if not force and self._version == self.inventory.version:
+            return
+        vehicles = list(self.inventory.vehicles.values())
+        self.matrix = np.array(
+            [spec_row(vehicle, *self._cached_specs(vehicle)) for vehicle in vehicles], dtype=float
+        ).reshape(len(vehicles), len(ATTRIBUTES))
+        self.ids = [vehicle["id"] for vehicle in vehicles]
+        self._rows = {vehicle_id: row for row, vehicle_id in enumerate(self.ids)}
+        self.body_styles = np.array([vehicle.get("body_style") for vehicle in vehicles], dtype=object)
+        self.available = np.array([vehicle.get("status") == "available" for vehicle in vehicles], dtype=bool)
+        self._version = self.inventory.version
+
+    def _cached_specs(self, vehicle: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], ...]:
+        """Spec and safety documents for a vehicle from the spec cache (no network calls)"""
+        if self.spec_cache is None:
+            return ()
+        return tuple(
+            self.spec_cache.peek(spec_key(kind, vehicle.get("make"), vehicle.get("model"), vehicle.get("year")))
+            for kind in ("specs", "safety")
+        )
+
+    def vehicles_for_models(self, models: List[Tuple[str, str]]) -> List[str]:
+        """Lowest-priced available vehicle ID for each (make, model) that is in stock"""
+        ids = []
+        for make, model in models:
+            matches = self.inventory.query(make=make, model=model, status="available", sort="price", limit=1)
+            if matches:
+                ids.append(matches[0]["id"])
+        return ids
+
+    def compare(self, vehicle_ids: List[str]) -> Dict[str, Any]:
+        """
+        Compare vehicles on every attribute
+
+        Args:
+            vehicle_ids: Inventory vehicle IDs (unknown IDs are ignored)
+
+        Returns:
+            {"vehicles": [labels], "attributes": {name: {"unit", "values",
+            "rank", "diff_from_best"}}, "winners": {name: [labels]},
+            "class_leaders": {...}}; attributes unknown for every vehicle
+            are left out
+        """
+        self.refresh()
+        rows = [self._rows[vehicle_id] for vehicle_id in vehicle_ids if vehicle_id in self._rows]
+        labels = [vehicle_label(self.inventory.vehicles[self.ids[row]]) for row in rows]
+        if len(rows) < 2:
+            return {"vehicles": labels, "attributes": {}, "winners": {}, "class_leaders": {}}
+
+        values = self.matrix[rows]                        # vehicles x attributes
+        signed = values * self.direction                  # larger is better in every column
+        known = ~np.isnan(signed)
+        best = np.fmax.reduce(signed, axis=0)             # NaN only where no vehicle is known
+        is_best = known & (signed == best)
+        # Rank = 1 + number of vehicles strictly better (ties share a rank; NaN never compares better)
+        ranks = 1 + (signed[None, :, :] > signed[:, None, :]).sum(axis=1)
+        diff = np.abs(values - best * self.direction)
+
+        attributes = {}
+        winners = {}
+        for column, (name, unit, _) in enumerate(ATTRIBUTES):
+            if not known[:, column].any():
+                continue
+            attributes[name] = {
+                "unit": unit,
+                "values": [_plain(v) for v in values[:, column]],
+                "rank": [int(r) if k else None for r, k in zip(ranks[:, column], known[:, column])],
+                "diff_from_best": [_plain(d) for d in diff[:, column]]
+            }
+            winners[name] = [labels[i] for i in np.flatnonzero(is_best[:, column])]
+
+        styles = {style for style in self.body_styles[rows] if style}
+        return {
+            "vehicles": labels,
+            "attributes": attributes,
+            "winners": winners,
+            "class_leaders": {style: self.class_leaders(style) for style in sorted(styles)}
+        }
+
+    def class_leaders(self, body_style: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Best available vehicle in a body style for every attribute
+
+        Returns:
+            {attribute: {"vehicle": label, "value": value}}
+        """
+        self.refresh()
+        mask = self.available & (self.body_styles == body_style)
+        if not mask.any():
+            return {}
+        rows = np.flatnonzero(mask)
+        signed = self.matrix[rows] * self.direction
+        known = ~np.isnan(signed)
+        leaders = np.argmax(np.where(known, signed, -np.inf), axis=0)
+
+        result = {}
+        for column, name in enumerate(ATTRIBUTE_NAMES):
+            if known[:, column].any():
+                row = rows[leaders[column]]
+                result[name] = {
+                    "vehicle": vehicle_label(self.inventory.vehicles[self.ids[row]]),
+                    "value": _plain(self.matrix[row, column])
+                }
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get matrix size and coverage per attribute"""
+        self.refresh()
+        coverage = (~np.isnan(self.matrix)).sum(axis=0) if len(self.ids) else np.zeros(len(ATTRIBUTES))
+        return {
+            "vehicles": len(self.ids),
+            "coverage": {name: int(count) for name, count in zip(ATTRIBUTE_NAMES, coverage)}
+        }
+
+
+def _plain(value: float) -> Optional[float]:
+    """JSON-friendly number: None for NaN, int when whole"""
+    if np.isnan(value):
+        return None
+    return int(value) if float(value).is_integer() else round(float(value), 1)
+
+
+def format_comparison(comparison: Dict[str, Any]) -> str:
+    """Render a comparison as a compact text table for the prompt"""
+    lines = ["Attribute | " + " | ".join(comparison["vehicles"])]
+    for name, attribute in comparison["attributes"].items():
+        cells = [
+            "n/a" if value is None else f"{value}{'*' if rank == 1 else ''}"
+            for value, rank in zip(attribute["values"], attribute["rank"])
+        ]
+        lines.append(f"{name} ({attribute['unit']}) | " + " | ".join(cells))
+    lines.append("* best of the compared vehicles")
+    for style, leaders in comparison.get("class_leaders", {}).items():
+        best = ", ".join(f"{name}: {leader['vehicle']} ({leader['value']})" for name, leader in leaders.items())
+        lines.append(f"Best {style} in stock by {best}")
+    return "\n".join(lines)
@@ -14,12 +14,16 @@ load_dotenv()
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "sk-ant-REDACTED")
 ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
 ANTHROPIC_VERSION = "2023-06-01"
-MODEL = "claude-3-sonnet-20240229"
+MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")  # Must support prompt caching
+CLAUDE_CONNECT_TIMEOUT = float(os.getenv("CLAUDE_CONNECT_TIMEOUT", 5))  # seconds to establish a connection
+CLAUDE_READ_TIMEOUT = float(os.getenv("CLAUDE_READ_TIMEOUT", 60))  # seconds to wait between response chunks
 
-# System prompt for the chatbot
-SYSTEM_PROMPT = f"""
-Today's date is {datetime.now(pytz.timezone('America/Chicago')).strftime('%B %d, %Y')} (US Central Time)
+# Dealership time zone used for dates in prompts and responses
+TIMEZONE = "America/Chicago"
 
+# Static system prompt for the chatbot. It is sent as a cached prefix, so
+# per-request details such as today's date are appended separately.
+SYSTEM_PROMPT = """
 You are an AI assistant for Jack Ingram Motors, a premier automotive dealership in Montgomery, Alabama.
 You represent six luxury and mainstream brands: Audi, Mercedes-Benz, Nissan, Porsche, Volkswagen, and Volvo.
 
@@ -74,4 +78,100 @@ DEALERSHIP_INFO = {
 
 # Analytics Configuration
 ENABLE_ANALYTICS = True
-ANALYTICS_LOG_FILE = "chatbot_analytics.log"
\ No newline at end of file
+ANALYTICS_LOG_FILE = "chatbot_analytics.log"
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", 10000))  # events buffered in memory before overflow
+ANALYTICS_OVERFLOW = os.getenv("ANALYTICS_OVERFLOW", "drop")  # "drop" or "block" (wait up to ANALYTICS_BLOCK_TIMEOUT) when the queue is full
+ANALYTICS_BLOCK_TIMEOUT = float(os.getenv("ANALYTICS_BLOCK_TIMEOUT", 0.05))  # seconds
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", 256))  # events written per batch at most
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 1.0))  # seconds an event may wait for a batch to fill
+ANALYTICS_MAX_BYTES = int(os.getenv("ANALYTICS_MAX_BYTES", 64 * 1024 * 1024))  # log size that triggers rotation
+ANALYTICS_ROTATE_DAILY = os.getenv("ANALYTICS_ROTATE_DAILY", "true").lower() == "true"
+ANALYTICS_COMPRESSION = os.getenv("ANALYTICS_COMPRESSION", "gzip")  # rotated segments: "gzip", "zstd" or "none"
+ANALYTICS_FSYNC = os.getenv("ANALYTICS_FSYNC", "false").lower() == "true"  # fsync every batch, not just on rotation and shutdown
+ANALYTICS_STORE_DIR = os.getenv("ANALYTICS_STORE_DIR", "analytics_store")  # day-partitioned columnar copy of rotated log segments
+
+# Conversation Store Configuration
+CONVERSATION_STORE_SHARDS = int(os.getenv("CONVERSATION_STORE_SHARDS", 16))
+CONVERSATION_STORE_MAX_BYTES = int(os.getenv("CONVERSATION_STORE_MAX_BYTES", 64 * 1024 * 1024))  # Memory ceiling across all shards
+CONVERSATION_IDLE_TTL = int(os.getenv("CONVERSATION_IDLE_TTL", 1800))  # Drop conversations idle for 30 minutes
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", 100))  # Hard cap on messages kept per conversation
+
+# Context Window Configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 4000))  # Max history tokens sent per turn
+CONTEXT_COMPACT_TARGET = float(os.getenv("CONTEXT_COMPACT_TARGET", 0.6))  # Fraction of the budget kept after compaction
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "claude-3-haiku-20240307")
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", 400))
+
+# Knowledge Base Response Cache Configuration
+KB_CACHE_MAX_ENTRIES = int(os.getenv("KB_CACHE_MAX_ENTRIES", 10000))
+KB_CACHE_MAX_BYTES = int(os.getenv("KB_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+KB_CACHE_TTL = int(os.getenv("KB_CACHE_TTL", 24 * 60 * 60))  # Cache responses for 24 hours
+KB_CACHE_SWEEP_INTERVAL = int(os.getenv("KB_CACHE_SWEEP_INTERVAL", 300))  # seconds between full expiry sweeps
+
+# Query Normalization Configuration
+QUERY_SIMILARITY_ENABLED = os.getenv("QUERY_SIMILARITY_ENABLED", "true").lower() == "true"
+QUERY_SIMILARITY_THRESHOLD = float(os.getenv("QUERY_SIMILARITY_THRESHOLD", 0.85))  # Minimum cosine similarity to reuse an answer
+
+# Enrichment Fan-Out Configuration
+ENRICHMENT_DEADLINE = float(os.getenv("ENRICHMENT_DEADLINE", 2.5))  # seconds to wait for enrichment sources before calling Claude
+
+# Upstream Circuit Breaker Configuration
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", 60))  # seconds of call history considered
+BREAKER_MIN_FAILURES = int(os.getenv("BREAKER_MIN_FAILURES", 5))  # failures in the window before the breaker can open
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))  # failure share of windowed calls that opens the breaker
+BREAKER_OPEN_DURATION = float(os.getenv("BREAKER_OPEN_DURATION", 30))  # seconds before a half-open probe is allowed
+BREAKER_SLOW_CALL_RATIO = float(os.getenv("BREAKER_SLOW_CALL_RATIO", 0.8))  # share of the upstream's total timeout that counts as a failure
+
+# Vehicle Spec/Safety Cache Configuration
+SPEC_CACHE_PATH = os.getenv("SPEC_CACHE_PATH", "spec_cache.sqlite3")
+SPEC_CACHE_TTL = int(os.getenv("SPEC_CACHE_TTL", 30 * 24 * 60 * 60))  # Specs and ratings are fresh for 30 days
+SPEC_CACHE_MAX_STALE = int(os.getenv("SPEC_CACHE_MAX_STALE", 180 * 24 * 60 * 60))  # Serve stale entries (while refreshing) for up to 180 days
+SPEC_PREWARM_CONCURRENCY = int(os.getenv("SPEC_PREWARM_CONCURRENCY", 8))
+
+# Dealership Site Crawl Configuration
+CRAWL_ENABLED = os.getenv("CRAWL_ENABLED", "true").lower() == "true"
+CRAWL_INTERVAL = float(os.getenv("CRAWL_INTERVAL", 15 * 60))  # seconds between crawls of the dealership sites
+CRAWL_JITTER = float(os.getenv("CRAWL_JITTER", 0.1))  # +/- share of the interval, so workers and restarts don't align
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 4))  # pages crawled at once
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "site_snapshot.json")
+
+# Dealership Page Scraping Configuration
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", 2))  # processes parsing HTML off the event loop
+SCRAPE_CHUNK_SIZE = int(os.getenv("SCRAPE_CHUNK_SIZE", 64 * 1024))  # bytes read and fed to the parser at a time
+SCRAPE_MAX_PAGE_BYTES = int(os.getenv("SCRAPE_MAX_PAGE_BYTES", 5 * 1024 * 1024))  # larger pages are truncated
+SCRAPE_PROMPT_RECORDS = int(os.getenv("SCRAPE_PROMPT_RECORDS", 20))  # scraped vehicles and offers quoted in the prompt at most
+
+# Inventory Service Configuration
+INVENTORY_API_URL = os.getenv("INVENTORY_API_URL", "http://localhost:5001")
+INVENTORY_SERVICE_PORT = int(os.getenv("INVENTORY_SERVICE_PORT", 5001))
+INVENTORY_DB_PATH = os.getenv("INVENTORY_DB_PATH", "inventory.sqlite3")
+INVENTORY_BATCH_SIZE = int(os.getenv("INVENTORY_BATCH_SIZE", 1000))  # feed rows written per transaction
+INVENTORY_FTS_ENABLED = os.getenv("INVENTORY_FTS_ENABLED", "true").lower() == "true"  # full-text search over trim and description
+INVENTORY_PAGE_SIZE = int(os.getenv("INVENTORY_PAGE_SIZE", 20))  # vehicles per /vehicles page by default
+INVENTORY_MAX_PAGE_SIZE = int(os.getenv("INVENTORY_MAX_PAGE_SIZE", 100))
+
+# Vehicle Recommender Configuration
+RECOMMENDER_TOP_K = int(os.getenv("RECOMMENDER_TOP_K", 3))  # in-stock alternatives offered for an out-of-stock model
+
+# Payment Calculator Configuration
+FINANCE_STANDARD_APR = float(os.getenv("FINANCE_STANDARD_APR", 6.9))  # percent, for vehicles without an APR offer
+FINANCE_TERMS = [int(t) for t in os.getenv("FINANCE_TERMS", "36,48,60,72").split(",")]  # loan lengths in months
+FINANCE_DOWN_PAYMENTS = [int(d) for d in os.getenv("FINANCE_DOWN_PAYMENTS", "0,2000,5000").split(",")]  # precomputed down payments
+
+# Upstream HTTP Pool Configuration
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))  # Total open connections across all upstreams
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))  # seconds
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))  # seconds an idle connection is kept open
+
+# Per-upstream timeouts in seconds
+HTTP_TIMEOUTS = {
+    "default": {"connect": 5, "total": 30},
+    "anthropic": {"connect": CLAUDE_CONNECT_TIMEOUT, "read": CLAUDE_READ_TIMEOUT, "total": None},
+    "inventory": {"connect": 2, "total": 5},
+    "car": {"connect": 3, "total": 8},
+    "nhtsa": {"connect": 3, "total": 8},
+    "perplexity": {"connect": 5, "total": 20},
+    "web": {"connect": 5, "total": 15},
+    "firecrawl": {"connect": 5, "total": 60}
+}
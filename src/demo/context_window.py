@@ -0,0 +1,104 @@
+"""
+Token-budgeted conversation windowing with running summary compaction
+"""
+
+import logging
+from typing import Dict, List, Any, Callable, Awaitable, Optional
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_COMPACT_TARGET
+
+# Rough characters-per-token ratio for English text with Claude's tokenizer
+CHARS_PER_TOKEN = 4
+
+# Per-message framing overhead (role markers etc.) in tokens
+MESSAGE_TOKEN_OVERHEAD = 4
+
+# Summarizer signature: (previous summary, messages to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_TOKEN_OVERHEAD
+
+class ContextWindow:
+    """
+    Builds the message history sent to Claude within a token budget.
+
+    Recent turns are sent verbatim. When they no longer fit, the oldest turns
+    are folded into a running summary that is stored with the conversation
+    and sent alongside the system prompt. Compaction shrinks the window well
+    below the budget so the summary is only recomputed every few turns rather
+    than on every message.
+    """
+
+    def __init__(
+        self,
+        store,
+        summarizer: Summarizer,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        compact_target: float = CONTEXT_COMPACT_TARGET
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.summarizer = summarizer
+        self.budget = budget
+        self.compact_target = compact_target
+
+    async def build(self, conversation_id: str) -> Dict[str, Any]:
+        """
+        Get the history to send for the next turn of a conversation
+
+        Args:
+            conversation_id: Conversation to build the window for
+
+        Returns:
+            Dict with "summary" (may be empty) and "messages" as
+            {"role", "content"} dicts, oldest first
+        """
+        state = self.store.get_window_state(conversation_id)
+        summary = state["summary"]
+        messages = state["messages"]
+
+        available = self.budget - (count_tokens(summary) if summary else 0)
+        if sum(m["tokens"] for m in messages) > available:
+            # Shrink to the compaction target so the next few turns fit without another summary
+            keep = self._window_start(messages, int(self.budget * self.compact_target))
+            folded, messages = messages[:keep], messages[keep:]
+            if folded:
+                summary = await self._fold(summary, folded)
+                self.store.set_summary(conversation_id, summary, folded[-1]["index"] + 1)
+
+        return {
+            "summary": summary,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages]
+        }
+
+    def _window_start(self, messages: List[Dict[str, Any]], budget: int) -> int:
+        """Find the first message of the newest run of messages that fits the budget"""
+        total = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            total += messages[i]["tokens"]
+            if total > budget:
+                break
+            start = i
+
+        # The Messages API requires the history to open with a user turn
+        while start < len(messages) and messages[start]["role"] != "user":
+            start += 1
+        return start
+
+    async def _fold(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Fold older messages into the running summary"""
+        try:
+            return await self.summarizer(summary, messages) or self._fallback_summary(summary, messages)
+        except Exception as e:
+            self.logger.error(f"Error summarizing conversation: {str(e)}")
+            return self._fallback_summary(summary, messages)
+
+    def _fallback_summary(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Cheap extractive summary used when the summarizer is unavailable"""
+        questions = [
+            f"- Customer asked: {m['content'][:150]}"
+            for m in messages if m["role"] == "user"
+        ]
+        return "\n".join(filter(None, [summary] + questions))
@@ -0,0 +1,301 @@
+"""
+Sharded conversation store for per-session chat history
+"""
+
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+from context_window import count_tokens
+from config import (
+    CONVERSATION_STORE_SHARDS,
+    CONVERSATION_STORE_MAX_BYTES,
+    CONVERSATION_IDLE_TTL,
+    CONVERSATION_MAX_MESSAGES
+)
+
+# Compact role encoding for stored messages
+ROLES = ("user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Approximate fixed cost of a stored message/conversation beyond its text
+MESSAGE_OVERHEAD = 64
+CONVERSATION_OVERHEAD = 256
+
+
+class _Message:
+    """Compact record for a single stored message"""
+
+    __slots__ = ("role", "content", "size", "tokens")
+
+    def __init__(self, role: int, content: str):
+        self.role = role
+        self.content = content
+        self.size = sys.getsizeof(content) + MESSAGE_OVERHEAD
+        self.tokens = count_tokens(content)
+
+
+class _Conversation:
+    """Messages and bookkeeping for one conversation"""
+
+    __slots__ = ("messages", "size", "last_access", "offset", "summary", "summarized")
+
+    def __init__(self, now: float):
+        self.messages: List[_Message] = []
+        self.size = CONVERSATION_OVERHEAD
+        self.last_access = now
+        # Absolute index of messages[0]; older messages were trimmed
+        self.offset = 0
+        # Running summary covering every message with absolute index < summarized
+        self.summary = ""
+        self.summarized = 0
+
+
+class _Shard:
+    """One lock-striped partition of the store, kept in LRU order"""
+
+    __slots__ = ("lock", "conversations", "size", "evictions", "expirations")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class ConversationStore:
+    """
+    Per-conversation message history keyed by conversation ID.
+
+    Conversations are spread over independently locked shards so concurrent
+    requests for different sessions do not contend. Each shard keeps its
+    conversations in LRU order and drops them when they have been idle for
+    longer than the TTL or when the shard exceeds its share of the memory
+    ceiling.
+    """
+
+    def __init__(
+        self,
+        shards: int = CONVERSATION_STORE_SHARDS,
+        max_bytes: int = CONVERSATION_STORE_MAX_BYTES,
+        idle_ttl: float = CONVERSATION_IDLE_TTL,
+        max_messages: int = CONVERSATION_MAX_MESSAGES
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._shard_max_bytes = max(1, max_bytes // len(self._shards))
+
+    def _shard_for(self, conversation_id: str) -> _Shard:
+        return self._shards[hash(conversation_id) % len(self._shards)]
+
+    def _is_idle(self, conversation: _Conversation, now: float) -> bool:
+        return now - conversation.last_access > self.idle_ttl
+
+    def _get(self, shard: _Shard, conversation_id: str, now: float) -> Optional[_Conversation]:
+        """Look up a conversation and mark it as recently used (shard lock held)"""
+        conversation = shard.conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        if self._is_idle(conversation, now):
+            del shard.conversations[conversation_id]
+            shard.size -= conversation.size
+            shard.expirations += 1
+            return None
+        conversation.last_access = now
+        shard.conversations.move_to_end(conversation_id)
+        return conversation
+
+    def _evict(self, shard: _Shard, now: float) -> None:
+        """Drop idle and least recently used conversations (shard lock held)"""
+        conversations = shard.conversations
+
+        # Idle conversations collect at the LRU end of the shard
+        while conversations:
+            conversation = next(iter(conversations.values()))
+            if not self._is_idle(conversation, now):
+                break
+            conversations.popitem(last=False)
+            shard.size -= conversation.size
+            shard.expirations += 1
+
+        # Always keep the conversation that was just written
+        while shard.size > self._shard_max_bytes and len(conversations) > 1:
+            _, conversation = conversations.popitem(last=False)
+            shard.size -= conversation.size
+            shard.evictions += 1
+
+    def _append(self, shard: _Shard, conversation: _Conversation, role: str, content: str) -> None:
+        """Append a message, trimming the oldest past the per-conversation cap (shard lock held)"""
+        message = _Message(ROLE_CODES[role], content)
+        conversation.messages.append(message)
+        conversation.size += message.size
+        shard.size += message.size
+
+        overflow = len(conversation.messages) - self.max_messages
+        if overflow > 0:
+            for dropped in conversation.messages[:overflow]:
+                conversation.size -= dropped.size
+                shard.size -= dropped.size
+            del conversation.messages[:overflow]
+            conversation.offset += overflow
+
+    def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """
+        Get the message history for a conversation
+
+        Args:
+            conversation_id: Conversation to look up
+
+        Returns:
+            List of {"role", "content"} messages, oldest first
+        """
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            conversation = self._get(shard, conversation_id, time.monotonic())
+            if conversation is None:
+                return []
+            return [
+                {"role": ROLES[message.role], "content": message.content}
+                for message in conversation.messages
+            ]
+
+    def get_window_state(self, conversation_id: str) -> Dict[str, Any]:
+        """
+        Get the running summary and the messages it does not yet cover
+
+        Args:
+            conversation_id: Conversation to look up
+
+        Returns:
+            Dict with "summary", "summarized" (absolute index the summary
+            covers up to) and "messages" ({"index", "role", "content",
+            "tokens"} records, oldest first)
+        """
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            conversation = self._get(shard, conversation_id, time.monotonic())
+            if conversation is None:
+                return {"summary": "", "summarized": 0, "messages": []}
+            start = max(0, conversation.summarized - conversation.offset)
+            return {
+                "summary": conversation.summary,
+                "summarized": conversation.summarized,
+                "messages": [
+                    {
+                        "index": conversation.offset + i,
+                        "role": ROLES[message.role],
+                        "content": message.content,
+                        "tokens": message.tokens
+                    }
+                    for i, message in enumerate(conversation.messages[start:], start)
+                ]
+            }
+
+    def set_summary(self, conversation_id: str, summary: str, summarized: int) -> bool:
+        """
+        Store a running summary covering messages before an absolute index
+
+        Args:
+            conversation_id: Conversation to update
+            summary: Summary text
+            summarized: Absolute index of the first message not covered
+
+        Returns:
+            True if stored, False if a newer summary was already in place
+        """
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            conversation = self._get(shard, conversation_id, time.monotonic())
+            if conversation is None or summarized <= conversation.summarized:
+                return False
+            delta = sys.getsizeof(summary) - sys.getsizeof(conversation.summary)
+            conversation.summary = summary
+            conversation.summarized = summarized
+            conversation.size += delta
+            shard.size += delta
+            return True
+
+    def append(self, conversation_id: str, role: str, content: str) -> None:
+        """Append a single message to a conversation"""
+        self.extend(conversation_id, [(role, content)])
+
+    def append_turn(self, conversation_id: str, user_message: str, assistant_message: str) -> None:
+        """Atomically append a user message and the assistant's reply"""
+        self.extend(conversation_id, [("user", user_message), ("assistant", assistant_message)])
+
+    def extend(self, conversation_id: str, messages: List[tuple]) -> None:
+        """
+        Append (role, content) messages to a conversation
+
+        Args:
+            conversation_id: Conversation to update
+            messages: Messages to append, oldest first
+        """
+        now = time.monotonic()
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            conversation = self._get(shard, conversation_id, now)
+            if conversation is None:
+                conversation = _Conversation(now)
+                shard.conversations[conversation_id] = conversation
+                shard.size += conversation.size
+            for role, content in messages:
+                self._append(shard, conversation, role, content)
+            self._evict(shard, now)
+
+    def replace(self, conversation_id: str, messages: List[Dict[str, str]]) -> None:
+        """Replace a conversation's history with the given messages"""
+        self.reset(conversation_id)
+        if messages:
+            self.extend(conversation_id, [(m["role"], m["content"]) for m in messages])
+
+    def reset(self, conversation_id: str) -> None:
+        """Remove a conversation and its history"""
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            conversation = shard.conversations.pop(conversation_id, None)
+            if conversation is not None:
+                shard.size -= conversation.size
+
+    def sweep(self) -> int:
+        """
+        Drop idle conversations from every shard
+
+        Returns:
+            Number of conversations removed
+        """
+        removed = 0
+        now = time.monotonic()
+        for shard in self._shards:
+            with shard.lock:
+                before = len(shard.conversations)
+                self._evict(shard, now)
+                removed += before - len(shard.conversations)
+        return removed
+
+    def __contains__(self, conversation_id: str) -> bool:
+        shard = self._shard_for(conversation_id)
+        with shard.lock:
+            return conversation_id in shard.conversations
+
+    def __len__(self) -> int:
+        return sum(len(shard.conversations) for shard in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get store size and eviction counters"""
+        totals = {"conversations": 0, "bytes": 0, "evictions": 0, "expirations": 0}
+        for shard in self._shards:
+            with shard.lock:
+                totals["conversations"] += len(shard.conversations)
+                totals["bytes"] += shard.size
+                totals["evictions"] += shard.evictions
+                totals["expirations"] += shard.expirations
+        totals["max_bytes"] = self.max_bytes
+        totals["shards"] = len(self._shards)
+        return totals
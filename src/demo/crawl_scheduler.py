@@ -0,0 +1,163 @@
+"""
+Background scheduler that keeps the dealership site snapshot fresh
+"""
+
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from firecrawl_client import FireCrawlClient
+from realtime_client import RealtimeClient
+from snapshot_store import SnapshotStore
+from config import CRAWL_INTERVAL, CRAWL_JITTER, CRAWL_CONCURRENCY
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process crawls there
+    fcntl = None
+
+
+class CrawlScheduler:
+    """
+    Crawls the dealership sites on a fixed cadence and publishes snapshots.
+
+    Crawling happens off the chat hot path: requests only read the latest
+    snapshot. When several worker processes share a host, an advisory file
+    lock elects one of them to crawl; the others reload the snapshot the
+    crawler writes to disk. Sites that fail in one crawl keep their data
+    from the previous snapshot. When a RealtimeClient is given, the structured
+    records it scrapes from the main site are published under "main" too.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        crawler: Optional[FireCrawlClient] = None,
+        interval: float = CRAWL_INTERVAL,
+        jitter: float = CRAWL_JITTER,
+        concurrency: int = CRAWL_CONCURRENCY,
+        web: Optional[RealtimeClient] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.crawler = crawler if crawler is not None else FireCrawlClient()
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.web = web
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self._crawls = 0
+        self._failures = 0
+        self._last_duration: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process does the crawling"""
+        return self._lock_file is not None or fcntl is None or not self.store.path
+
+    def start(self) -> None:
+        """Start the background loop on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self.store.load()
+        self._acquire_leadership()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background loop and release leadership"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def crawl_once(self) -> Dict[str, Any]:
+        """
+        Crawl every site and publish the merged result
+
+        Returns:
+            The published snapshot data
+        """
+        started = time.monotonic()
+        previous = self.store.latest().data
+        try:
+            crawled = await self.crawler.crawl_dealership_sites(concurrency=self.concurrency)
+        except Exception as e:
+            self._failures += 1
+            self.logger.error(f"Dealership crawl failed: {str(e)}")
+            return previous
+
+        if self.web is not None:
+            website = await self._scrape_website()
+            if website:
+                crawled.setdefault("main", {})["website"] = website
+
+        # Keep the last good data for sites or pages that failed this time
+        merged = {brand: dict(pages) for brand, pages in previous.items()}
+        for brand, pages in crawled.items():
+            merged.setdefault(brand, {}).update(pages)
+
+        self._crawls += 1
+        self._last_duration = time.monotonic() - started
+        self.store.publish(merged)
+        return merged
+
+    async def _scrape_website(self) -> Dict[str, Any]:
+        """Structured records from the main site, without pages that failed"""
+        try:
+            pages = await self.web.get_web_data()
+        except Exception as e:
+            self.logger.error(f"Website scrape failed: {str(e)}")
+            return {}
+        return {url: records for url, records in pages.items() if "error" not in records}
+
+    async def _run(self) -> None:
+        # Crawl immediately unless a recent snapshot survived the restart
+        delay = 0.0 if self._is_stale() else self._next_delay()
+        while True:
+            await asyncio.sleep(delay)
+            if not self.is_leader:
+                self._acquire_leadership()
+            if self.is_leader:
+                await self.crawl_once()
+            else:
+                self.store.load()
+            delay = self._next_delay()
+
+    def _next_delay(self) -> float:
+        """Interval with random jitter, so processes and restarts don't stay aligned"""
+        return max(1.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _is_stale(self) -> bool:
+        snapshot = self.store.latest()
+        return snapshot.version == 0 or time.time() - snapshot.created_at >= self.interval
+
+    def _acquire_leadership(self) -> None:
+        """Try to take the crawl lock without blocking (no-op where locking is unavailable)"""
+        if fcntl is None or not self.store.path or self._lock_file is not None:
+            return
+        lock_file = open(f"{self.store.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        self.logger.info("This process is the dealership site crawler")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get crawl counters and the current snapshot version"""
+        return {
+            "leader": self.is_leader,
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "crawls": self._crawls,
+            "failures": self._failures,
+            "last_duration_seconds": round(self._last_duration, 2) if self._last_duration is not None else None,
+            "scraper": self.web.scraper.stats() if self.web is not None else None,
+            "snapshot": self.store.stats()
+        }
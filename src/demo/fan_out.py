@@ -0,0 +1,98 @@
+"""
+Deadline-bounded parallel fan-out over enrichment sources
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Awaitable, Optional
+from config import ENRICHMENT_DEADLINE
+
+# Per-source outcome labels
+ARRIVED = "arrived"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+
+
+class FanOutScheduler:
+    """
+    Runs enrichment sources concurrently under a shared latency budget.
+
+    Every source starts at once, so a request waits for the slowest source
+    rather than the sum of all of them, and never longer than the deadline.
+    Sources still running at the deadline are cancelled and the results
+    that did arrive are returned.
+    """
+
+    def __init__(self, deadline: float = ENRICHMENT_DEADLINE):
+        self.logger = logging.getLogger(__name__)
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    async def run(
+        self,
+        sources: Dict[str, Awaitable[Any]],
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Run sources until they finish or the deadline passes
+
+        Args:
+            sources: Awaitables keyed by source name
+            deadline: Latency budget in seconds (defaults to the scheduler's)
+
+        Returns:
+            Dict with "results" (values of sources that arrived in time),
+            "sources" (name -> arrived/timed_out/failed) and "elapsed_ms"
+        """
+        started = time.monotonic()
+        budget = self.deadline if deadline is None else deadline
+        tasks = {asyncio.ensure_future(source): name for name, source in sources.items()}
+        results: Dict[str, Any] = {}
+        outcomes: Dict[str, str] = {}
+
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=budget)
+
+            for task in done:
+                name = tasks[task]
+                if task.cancelled() or task.exception() is not None:
+                    error = "cancelled" if task.cancelled() else task.exception()
+                    self.logger.error(f"Enrichment source {name} failed: {error}")
+                    outcomes[name] = FAILED
+                else:
+                    results[name] = task.result()
+                    outcomes[name] = ARRIVED
+
+            for task in pending:
+                outcomes[tasks[task]] = TIMED_OUT
+                task.cancel()
+            if pending:
+                dropped = ", ".join(sorted(tasks[task] for task in pending))
+                self.logger.warning(f"Enrichment deadline of {budget}s reached; cancelled {dropped}")
+                # Let cancelled sources unwind; a shared upstream call is cancelled once its last
+                # waiter leaves, so its connection goes back to the pool and its breaker sees the timeout
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self._record(outcomes)
+        return {
+            "results": results,
+            "sources": {name: outcomes[name] for name in sources},
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+
+    def _record(self, outcomes: Dict[str, str]) -> None:
+        with self._lock:
+            for name, outcome in outcomes.items():
+                counts = self._counts.setdefault(name, {ARRIVED: 0, TIMED_OUT: 0, FAILED: 0})
+                counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the deadline and per-source outcome counters"""
+        with self._lock:
+            return {
+                "deadline": self.deadline,
+                "sources": {name: dict(counts) for name, counts in self._counts.items()}
+            }
@@ -0,0 +1,259 @@
+"""
+Monthly payment table for every in-stock vehicle and finance/lease plan
+"""
+
+import re
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from inventory_db import InventoryDB
+from comparison_engine import vehicle_label
+from config import FINANCE_STANDARD_APR, FINANCE_TERMS, FINANCE_DOWN_PAYMENTS
+
+_AMOUNT = r"\$\s?(\d[\d,]*(?:\.\d+)?)"
+_APR = re.compile(r"(\d+(?:\.\d+)?)\s?%\s?apr(?:\s(?:for\s)?(?:up to\s)?(\d+)\s?(?:-\s?)?(?:months?|mos?)\b)?")
+_LEASE = re.compile(_AMOUNT + r"\s?(?:/|per |a )\s?(?:mo|month)\b(?:\s(?:for\s)?(\d+)\s?(?:-\s?)?(?:months?|mos?)\b)?")
+_DUE = re.compile(_AMOUNT + r"\s(?:down|due at signing)")
+_CASH = re.compile(_AMOUNT + r"\s(?:customer cash|cash back|bonus cash|rebate)")
+
+
+def _dollars(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def parse_offer_terms(offer: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Structured plans from an offer's description
+
+    "$2000 Customer Cash + 1.9% APR for 60 months" gives one finance plan
+    (apr 1.9, months 60, cash 2000); an APR without a term applies to every
+    standard term, and cash without an APR comes with the standard rate.
+    "$299/mo for 36 months, $3999 down" gives one lease plan.
+
+    Returns:
+        Plans with "kind" ("finance" or "lease"), "months", "apr", "cash",
+        "monthly" and "due"; empty when the description has no terms
+    """
+    text = (offer.get("description") or "").lower()
+    cash = sum((_dollars(m.group(1)) for m in _CASH.finditer(text)), 0.0)
+    plans = []
+
+    lease = _LEASE.search(text)
+    if lease and lease.group(2):
+        due = _DUE.search(text)
+        plans.append({
+            "kind": "lease", "months": int(lease.group(2)), "apr": None, "cash": 0.0,
+            "monthly": _dollars(lease.group(1)), "due": _dollars(due.group(1)) if due else 0.0
+        })
+
+    rates = [(float(m.group(1)), int(m.group(2)) if m.group(2) else None) for m in _APR.finditer(text)]
+    if cash and not rates:
+        rates = [(FINANCE_STANDARD_APR, None)]
+    for apr, months in rates:
+        for term in [months] if months else FINANCE_TERMS:
+            plans.append({"kind": "finance", "months": term, "apr": apr, "cash": cash, "monthly": None, "due": None})
+    return plans
+
+
+def amortization_factors(apr: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Monthly payment per dollar financed for arrays of APRs (percent) and terms"""
+    rate = apr / 1200
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = rate / (1 - (1 + rate) ** -months)
+    return np.where(rate > 0, factor, 1 / months)
+
+
+class FinanceEngine:
+    """
+    Precomputed monthly payments for in-stock vehicles.
+
+    Offer descriptions are parsed into plans once per offer text. Every
+    available vehicle is paired with the standard-rate plans and the plans
+    of the offers for its make and model, giving one row per
+    vehicle/plan pair. A payment is linear in the down payment:
+
+        payment = max(base - down, 0) * factor
+
+    For a loan, base is the price less offer cash and factor is the
+    amortization factor of the APR and term. For a lease, base is the
+    advertised payment times the term plus the advertised amount due at
+    signing, spread over the term, so a different down payment moves the
+    payment by its share of each month. Payments for the standard down
+    payments are computed for all rows in one NumPy expression, and any
+    other down payment is one vectorized pass over the rows. The table is
+    rebuilt only when the inventory or the offers change.
+    """
+
+    def __init__(self, inventory: InventoryDB):
+        self.logger = logging.getLogger(__name__)
+        self.inventory = inventory
+        self.down_payments = np.array(sorted(set(FINANCE_DOWN_PAYMENTS)), dtype=float)
+        self.plans: List[Dict[str, Any]] = []
+        self.vehicle_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.plan_months = np.array([], dtype=int)
+        # One entry per vehicle/plan row
+        self.row_vehicle = np.array([], dtype=int)
+        self.row_plan = np.array([], dtype=int)
+        self.base = np.array([])
+        self.factor = np.array([])
+        self.payments = np.empty((0, len(self.down_payments)))
+        self._terms: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self.rebuilds = 0
+
+    def offer_terms(self, offer: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Parsed plans of an offer, parsed again only if its description changed"""
+        cached = self._terms.get(offer["id"])
+        if cached is None or cached[0] != offer.get("description"):
+            cached = self._terms[offer["id"]] = (offer.get("description"), parse_offer_terms(offer))
+        return cached[1]
+
+    def refresh(self, force: bool = False) -> None:
+        """Rebuild the payment table if vehicles or offers changed"""
+        self.inventory.get_offers()  # drops expired offers, which bumps offers_version
+        version = (self.inventory.version, self.inventory.offers_version)
+        if not force and self._version == version:
+            return
+
+        standard = [
+            {"kind": "finance", "months": months, "apr": FINANCE_STANDARD_APR, "cash": 0.0,
+             "monthly": None, "due": None, "offer_id": None, "title": "Standard financing"}
+            for months in FINANCE_TERMS
+        ]
+        plans = list(standard)
+        vehicles = self.inventory.query(status="available")
+        rows_vehicle, rows_plan = [], []
+        offer_plans: Dict[str, List[int]] = {}
+        model_plans: Dict[Tuple[str, str], List[int]] = {}
+        for position, vehicle in enumerate(vehicles):
+            key = ((vehicle.get("make") or "").lower(), (vehicle.get("model") or "").lower())
+            if key not in model_plans:
+                plan_ids = list(range(len(standard)))
+                for offer in self.inventory.get_offers(vehicle.get("make"), vehicle.get("model")):
+                    if offer["id"] not in offer_plans:
+                        terms = self.offer_terms(offer)
+                        offer_plans[offer["id"]] = list(range(len(plans), len(plans) + len(terms)))
+                        plans.extend(
+                            dict(plan, offer_id=offer["id"], title=offer.get("title", offer["id"])) for plan in terms
+                        )
+                    plan_ids.extend(offer_plans[offer["id"]])
+                model_plans[key] = plan_ids
+            rows_vehicle.extend([position] * len(model_plans[key]))
+            rows_plan.extend(model_plans[key])
+
+        self.plans = plans
+        self.vehicle_ids = [vehicle["id"] for vehicle in vehicles]
+        self._positions = {vehicle_id: position for position, vehicle_id in enumerate(self.vehicle_ids)}
+        self.row_vehicle = np.array(rows_vehicle, dtype=int)
+        self.row_plan = np.array(rows_plan, dtype=int)
+
+        lease = np.array([plan["kind"] == "lease" for plan in plans], dtype=bool)
+        months = np.array([plan["months"] for plan in plans], dtype=float)
+        self.plan_months = months.astype(int)
+        apr = np.array([plan["apr"] or 0.0 for plan in plans], dtype=float)
+        cash = np.array([plan["cash"] for plan in plans], dtype=float)
+        lease_total = np.array([(plan["monthly"] or 0) * plan["months"] + (plan["due"] or 0) for plan in plans])
+        plan_factor = np.where(lease, 1 / months, amortization_factors(apr, months))
+        prices = np.array([float(vehicle.get("price") or 0) for vehicle in vehicles])
+
+        if len(self.row_plan):
+            self.base = np.where(
+                lease[self.row_plan], lease_total[self.row_plan],
+                prices[self.row_vehicle] - cash[self.row_plan]
+            )
+            self.factor = plan_factor[self.row_plan]
+        else:
+            self.base = np.array([])
+            self.factor = np.array([])
+        # rows x down payments
+        self.payments = np.maximum(self.base[:, None] - self.down_payments[None, :], 0) * self.factor[:, None]
+        self._version = version
+        self.rebuilds += 1
+
+    def payments_for(
+        self,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        vehicle_ids: Optional[List[str]] = None,
+        down: Optional[float] = None,
+        months: Optional[int] = None,
+        max_payment: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Monthly payments for in-stock vehicles, lowest first
+
+        Args:
+            make, model: Only vehicles of this make and model
+            vehicle_ids: Only these vehicles
+            down: Down payment (defaults to the smallest precomputed one)
+            months: Only plans of this term
+            max_payment: Only payments up to this amount
+            limit: Maximum number of rows
+
+        Returns:
+            Rows with the vehicle, plan and payment details
+        """
+        self.refresh()
+        if not len(self.row_plan):
+            return []
+        mask = np.ones(len(self.row_plan), dtype=bool)
+        if make or model or vehicle_ids is not None:
+            ids = set(self.vehicle_ids if vehicle_ids is None else vehicle_ids)
+            if make or model:
+                ids &= {vehicle["id"] for vehicle in self.inventory.query(make=make, model=model, status="available")}
+            wanted = np.zeros(len(self.vehicle_ids), dtype=bool)
+            wanted[[self._positions[vehicle_id] for vehicle_id in ids if vehicle_id in self._positions]] = True
+            mask &= wanted[self.row_vehicle]
+        if months:
+            mask &= self.plan_months[self.row_plan] == months
+
+        down = self.down_payments[0] if down is None else float(down)
+        column = np.flatnonzero(self.down_payments == down)
+        if len(column):
+            payments = self.payments[:, column[0]]
+        else:
+            payments = np.maximum(self.base - down, 0) * self.factor
+        if max_payment is not None:
+            mask &= payments <= max_payment
+
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(payments[rows], kind="stable")][:limit]
+        return [self._row(row, down, payments[row]) for row in rows]
+
+    def _row(self, row: int, down: float, payment: float) -> Dict[str, Any]:
+        vehicle = self.inventory.vehicles[self.vehicle_ids[self.row_vehicle[row]]]
+        plan = self.plans[self.row_plan[row]]
+        return {
+            "vehicle_id": vehicle["id"],
+            "vehicle": vehicle_label(vehicle),
+            "price": vehicle.get("price"),
+            "kind": plan["kind"],
+            "offer_id": plan["offer_id"],
+            "title": plan["title"],
+            "apr": plan["apr"],
+            "months": plan["months"],
+            "down": round(down, 2),
+            "payment": round(float(payment), 2),
+            "total": round(float(payment) * plan["months"] + down, 2)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Get table size and rebuild count"""
+        self.refresh()
+        return {
+            "vehicles": len(self.vehicle_ids),
+            "plans": len(self.plans),
+            "rows": len(self.row_plan),
+            "rebuilds": self.rebuilds
+        }
+
+
+def format_payment(row: Dict[str, Any]) -> str:
+    """One payment row as a line of text"""
+    if row["kind"] == "lease":
+        plan = f"{row['title']} lease, {row['months']} months"
+    else:
+        plan = f"{row['title']}, {row['apr']}% APR for {row['months']} months"
+    return f"{row['vehicle']}: ${row['payment']:,.2f}/mo ({plan}, ${row['down']:,.0f} down)"
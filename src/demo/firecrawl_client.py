@@ -2,9 +2,12 @@
 FireCrawl integration for real-time website data
 """
 
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+from http_pool import session_registry
+from config import CRAWL_CONCURRENCY
 
 class FireCrawlClient:
     """Client for FireCrawl web scraping"""
@@ -14,58 +17,60 @@ class FireCrawlClient:
         self.base_url = "https://api.firecrawl.com/v1"
         self.logger = logging.getLogger(__name__)
         
-    async def crawl_dealership_sites(self) -> Dict[str, Any]:
+    # Dealership sites keyed by knowledge base brand key ("main" is the group site)
+    SITES = {
+        "main": "https://www.jackingram.com",
+        "nissan": "https://www.jackingramnissan.com",
+        "audi": "https://www.jackingramaudi.com",
+        "mercedes": "https://www.jackingram-mercedesbenz.com",
+        "porsche": "https://www.jackingram-porsche.com",
+        "volkswagen": "https://www.jackingram-vw.com"
+    }
+    
+    # Page path -> CSS selectors to extract
+    PAGES = {
+        "inventory": ("/inventory", {
+            "vehicles": ".vehicle-card",
+            "prices": ".price",
+            "offers": ".special-offer"
+        }),
+        "offers": ("/specials", {
+            "offers": ".offer-card",
+            "expiration": ".expiration-date",
+            "details": ".offer-details"
+        })
+    }
+        
+    async def crawl_dealership_sites(self, concurrency: int = CRAWL_CONCURRENCY) -> Dict[str, Any]:
         """
         Crawl all Jack Ingram dealership sites for current information
         
+        Every page is crawled concurrently, with at most `concurrency`
+        FireCrawl requests in flight.
+        
+        Args:
+            concurrency: Maximum pages crawled at once
+            
         Returns:
-            Dict containing inventory, offers, and other real-time data
+            Dict keyed by brand with "inventory" and "offers" data; pages
+            that failed are left out
         """
-        sites = [
-            "https://www.jackingram.com",
-            "https://www.jackingramnissan.com",
-            "https://www.jackingramaudi.com",
-            "https://www.jackingram-mercedesbenz.com",
-            "https://www.jackingram-porsche.com",
-            "https://www.jackingram-vw.com"
-        ]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        session = session_registry.get("firecrawl")
         
-        results = {}
+        async def crawl(brand: str, page: str) -> Tuple[str, str, Dict[str, Any]]:
+            path, selectors = self.PAGES[page]
+            async with semaphore:
+                return brand, page, await self._crawl_page(session, f"{self.SITES[brand]}{path}", selectors)
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                for site in sites:
-                    # Crawl inventory pages
-                    inventory_data = await self._crawl_page(
-                        session, 
-                        f"{site}/inventory",
-                        selectors={
-                            "vehicles": ".vehicle-card",
-                            "prices": ".price",
-                            "offers": ".special-offer"
-                        }
-                    )
-                    
-                    # Crawl specials/offers pages
-                    offers_data = await self._crawl_page(
-                        session,
-                        f"{site}/specials",
-                        selectors={
-                            "offers": ".offer-card",
-                            "expiration": ".expiration-date",
-                            "details": ".offer-details"
-                        }
-                    )
-                    
-                    brand = site.split("jackingram")[-1].strip("-.com")
-                    results[brand] = {
-                        "inventory": inventory_data,
-                        "offers": offers_data
-                    }
-                    
-        except Exception as e:
-            self.logger.error(f"Error crawling dealership sites: {str(e)}")
-            
+        crawled = await asyncio.gather(*(
+            crawl(brand, page) for brand in self.SITES for page in self.PAGES
+        ))
+        
+        results: Dict[str, Any] = {}
+        for brand, page, data in crawled:
+            if data:
+                results.setdefault(brand, {})[page] = data
         return results
         
     async def _crawl_page(
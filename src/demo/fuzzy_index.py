@@ -0,0 +1,251 @@
+"""
+Typo-tolerant lookup of vehicle makes, models and trims
+"""
+
+import re
+import logging
+from typing import Dict, List, Any, Optional, Set, Tuple, Iterable
+from query_normalizer import BRAND_SYNONYMS, STOPWORDS
+
+# Entry kinds, in ranking order when distances tie
+KINDS = ("model", "make", "trim")
+
+# Shortest key compared with typos allowed, and the longest key that allows only one
+MIN_FUZZY_LENGTH = 4
+ONE_TYPO_MAX_LENGTH = 6
+
+# Shortest make key a typo may resolve to ("audio" is not "audi", "bend" is not "benz")
+MIN_FUZZY_MAKE_LENGTH = 6
+
+# Leading characters a typo must leave alone: misspellings rarely start wrong, while
+# everyday words that differ up front ("vogue" / "rogue", "class" / "cclass") are common
+FUZZY_PREFIX_LENGTH = 2
+
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9.\-]*")
+_ALPHA_PREFIX = re.compile(r"^([a-z]+)\d+$")
+
+
+def search_key(text: str) -> str:
+    """Lowercase text without spaces or punctuation ("C-Class" -> "cclass", "ID.4" -> "id4")"""
+    return _SEPARATORS.sub("", text.lower())
+
+
+def max_typos(key: str) -> int:
+    """Edits tolerated for a key of this length"""
+    if len(key) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(key) <= ONE_TYPO_MAX_LENGTH else 2
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Damerau-Levenshtein distance (adjacent swaps count as one edit)
+
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyMatch:
+    """A vocabulary entry close to the searched text"""
+
+    __slots__ = ("value", "kind", "brand", "model", "distance")
+
+    def __init__(self, value: str, kind: str, brand: str, model: Optional[str], distance: int):
+        self.value = value
+        self.kind = kind
+        self.brand = brand
+        self.model = model
+        self.distance = distance
+
+    @property
+    def score(self) -> float:
+        """Similarity from 0 to 1 (1 is an exact match)"""
+        return 1 - self.distance / max(len(search_key(self.value)), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "value": self.value, "kind": self.kind, "brand": self.brand,
+            "model": self.model, "distance": self.distance, "score": round(self.score, 3)
+        }
+
+
+class FuzzyIndex:
+    """
+    Trigram index over makes, models and trims with bounded edit distance.
+
+    A search only compares the text against keys sharing a trigram with it
+    and of a close enough length, so a lookup touches a handful of keys
+    rather than the whole vocabulary. Entries are reference counted: the
+    same model can come from the knowledge base and from several vehicles
+    in inventory, and disappears only when the last of them is removed.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        # key -> {(value, kind, brand, model): reference count}
+        self._entries: Dict[str, Dict[Tuple[str, str, str, Optional[str]], int]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+
+    def add(self, value: str, kind: str, brand: str, model: Optional[str] = None) -> None:
+        """
+        Add a make, model or trim
+
+        Args:
+            value: Display spelling ("C-Class")
+            kind: "make", "model" or "trim"
+            brand: Knowledge base brand key the entry belongs to
+            model: Model a trim belongs to
+        """
+        key = search_key(value)
+        if not key:
+            return
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = self._entries[key] = {}
+            for trigram in _trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+        entry = (value, kind, brand, model)
+        entries[entry] = entries.get(entry, 0) + 1
+
+    def remove(self, value: str, kind: str, brand: str, model: Optional[str] = None) -> None:
+        """Drop one reference to an entry added with the same arguments"""
+        key = search_key(value)
+        entries = self._entries.get(key)
+        entry = (value, kind, brand, model)
+        if not entries or entry not in entries:
+            return
+        entries[entry] -= 1
+        if entries[entry]:
+            return
+        del entries[entry]
+        if not entries:
+            del self._entries[key]
+            for trigram in _trigrams(key):
+                keys = self._trigrams[trigram]
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[trigram]
+
+    def _vehicle_entries(self, vehicle: Dict[str, Any]) -> Iterable[Tuple[str, str, str, Optional[str]]]:
+        make = (vehicle.get("make") or "").lower()
+        brand = BRAND_SYNONYMS.get(make, make)
+        if not brand:
+            return []
+        entries = [(vehicle["make"], "make", brand, None)]
+        if vehicle.get("model"):
+            entries.append((vehicle["model"], "model", brand, None))
+            if vehicle.get("trim"):
+                entries.append((vehicle["trim"], "trim", brand, vehicle["model"]))
+        return entries
+
+    def add_vehicle(self, vehicle: Dict[str, Any]) -> None:
+        """Add a vehicle's make, model and trim"""
+        for entry in self._vehicle_entries(vehicle):
+            self.add(*entry)
+
+    def remove_vehicle(self, vehicle: Dict[str, Any]) -> None:
+        """Drop a vehicle's make, model and trim"""
+        for entry in self._vehicle_entries(vehicle):
+            self.remove(*entry)
+
+    def search(self, text: str, limit: int = 5, kinds: Optional[Iterable[str]] = None) -> List[FuzzyMatch]:
+        """
+        Find entries spelled like a word or phrase
+
+        Stopwords only match exactly, a typo must keep the first
+        characters, and short makes are never reached through a typo.
+
+        Args:
+            text: Word or phrase to look up ("cayene", "xc 90")
+            limit: Maximum number of matches
+            kinds: Only these entry kinds
+
+        Returns:
+            Matches ranked by edit distance, then kind (model, make, trim)
+        """
+        key = search_key(text)
+        if not key:
+            return []
+        typos = 0 if key in STOPWORDS else max_typos(key)
+        kinds = set(kinds) if kinds is not None else None
+
+        if typos == 0:
+            candidates = {key} if key in self._entries else set()
+        else:
+            candidates = set().union(*(self._trigrams.get(t, ()) for t in _trigrams(key)))
+
+        matches = []
+        for candidate in candidates:
+            if abs(len(candidate) - len(key)) > typos:
+                continue
+            if candidate[:FUZZY_PREFIX_LENGTH] != key[:FUZZY_PREFIX_LENGTH]:
+                continue
+            distance = 0 if candidate == key else edit_distance(key, candidate, typos)
+            if distance > typos or distance > max_typos(candidate):
+                continue
+            for (value, kind, brand, model) in self._entries[candidate]:
+                if distance and kind == "make" and len(candidate) < MIN_FUZZY_MAKE_LENGTH:
+                    continue
+                if kinds is None or kind in kinds:
+                    matches.append(FuzzyMatch(value, kind, brand, model, distance))
+
+        matches.sort(key=lambda m: (m.distance, KINDS.index(m.kind), m.value))
+        return matches[:limit]
+
+    def resolve(self, text: str, kinds: Optional[Iterable[str]] = None, brand: Optional[str] = None) -> Optional[FuzzyMatch]:
+        """
+        Best entry for any word or word pair in a message
+
+        Words are tried alone, joined with the next word ("xc 90") and, for
+        words ending in digits, without the digits ("gle450" -> "gle").
+
+        Args:
+            text: Message text, normally with already recognized words removed
+            kinds: Only these entry kinds
+            brand: Prefer entries of this brand
+
+        Returns:
+            The closest match, or None
+        """
+        words = [w.strip(".-") for w in _TOKEN.findall(text.lower())]
+        words = [w for w in words if w and w not in STOPWORDS]
+        phrases = []
+        for i, word in enumerate(words):
+            phrases.append(word)
+            if i + 1 < len(words):
+                phrases.append(word + words[i + 1])
+            prefix = _ALPHA_PREFIX.match(word)
+            if prefix:
+                phrases.append(prefix.group(1))
+
+        best = None
+        for phrase in phrases:
+            for match in self.search(phrase, limit=3, kinds=kinds):
+                rank = (match.brand != brand if brand else False, match.distance, KINDS.index(match.kind))
+                if best is None or rank < best[0]:
+                    best = (rank, match)
+        return best[1] if best else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,109 @@
+"""
+Shared, pooled HTTP sessions for all upstream integrations
+"""
+
+import asyncio
+import logging
+import aiohttp
+from typing import Dict, Any, Optional
+from config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_TIMEOUTS
+)
+
+class HTTPSessionRegistry:
+    """
+    Process-wide registry of aiohttp sessions.
+
+    Every upstream gets its own named session with its own default timeouts,
+    but all sessions share a single keep-alive connector, so connections,
+    TLS handshakes and DNS lookups are reused across chat messages.
+    """
+    
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        keepalive_timeout: int = HTTP_KEEPALIVE_TIMEOUT,
+        timeouts: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeouts = timeouts or HTTP_TIMEOUTS
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+    def timeout_for(self, name: str) -> aiohttp.ClientTimeout:
+        """Get the default timeout for a named upstream"""
+        settings = self.timeouts.get(name, self.timeouts.get("default", {}))
+        return aiohttp.ClientTimeout(
+            total=settings.get("total"),
+            connect=settings.get("connect"),
+            sock_read=settings.get("read")
+        )
+        
+    def get(self, name: str = "default") -> aiohttp.ClientSession:
+        """
+        Get the shared session for an upstream, creating it on first use
+        
+        Args:
+            name: Upstream name used to pick timeouts (see HTTP_TIMEOUTS)
+            
+        Returns:
+            An open aiohttp ClientSession bound to the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        
+        # Sessions are bound to the loop that created them
+        if self._loop is not loop or self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._sessions = {}
+            self._loop = loop
+            
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=self._connector,
+                connector_owner=False,
+                timeout=self.timeout_for(name)
+            )
+            self._sessions[name] = session
+        return session
+        
+    async def close(self) -> None:
+        """Close all sessions and the shared connector"""
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+        if self._connector is not None and not self._connector.closed:
+            await self._connector.close()
+        self._connector = None
+        self._loop = None
+        self.logger.info("Closed shared HTTP sessions")
+        
+    def stats(self) -> Dict[str, Any]:
+        """Get pool configuration and open session names"""
+        return {
+            "sessions": sorted(name for name, s in self._sessions.items() if not s.closed),
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl
+        }
+
+# Shared registry used by every client in the process
+session_registry = HTTPSessionRegistry()
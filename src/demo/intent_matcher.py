@@ -0,0 +1,346 @@
+"""
+Compiled single-pass intent and vehicle entity extraction
+"""
+
+import re
+from typing import Dict, List, Any, Optional, Tuple
+from query_normalizer import BRAND_SYNONYMS
+from fuzzy_index import FuzzyIndex
+
+# Who opens or closes in a schedule question ("what time does the service department open")
+_SCHEDULE_SUBJECT = (r"(?:you(?: guys| all)?|y'?all|(?:the |your )?(?:dealership|showroom|store"
+                     r"|service(?: department| center)?|sales(?: department)?|parts(?: department)?))")
+
+# Intent patterns, in routing priority order (first listed wins as the primary intent)
+INTENT_PATTERNS = [
+    # Only when the question ends there: "what is the date of the sales event?" is not about today
+    ("date_time", r"(?:what(?:'s| is) (?:the |today'?s )?date(?: today)?|today'?s date|what day is (?:it(?: today)?|today)"
+                  r"|what time is it(?: now)?|(?:the )?current (?:date|time))(?= ?[?.!,]|$)"),
+    ("inventory_count", r"how many"),
+    ("compare", r"compare[ds]?|comparing|comparison|versus|vs\.?|difference between|which is better|better than"),
+    # Only schedule wording: "open" and "close" alone also mean "open to trade-ins" or "close to $40k"
+    ("hours", r"(?:business |opening |store |service |sales |parts )?hours|hrs"
+              r"|(?:what time|when) (?:do|does|will|are|is) " + _SCHEDULE_SUBJECT + r" (?:open|close)"
+              r"|(?:(?:are|is) " + _SCHEDULE_SUBJECT + r" )?(?:open|closed?)(?: on| this| until| till)? "
+              r"(?:today|tonight|tomorrow|now|late|weekends?|holidays?|(?:mon|tues|wednes|thurs|fri|satur|sun)days?)"
+              r"|(?:are|is) " + _SCHEDULE_SUBJECT + r" (?:open|closed)(?= ?[?.!]|$)"),
+    ("location", r"location|address|directions|located|where (?:are|is) (?:you|the dealership|jack ingram)"),
+    ("contact", r"contact|phone(?: number)?|call you|email"),
+    ("about", r"about (?:you|us|jack ingram|the dealership)"),
+    ("services", r"services"),
+    ("offers", r"specials?|offers?|deals?|incentives?|rebates?|promotions?"),
+    ("financing", r"financ(?:e|ing)|leas(?:e|es|ing)|apr|loans?|monthly payments?|payments?"),
+    ("test_drive", r"test[ -]?drives?"),
+    ("trade_in", r"trade[ -]?ins?|trade my"),
+    ("service", r"service|oil change|maintenance|repairs?|tires?|brakes?"),
+    ("price", r"prices?|pricing|cost|msrp|how much"),
+    ("inventory", r"inventory|in stock|available|do you have|for sale|on (?:the|your) lot|cars|vehicles")
+]
+
+INTENT_PRIORITY = [name for name, _ in INTENT_PATTERNS]
+
+# Intents answered straight from the knowledge base, and the category they map to
+KNOWLEDGE_CATEGORIES = {
+    "hours": "hours",
+    "services": "services",
+    "location": "main",
+    "contact": "main",
+    "about": "main"
+}
+
+BODY_STYLES = {
+    "suv": ["suv", "suvs", "crossover", "crossovers"],
+    "sedan": ["sedan", "sedans"],
+    "truck": ["truck", "trucks", "pickup", "pickups"],
+    "wagon": ["wagon", "wagons", "estate"],
+    "coupe": ["coupe", "coupes"],
+    "convertible": ["convertible", "convertibles", "cabriolet"],
+    "hatchback": ["hatchback", "hatchbacks"],
+    "van": ["van", "minivan"]
+}
+
+# Exterior colors, folded to one spelling
+COLORS = {
+    "black": "black", "white": "white", "silver": "silver", "gray": "gray", "grey": "gray",
+    "red": "red", "blue": "blue", "green": "green", "brown": "brown", "beige": "beige",
+    "gold": "gold", "orange": "orange", "yellow": "yellow"
+}
+
+# Price qualifiers: which end of the range a mentioned price sets
+PRICE_MAX_WORDS = ("under", "below", "less than", "no more than", "up to", "max", "maximum", "within")
+PRICE_MIN_WORDS = ("over", "above", "more than", "at least", "from", "starting at")
+PRICE_NEAR_WORDS = ("around", "about", "near", "roughly")
+PRICE_NEAR_MARGIN = 0.1
+
+# Dollar amounts: "$30,000", "$30k", "30 thousand", "30,000"
+AMOUNT = r"\$ ?\d[\d,]*(?:\.\d+)?(?: ?(?:k|thousand))?|\d[\d,]*(?:\.\d+)? ?(?:k|thousand)|\d{1,3}(?:,\d{3})+"
+
+YEAR_OR_NEWER = re.compile(r"\+|or newer|or later|and up|and newer")
+
+# Stock wording that makes a "how many" question an inventory count
+STOCK_WORDING = re.compile(
+    r"(?<![a-z0-9])(?:in stock|available|inventory|for sale|on (?:the|your) lot"
+    r"|do (?:you|y'?all)(?: guys)? (?:have|carry|got)|have you got)(?![a-z0-9])"
+)
+
+# Intents that make a misspelled word worth reading as a vehicle
+SHOPPING_INTENTS = ("compare", "offers", "financing", "test_drive", "trade_in", "service", "price", "inventory")
+
+# Nouns that name vehicles right after "how many"
+VEHICLE_NOUNS = ("cars", "vehicles", "models", "units", "ones")
+
+
+def _alternation(words) -> str:
+    """Regex alternation that prefers the longest surface form"""
+    return "|".join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+
+
+def _amount(text: str) -> float:
+    """Dollar value of an AMOUNT match"""
+    amount = float(re.sub(r"[^\d.]", "", text) or 0)
+    if "k" in text or "thousand" in text:
+        amount *= 1000
+    return amount
+
+
+def model_variants(model: str) -> List[str]:
+    """Spellings of a model name with and without separators ("XC90" -> "xc 90", "xc-90")"""
+    canonical = model.lower()
+    parts = [p for p in re.split(r"[\s.-]+|(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])", canonical) if p]
+    variants = {canonical, "".join(parts), "-".join(parts)}
+    # "a 4" or "q 5" would match ordinary text, so single letters only pair with words
+    if len(parts) > 1 and (len(parts[0]) > 1 or parts[1].isalpha()):
+        variants.add(" ".join(parts))
+    return sorted(variants)
+
+
+class QueryIntent:
+    """Intent and vehicle entities extracted from a message"""
+
+    __slots__ = (
+        "make", "model", "year", "min_year", "min_price", "max_price", "body_style", "color",
+        "down_payment", "term_months", "models", "intents"
+    )
+
+    def __init__(self):
+        self.make: Optional[str] = None
+        self.model: Optional[str] = None
+        self.year: Optional[int] = None
+        self.min_year: Optional[int] = None
+        self.min_price: Optional[float] = None
+        self.max_price: Optional[float] = None
+        self.body_style: Optional[str] = None
+        self.color: Optional[str] = None
+        # Payment question details ("$3000 down", "60 months"); not search filters
+        self.down_payment: Optional[float] = None
+        self.term_months: Optional[int] = None
+        # Every (brand, model) mentioned, in order; comparisons name several
+        self.models: List[Tuple[str, str]] = []
+        self.intents: List[str] = []
+
+    @property
+    def intent(self) -> Optional[str]:
+        """Highest-priority intent found in the message"""
+        return min(self.intents, key=INTENT_PRIORITY.index) if self.intents else None
+
+    @property
+    def category(self) -> Optional[str]:
+        """Knowledge base category for dealership-information intents"""
+        for intent in sorted(self.intents, key=INTENT_PRIORITY.index):
+            if intent in KNOWLEDGE_CATEGORIES:
+                return KNOWLEDGE_CATEGORIES[intent]
+        return None
+
+    @property
+    def knowledge_only(self) -> bool:
+        """True when the message only asks for dealership information (a make may narrow it)"""
+        if self.category is None or self.models:
+            return False
+        if any(getattr(self, name) is not None for name in (
+            "model", "year", "min_year", "min_price", "max_price", "body_style", "color",
+            "down_payment", "term_months"
+        )):
+            return False
+        return all(intent in KNOWLEDGE_CATEGORIES for intent in self.intents)
+
+    def to_params(self) -> Dict[str, Any]:
+        """Vehicle search parameters that were found"""
+        return {
+            name: getattr(self, name)
+            for name in ("make", "model", "year", "min_year", "min_price", "max_price", "body_style", "color")
+            if getattr(self, name) is not None
+        }
+
+
+class IntentMatcher:
+    """
+    Extracts make, model, year, price range, body style, color and intents in one scan.
+
+    All vocabularies are compiled into a single alternation regex, so a
+    message is scanned once regardless of how many makes, models and
+    keywords are known.
+    """
+
+    def __init__(self, brand_models: Dict[str, List[str]], fuzzy: Optional[FuzzyIndex] = None):
+        """
+        Args:
+            brand_models: Popular models keyed by knowledge base brand key
+            fuzzy: Typo-tolerant index consulted for words the exact scan
+                   didn't recognize when no model was found
+        """
+        self.fuzzy = fuzzy
+        self.models: Dict[str, Tuple[str, str]] = {}
+        for brand, models in brand_models.items():
+            for model in models:
+                for variant in model_variants(model):
+                    self.models[variant] = (brand, model)
+
+        self.body_styles = {word: style for style, words in BODY_STYLES.items() for word in words}
+        price_words = PRICE_MAX_WORDS + PRICE_MIN_WORDS + PRICE_NEAR_WORDS + ("between",)
+
+        alternatives = [
+            # Multi-word intents first so they win over the words they contain
+            f"(?P<i_date_time>{INTENT_PATTERNS[0][1]})",
+            f"(?P<count>{INTENT_PATTERNS[1][1]})",
+            # Before prices, so "$3000 down" is not read as a price limit
+            f"(?P<down>(?P<down_amount>{AMOUNT}) (?:down|due at signing))",
+            r"(?P<term>(?P<term_months>[1-9]\d) ?-? ?(?:months?|mos?))",
+            f"(?P<price>(?:(?P<price_word>{_alternation(price_words)}) )?"
+            f"(?P<price_amount>{AMOUNT}))",
+            r"(?P<year>(?:19[89]\d|20[0-4]\d)(?: ?(?:\+|or newer|or later|and up|and newer))?)",
+            f"(?P<model>{_alternation(self.models)})",
+            f"(?P<make>{_alternation(BRAND_SYNONYMS)})",
+            f"(?P<body>{_alternation(self.body_styles)})",
+            f"(?P<color>{_alternation(COLORS)})"
+        ]
+        alternatives += [f"(?P<i_{name}>{pattern})" for name, pattern in INTENT_PATTERNS[2:]]
+
+        self.pattern = re.compile(r"(?<![a-z0-9])(?:" + "|".join(alternatives) + r")(?![a-z0-9])")
+
+        # "How many Rogues", "how many used SUVs": a vehicle right after "how many"
+        vehicle_words = list(self.models) + list(BRAND_SYNONYMS) + list(self.body_styles) + list(VEHICLE_NOUNS)
+        self.count_subject = re.compile(
+            r"how many (?:(?:new|used|pre-owned|certified|(?:19|20)\d\d|" + _alternation(COLORS) + r") )*"
+            r"(?:" + _alternation(vehicle_words) + r")(?:'?s)?(?![a-z0-9])"
+        )
+
+    def match(self, message: str) -> QueryIntent:
+        """
+        Extract intent and entities from a message
+
+        Args:
+            message: Raw user message
+
+        Returns:
+            QueryIntent with whatever was found
+        """
+        result = QueryIntent()
+        text = " ".join(message.lower().replace("’", "'").split())
+        pending_between = False
+        asks_count = False
+        unmatched = []
+        position = 0
+
+        for match in self.pattern.finditer(text):
+            kind = match.lastgroup
+            value = match.group(kind)
+            unmatched.append(text[position:match.start()])
+            position = match.end()
+
+            if kind == "make":
+                result.make = result.make or BRAND_SYNONYMS[value]
+            elif kind == "model":
+                brand, model = self.models[value]
+                if (brand, model) not in result.models:
+                    result.models.append((brand, model))
+                if result.model is None:
+                    result.model = model
+                    result.make = result.make or brand
+            elif kind == "year":
+                year = int(value[:4])
+                if YEAR_OR_NEWER.search(value):
+                    result.min_year = year
+                else:
+                    result.year = year
+            elif kind == "body":
+                result.body_style = result.body_style or self.body_styles[value]
+            elif kind == "color":
+                result.color = result.color or COLORS[value]
+            elif kind == "price":
+                pending_between = self._apply_price(result, match, pending_between)
+            elif kind == "down":
+                result.down_payment = _amount(match.group("down_amount"))
+            elif kind == "term":
+                result.term_months = int(match.group("term_months"))
+            elif kind == "count":
+                asks_count = True
+            elif kind.startswith("i_"):
+                intent = kind[2:]
+                if intent not in result.intents:
+                    result.intents.append(intent)
+
+        unmatched.append(text[position:])
+        wants_models = result.model is None or ("compare" in result.intents and len(result.models) < 2)
+        if wants_models and self.fuzzy is not None:
+            self._apply_fuzzy(result, " ".join(unmatched))
+
+        # "How many" only counts inventory when it asks about stock, not "how many miles"
+        if asks_count and (self.count_subject.search(text) or STOCK_WORDING.search(text)):
+            result.intents.append("inventory_count")
+        if (result.min_price is not None or result.max_price is not None) and "price" not in result.intents:
+            result.intents.append("price")
+        if (result.down_payment is not None or result.term_months) and "financing" not in result.intents:
+            result.intents.append("financing")
+        return result
+
+    def _apply_fuzzy(self, result: QueryIntent, text: str) -> None:
+        """Fill in a misspelled or unlisted model (or make) from the fuzzy index"""
+        comparing = "compare" in result.intents
+        # A bare trim ("SR", "Premium Plus") is ordinary text unless a make or model places it
+        kinds = ("model", "trim") if result.make or result.models else ("model", "make")
+        # A comparison may name models of other makes, so the make doesn't restrict it
+        brand = None if comparing and result.models else result.make
+        match = self.fuzzy.resolve(text, kinds=kinds, brand=brand)
+        if match is None or (brand and match.brand != brand):
+            return
+        # A correction ("rouge" -> Rogue) needs the message to be about vehicles at all
+        if match.distance and not self._shopping(result):
+            return
+        if match.kind == "make":
+            result.make = match.brand
+            return
+        model = match.model if match.kind == "trim" else match.value
+        if (match.brand, model) not in result.models:
+            result.models.append((match.brand, model))
+        if result.model is None:
+            result.model = model
+            result.make = result.make or match.brand
+
+    @staticmethod
+    def _shopping(result: QueryIntent) -> bool:
+        """True when the message names a make, year, body style or price, or asks a vehicle question"""
+        if result.make or result.year or result.min_year or result.body_style:
+            return True
+        if result.min_price is not None or result.max_price is not None or result.down_payment is not None:
+            return True
+        return any(intent in SHOPPING_INTENTS for intent in result.intents)
+
+    def _apply_price(self, result: QueryIntent, match: "re.Match", pending_between: bool) -> bool:
+        """Record a price mention; returns True while waiting for the upper end of a "between" range"""
+        amount = _amount(match.group("price_amount"))
+        if amount < 1000:
+            # Small amounts are monthly payments or down payments, not vehicle prices
+            return pending_between
+
+        word = match.group("price_word")
+        if word == "between":
+            result.min_price = amount
+            return True
+        if pending_between or word in PRICE_MAX_WORDS or word is None:
+            result.max_price = amount
+        elif word in PRICE_MIN_WORDS:
+            result.min_price = amount
+        elif word in PRICE_NEAR_WORDS:
+            result.min_price = amount * (1 - PRICE_NEAR_MARGIN)
+            result.max_price = amount * (1 + PRICE_NEAR_MARGIN)
+        return False
@@ -2,15 +2,87 @@
 Simple in-memory inventory database for demo purposes
 """
 
-from typing import Dict, Any, List
-from datetime import datetime
+import bisect
+import heapq
+from typing import Dict, Any, List, Optional, Set, Tuple
+from datetime import datetime, date, timedelta
+from query_normalizer import BRAND_SYNONYMS
+from fuzzy_index import FuzzyIndex
+
+# Equality-filtered fields, each with a hash index of value -> vehicle IDs
+HASH_FIELDS = ("make", "model", "color", "status", "body_style")
+
+# Range-filtered fields, each with a sorted (value, id) index
+RANGE_FIELDS = ("price", "year", "mileage")
+
+# Keyword arguments accepted by InventoryDB.query as filters
+INVENTORY_FILTERS = HASH_FIELDS + (
+    "year", "min_year", "max_year", "min_price", "max_price", "max_mileage"
+)
+
+# Color names folded to one spelling before indexing and lookup
+COLOR_SYNONYMS = {"grey": "gray"}
+
+
+def _index_values(field: str, value: Any) -> List[str]:
+    """Hash index keys for a field value"""
+    if value is None:
+        return []
+    key = " ".join(str(value).lower().split())
+    if field == "make":
+        return [BRAND_SYNONYMS.get(key, key)]
+    if field == "color":
+        # "Mythos Black" is found by "mythos black" and by "black"
+        words = [COLOR_SYNONYMS.get(word, word) for word in key.split()]
+        return list(dict.fromkeys([" ".join(words)] + words))
+    return [key]
+
 
 class InventoryDB:
-    """Simple in-memory inventory database"""
+    """
+    Simple in-memory inventory database.
+
+    Vehicles are kept by ID with secondary indexes: hash indexes for
+    make/model/color/status/body style and sorted indexes for
+    price/year/mileage. Indexes are updated as vehicles are added, changed
+    or removed, so queries never scan the whole inventory.
+    
+    Offers are indexed by make and model with their expiry dates parsed
+    once; a min-heap of expiry dates lets expired offers be dropped as
+    they lapse instead of re-checking every offer on each lookup.
+    """
     
-    def __init__(self):
+    def __init__(self, search_index: Optional[FuzzyIndex] = None):
+        """
+        Args:
+            search_index: Fuzzy make/model/trim index kept in step with the inventory
+        """
+        self.search_index = search_index
+        # Derived views notified of every vehicle change (add_vehicle/remove_vehicle methods)
+        self.listeners: List[Any] = [search_index] if search_index is not None else []
+        self.vehicles: Dict[str, Dict[str, Any]] = {}
+        self._hash: Dict[str, Dict[str, Set[str]]] = {field: {} for field in HASH_FIELDS}
+        self._sorted: Dict[str, List[Tuple[Any, str]]] = {field: [] for field in RANGE_FIELDS}
+        self._order: Dict[str, int] = {}
+        self._sequence = 0
+        # Bumped on every vehicle change, so derived views know when to rebuild
+        self.version = 0
+        
+        # Offers by ID, with their brand, parsed expiry and brand/model indexes
+        self.offers: Dict[str, Dict[str, Any]] = {}
+        self._offer_brand: Dict[str, str] = {}
+        self._offer_expiry: Dict[str, date] = {}
+        self._offer_order: Dict[str, int] = {}
+        self._offers_by_brand: Dict[str, Set[str]] = {}
+        # (brand, model) -> offer IDs; model None holds offers for every model of the brand
+        self._offers_by_model: Dict[Tuple[str, Optional[str]], Set[str]] = {}
+        # (expiry date, offer ID) min-heap; entries of replaced or removed offers are skipped
+        self._expiry_heap: List[Tuple[date, str]] = []
+        # Bumped whenever an offer is added, replaced, removed or expires
+        self.offers_version = 0
+        
         # Initialize with some sample inventory
-        self.inventory = {
+        inventory = {
             "nissan": [
                 {
                     "id": "N1",
@@ -21,6 +93,13 @@ class InventoryDB:
                     "price": 26890,
                     "stock": "NA24001",
                     "color": "Pearl White",
+                    "body_style": "sedan",
+                    "mileage": 12,
+                    "mpg": 32,
+                    "horsepower": 188,
+                    "seating": 5,
+                    "cargo_cu_ft": 15.4,
+                    "safety_stars": 5,
                     "status": "available"
                 },
                 {
@@ -32,6 +111,13 @@ class InventoryDB:
                     "price": 29990,
                     "stock": "NR24005",
                     "color": "Brilliant Silver",
+                    "body_style": "suv",
+                    "mileage": 12,
+                    "mpg": 33,
+                    "horsepower": 201,
+                    "seating": 5,
+                    "cargo_cu_ft": 36.5,
+                    "safety_stars": 5,
                     "status": "available"
                 }
             ],
@@ -45,6 +131,12 @@ class InventoryDB:
                     "price": 49800,
                     "stock": "AQ24003",
                     "color": "Mythos Black",
+                    "body_style": "suv",
+                    "mileage": 12,
+                    "mpg": 26,
+                    "horsepower": 261,
+                    "seating": 5,
+                    "cargo_cu_ft": 25.8,
                     "status": "available"
                 }
             ],
@@ -58,26 +150,37 @@ class InventoryDB:
                     "price": 67800,
                     "stock": "MB24002",
                     "color": "Selenite Grey",
+                    "body_style": "suv",
+                    "mileage": 12,
+                    "mpg": 23,
+                    "horsepower": 375,
+                    "seating": 5,
+                    "cargo_cu_ft": 33.3,
                     "status": "available"
                 }
             ]
         }
         
-        # Initialize special offers
-        self.offers = {
+        for vehicles in inventory.values():
+            for vehicle in vehicles:
+                self.add_vehicle(vehicle)
+        
+        # Initialize special offers, running from today so the demo always has live ones
+        today = datetime.now().date()
+        offers = {
             "nissan": [
                 {
                     "id": "NO1",
                     "title": "2024 Altima Special",
                     "description": "$2000 Customer Cash + 1.9% APR for 60 months",
-                    "expires": "2024-07-05",
+                    "expires": (today + timedelta(days=45)).isoformat(),
                     "models": ["Altima"]
                 },
                 {
                     "id": "NO2",
                     "title": "Rogue Summer Event",
                     "description": "Lease for $299/mo for 36 months, $3999 down",
-                    "expires": "2024-06-30",
+                    "expires": (today + timedelta(days=30)).isoformat(),
                     "models": ["Rogue"]
                 }
             ],
@@ -86,7 +189,7 @@ class InventoryDB:
                     "id": "AO1",
                     "title": "Q5 Special Offer",
                     "description": "0.9% APR for 48 months",
-                    "expires": "2024-06-30",
+                    "expires": (today + timedelta(days=30)).isoformat(),
                     "models": ["Q5"]
                 }
             ],
@@ -95,52 +198,328 @@ class InventoryDB:
                     "id": "MO1",
                     "title": "Summer Event",
                     "description": "Special lease and finance offers on select models",
-                    "expires": "2024-07-05",
+                    "expires": (today + timedelta(days=45)).isoformat(),
                     "models": ["GLE", "GLC", "C-Class"]
                 }
             ]
         }
+        for brand, brand_offers in offers.items():
+            for offer in brand_offers:
+                self.add_offer(offer, brand)
         
-    def get_inventory(self, make: str = None, model: str = None) -> List[Dict[str, Any]]:
-        """Get filtered inventory"""
-        if not make:
-            # Return all inventory
-            return [car for brand in self.inventory.values() for car in brand]
+    def add_vehicle(self, vehicle: Dict[str, Any]) -> None:
+        """
+        Add a vehicle, or replace the one with the same ID
+        
+        Args:
+            vehicle: Vehicle record with at least an "id"
+        """
+        vehicle_id = vehicle["id"]
+        if vehicle_id in self.vehicles:
+            self._unindex(self.vehicles[vehicle_id])
+        else:
+            self._sequence += 1
+            self._order[vehicle_id] = self._sequence
+        self.vehicles[vehicle_id] = vehicle
+        self._index(vehicle)
+        
+    def update_vehicle(self, vehicle_id: str, **changes) -> Dict[str, Any]:
+        """
+        Change fields of a vehicle (e.g. price or status) and re-index it
+        
+        Args:
+            vehicle_id: ID of the vehicle
+            **changes: Fields to set
             
-        inventory = self.inventory.get(make.lower(), [])
+        Returns:
+            The updated vehicle record
+        """
+        vehicle = self.vehicles[vehicle_id]
+        self._unindex(vehicle)
+        vehicle.update(changes)
+        self._index(vehicle)
+        return vehicle
+        
+    def mark_sold(self, vehicle_id: str) -> Dict[str, Any]:
+        """Mark a vehicle as sold"""
+        return self.update_vehicle(vehicle_id, status="sold")
+        
+    def remove_vehicle(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a vehicle from the inventory"""
+        vehicle = self.vehicles.pop(vehicle_id, None)
+        if vehicle is not None:
+            self._unindex(vehicle)
+            del self._order[vehicle_id]
+        return vehicle
+        
+    def add_listener(self, listener: Any) -> None:
+        """
+        Keep a derived view in step with the inventory
+        
+        The listener is given every current vehicle now, then each vehicle as
+        it is added or changed (add_vehicle) and removed or before it changes
+        (remove_vehicle).
+        """
+        for vehicle in self.vehicles.values():
+            listener.add_vehicle(vehicle)
+        self.listeners.append(listener)
+        
+    def _index(self, vehicle: Dict[str, Any]) -> None:
+        self.version += 1
+        vehicle_id = vehicle["id"]
+        for field in HASH_FIELDS:
+            for key in _index_values(field, vehicle.get(field)):
+                self._hash[field].setdefault(key, set()).add(vehicle_id)
+        for field in RANGE_FIELDS:
+            if vehicle.get(field) is not None:
+                bisect.insort(self._sorted[field], (vehicle[field], vehicle_id))
+        for listener in self.listeners:
+            listener.add_vehicle(vehicle)
+                
+    def _unindex(self, vehicle: Dict[str, Any]) -> None:
+        self.version += 1
+        vehicle_id = vehicle["id"]
+        for field in HASH_FIELDS:
+            for key in _index_values(field, vehicle.get(field)):
+                ids = self._hash[field].get(key)
+                if ids is not None:
+                    ids.discard(vehicle_id)
+                    if not ids:
+                        del self._hash[field][key]
+        for field in RANGE_FIELDS:
+            if vehicle.get(field) is not None:
+                entries = self._sorted[field]
+                position = bisect.bisect_left(entries, (vehicle[field], vehicle_id))
+                if position < len(entries) and entries[position] == (vehicle[field], vehicle_id):
+                    del entries[position]
+        for listener in self.listeners:
+            listener.remove_vehicle(vehicle)
+                    
+    def _range(self, field: str, low: Any, high: Any) -> Tuple[int, int]:
+        """Slice bounds of the sorted index for low <= value <= high"""
+        entries = self._sorted[field]
+        start = 0 if low is None else bisect.bisect_left(entries, (low,))
+        end = len(entries) if high is None else bisect.bisect_left(entries, (high, chr(0x10ffff)))
+        return start, max(start, end)
         
-        if model:
-            inventory = [car for car in inventory if car["model"].lower() == model.lower()]
+    def query(
+        self,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        color: Optional[str] = None,
+        status: Optional[str] = None,
+        body_style: Optional[str] = None,
+        year: Optional[int] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        max_mileage: Optional[int] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find vehicles matching every given filter
+        
+        Equality filters also accept a list of values (any of them matches).
+        Candidate sets are intersected smallest first, and once they are
+        small the remaining range filters are checked per vehicle instead of
+        being materialized.
+        
+        Args:
+            make, model, color, status, body_style: Equality filters (case-insensitive)
+            year: Exact model year
+            min_year, max_year, min_price, max_price, max_mileage: Inclusive range bounds
+            sort: Range field to order by ("price", "year" or "mileage"); prefix "-" for descending
+            limit: Maximum number of vehicles returned
+            
+        Returns:
+            Matching vehicle records, in insertion order unless sorted
+        """
+        if year is not None:
+            min_year = year if min_year is None else max(min_year, year)
+            max_year = year if max_year is None else min(max_year, year)
+            
+        # (size, ids) per equality filter; sizes come straight from the index
+        candidates = []
+        for field, value in (("make", make), ("model", model), ("color", color),
+                             ("status", status), ("body_style", body_style)):
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            ids = set().union(*(
+                self._hash[field].get(key, ()) for v in values for key in _index_values(field, v)[:1]
+            ))
+            candidates.append((len(ids), ids))
+            
+        ranges = []
+        for field, low, high in (("year", min_year, max_year), ("price", min_price, max_price),
+                                 ("mileage", None, max_mileage)):
+            if low is not None or high is not None:
+                start, end = self._range(field, low, high)
+                ranges.append((end - start, field, start, end))
+        ranges.sort()
+        
+        candidates.sort(key=lambda candidate: candidate[0])
+        if ranges and (not candidates or ranges[0][0] < candidates[0][0]):
+            # The tightest range is smaller than any equality set, so start there
+            _, field, start, end = ranges.pop(0)
+            ids = {vehicle_id for _, vehicle_id in self._sorted[field][start:end]}
+            candidates.insert(0, (len(ids), ids))
+            
+        if candidates:
+            result = set(candidates[0][1])
+            for _, ids in candidates[1:]:
+                if not result:
+                    break
+                result &= ids
+        else:
+            result = set(self.vehicles)
+            
+        # Remaining ranges are cheaper to check on the surviving vehicles
+        bounds = {"year": (min_year, max_year), "price": (min_price, max_price), "mileage": (None, max_mileage)}
+        for _, field, _, _ in ranges:
+            low, high = bounds[field]
+            result = {
+                vehicle_id for vehicle_id in result
+                if self.vehicles[vehicle_id].get(field) is not None
+                and (low is None or self.vehicles[vehicle_id][field] >= low)
+                and (high is None or self.vehicles[vehicle_id][field] <= high)
+            }
+            
+        if sort:
+            field = sort.lstrip("-")
+            entries = self._sorted[field]
+            ordered = [vehicle_id for _, vehicle_id in (reversed(entries) if sort.startswith("-") else entries)
+                       if vehicle_id in result]
+        else:
+            ordered = sorted(result, key=self._order.__getitem__)
+        if limit is not None:
+            ordered = ordered[:limit]
+        return [self.vehicles[vehicle_id] for vehicle_id in ordered]
+        
+    def get_inventory(self, make: str = None, model: str = None) -> List[Dict[str, Any]]:
+        """Get filtered inventory (a misspelled model is corrected through the search index)"""
+        if model and model.lower() not in self._hash["model"] and self.search_index is not None:
+            matches = self.search_index.search(model, limit=1, kinds=("model",))
+            if matches:
+                model = matches[0].value
+        return self.query(make=make or None, model=model or None)
+        
+    def add_offer(self, offer: Dict[str, Any], make: str) -> None:
+        """
+        Add a special offer, or replace the one with the same ID
+        
+        Args:
+            offer: Offer with "id", "expires" (YYYY-MM-DD, or None for no
+                   expiry) and "models" (empty for every model of the make)
+            make: Make the offer applies to
+        """
+        offer_id = offer["id"]
+        self.remove_offer(offer_id)
+        self.offers_version += 1
+        self._sequence += 1
+        self._offer_order[offer_id] = self._sequence
+        
+        brand = _index_values("make", make)[0]
+        self.offers[offer_id] = offer
+        self._offer_brand[offer_id] = brand
+        self._offers_by_brand.setdefault(brand, set()).add(offer_id)
+        for model in offer.get("models") or [None]:
+            key = (brand, model.lower() if model else None)
+            self._offers_by_model.setdefault(key, set()).add(offer_id)
+        
+        if offer.get("expires"):
+            expires = datetime.strptime(offer["expires"], "%Y-%m-%d").date()
+            self._offer_expiry[offer_id] = expires
+            heapq.heappush(self._expiry_heap, (expires, offer_id))
             
-        return inventory
+    def remove_offer(self, offer_id: str) -> Optional[Dict[str, Any]]:
+        """Remove an offer from every index (its heap entry is dropped lazily)"""
+        offer = self.offers.pop(offer_id, None)
+        if offer is None:
+            return None
+        self.offers_version += 1
+        brand = self._offer_brand.pop(offer_id)
+        self._offer_expiry.pop(offer_id, None)
+        del self._offer_order[offer_id]
+        self._offers_by_brand[brand].discard(offer_id)
+        for model in offer.get("models") or [None]:
+            key = (brand, model.lower() if model else None)
+            self._offers_by_model[key].discard(offer_id)
+            if not self._offers_by_model[key]:
+                del self._offers_by_model[key]
+        if not self._offers_by_brand[brand]:
+            del self._offers_by_brand[brand]
+        return offer
+        
+    def offer_make(self, offer_id: str) -> Optional[str]:
+        """Make (brand key) an offer applies to"""
+        return self._offer_brand.get(offer_id)
         
+    def _evict_expired_offers(self, today: date) -> None:
+        """Pop offers that expired before today off the heap, O(log n) each"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] < today:
+            expires, offer_id = heapq.heappop(heap)
+            # Skip entries left behind by an offer that was replaced or removed
+            if self._offer_expiry.get(offer_id) == expires:
+                self.remove_offer(offer_id)
+                
     def get_offers(self, make: str = None, model: str = None) -> List[Dict[str, Any]]:
-        """Get filtered special offers"""
+        """Get unexpired special offers, optionally for one make and model"""
+        self._evict_expired_offers(datetime.now().date())
+        
         if not make:
-            # Return all offers
-            return [offer for brand in self.offers.values() for offer in brand]
+            offer_ids = set(self.offers)
+        elif model:
+            brand = _index_values("make", make)[0]
+            offer_ids = (self._offers_by_model.get((brand, model.lower()), set())
+                         | self._offers_by_model.get((brand, None), set()))
+        else:
+            offer_ids = self._offers_by_brand.get(_index_values("make", make)[0], set())
             
-        offers = self.offers.get(make.lower(), [])
+        return [self.offers[offer_id] for offer_id in sorted(offer_ids, key=self._offer_order.__getitem__)]
         
-        if model:
-            offers = [
-                offer for offer in offers 
-                if not offer["models"] or model in offer["models"]
-            ]
+    def get_expiring_offers(self, days: int = 7, make: str = None) -> List[Dict[str, Any]]:
+        """
+        Get unexpired offers that expire within the next few days, soonest first
+        
+        Only the part of the expiry heap inside the window is visited, so the
+        cost follows the number of offers returned rather than the catalog.
+        
+        Args:
+            days: Window in days from today (an offer expiring today counts)
+            make: Only offers for this make
             
-        # Filter expired offers
+        Returns:
+            Offers ordered by expiry date
+        """
         today = datetime.now().date()
-        return [
-            offer for offer in offers
-            if datetime.strptime(offer["expires"], "%Y-%m-%d").date() >= today
-        ]
+        self._evict_expired_offers(today)
+        cutoff = today + timedelta(days=days)
+        brand = _index_values("make", make)[0] if make else None
+        
+        heap = self._expiry_heap
+        found = []
+        pending = [0] if heap else []
+        while pending:
+            position = pending.pop()
+            expires, offer_id = heap[position]
+            if expires > cutoff:
+                # Heap order: nothing below this entry is inside the window either
+                continue
+            if self._offer_expiry.get(offer_id) == expires and (brand is None or self._offer_brand[offer_id] == brand):
+                found.append((expires, self._offer_order[offer_id], offer_id))
+            pending.extend(child for child in (2 * position + 1, 2 * position + 2) if child < len(heap))
+        return [self.offers[offer_id] for _, _, offer_id in sorted(found)]
         
     def get_inventory_count(self, make: str = None) -> Dict[str, int]:
         """Get inventory counts by make"""
         if make:
-            return {make: len(self.inventory.get(make.lower(), []))}
+            return {make: len(self._hash["make"].get(_index_values("make", make)[0], ()))}
             
         return {
-            brand: len(inventory)
-            for brand, inventory in self.inventory.items()
-        }
\ No newline at end of file
+            brand: len(ids)
+            for brand, ids in self._hash["make"].items()
+        }
@@ -0,0 +1,135 @@
+"""
+Inventory service for the Jack Ingram Motors Chatbot Demo
+
+Serves the SQLite inventory to the API gateway's "inventory" upstream.
+"""
+
+import asyncio
+import logging
+import click
+from quart import Quart, request, jsonify
+from inventory_store import InventoryStore
+from inventory_db import InventoryDB, INVENTORY_FILTERS
+from config import HOST, DEBUG, INVENTORY_SERVICE_PORT, INVENTORY_PAGE_SIZE, INVENTORY_MAX_PAGE_SIZE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+
+# SQLite calls run in worker threads (the store serializes them) so the event loop stays free
+store = InventoryStore()
+
+# Filters parsed as numbers; the rest are text
+NUMERIC_FILTERS = {
+    "year": int,
+    "min_year": int,
+    "max_year": int,
+    "min_price": float,
+    "max_price": float,
+    "max_mileage": int
+}
+
+# Filters that accept several comma-separated or repeated values
+MULTI_VALUE_FILTERS = ("make", "model", "color", "status", "body_style")
+
+def parse_filters(args) -> dict:
+    """
+    Convert query string arguments to InventoryStore filters
+
+    Unknown arguments are ignored so callers can pass their whole vehicle
+    query.
+
+    Raises:
+        ValueError: If a numeric filter is not a number
+    """
+    filters = {}
+    for name in INVENTORY_FILTERS:
+        values = [v.strip() for value in args.getlist(name) for v in value.split(",") if v.strip()]
+        if not values:
+            continue
+        if name in NUMERIC_FILTERS:
+            filters[name] = NUMERIC_FILTERS[name](float(values[0]))
+        elif name in MULTI_VALUE_FILTERS and len(values) > 1:
+            filters[name] = values
+        else:
+            filters[name] = values[0]
+    return filters
+
+@app.before_serving
+async def seed_sample_inventory():
+    """Load the demo inventory into an empty database so the service answers out of the box"""
+    if not await asyncio.to_thread(len, store):
+        sample = InventoryDB()
+        await asyncio.to_thread(
+            store.load_records,
+            sample.get_inventory(),
+            [dict(offer, brand=sample.offer_make(offer["id"])) for offer in sample.get_offers()]
+        )
+
+@app.route('/vehicles', methods=['GET'])
+async def list_vehicles():
+    """Paginated, filterable vehicle search"""
+    try:
+        filters = parse_filters(request.args)
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", INVENTORY_PAGE_SIZE)), 1), INVENTORY_MAX_PAGE_SIZE)
+        filters.setdefault("status", "available")
+        vehicles, total = await asyncio.to_thread(
+            store.query, filters, page=page, per_page=per_page,
+            sort=request.args.get("sort"), text=request.args.get("q")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "vehicles": vehicles,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page
+    })
+
+@app.route('/vehicles/<vin>', methods=['GET'])
+async def get_vehicle(vin):
+    """Look up one vehicle by VIN"""
+    vehicle = await asyncio.to_thread(store.get_vehicle, vin)
+    if vehicle is None:
+        return jsonify({"error": "Vehicle not found"}), 404
+    return jsonify(vehicle)
+
+@app.route('/offers', methods=['GET'])
+async def get_offers():
+    """Unexpired special offers for a make and model"""
+    offers = await asyncio.to_thread(store.get_offers, request.args.get("make"), request.args.get("model"))
+    return jsonify({"offers": offers})
+
+@app.route('/inventory/count', methods=['GET'])
+async def get_inventory_count():
+    """Vehicle counts by make"""
+    counts = await asyncio.to_thread(store.get_inventory_count, request.args.get("make"), request.args.get("status"))
+    return jsonify({"counts": counts})
+
+@app.route('/health')
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy", "vehicles": await asyncio.to_thread(len, store)}), 200
+
+@app.cli.command("load-feed")
+@click.argument("path")
+@click.option("--full", is_flag=True, help="Remove vehicles of the feed's makes that are not in the feed")
+def load_feed(path, full):
+    """Bulk-load a dealer inventory feed (CSV or JSON)"""
+    counts = store.load_feed(path, full=full)
+    logger.info(
+        f"Loaded {counts['loaded']} vehicles ({counts['skipped']} skipped, "
+        f"{counts['removed']} removed) and {counts['offers']} offers from {path}"
+    )
+
+def run_service():
+    """Run the inventory service with Quart's development server"""
+    app.run(host=HOST, port=INVENTORY_SERVICE_PORT, debug=DEBUG)
+
+if __name__ == "__main__":
+    run_service()
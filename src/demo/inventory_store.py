@@ -0,0 +1,498 @@
+"""
+SQLite-backed vehicle inventory with bulk dealer feed ingestion
+"""
+
+import re
+import csv
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+from config import INVENTORY_DB_PATH, INVENTORY_BATCH_SIZE, INVENTORY_FTS_ENABLED
+from query_normalizer import BRAND_SYNONYMS
+from intent_matcher import BODY_STYLES, COLORS
+
+# Feed column headers (normalized) and the vehicle field they load into
+FEED_COLUMNS = {
+    "id": "id",
+    "vin": "vin",
+    "stock": "stock",
+    "stock_number": "stock",
+    "stock_no": "stock",
+    "make": "make",
+    "model": "model",
+    "year": "year",
+    "model_year": "year",
+    "trim": "trim",
+    "price": "price",
+    "internet_price": "price",
+    "selling_price": "price",
+    "sale_price": "price",
+    "msrp": "msrp",
+    "mileage": "mileage",
+    "miles": "mileage",
+    "odometer": "mileage",
+    "color": "color",
+    "exterior_color": "color",
+    "ext_color": "color",
+    "body_style": "body_style",
+    "body": "body_style",
+    "bodystyle": "body_style",
+    "status": "status",
+    "description": "description",
+    "comments": "description"
+}
+
+# Stored vehicle columns, in table order
+VEHICLE_COLUMNS = (
+    "vin", "id", "stock", "brand", "make", "model", "model_key", "year", "trim", "price", "msrp",
+    "mileage", "color", "color_family", "body_style", "status", "description", "updated_at"
+)
+
+# Columns used only for lookups, left out of returned records
+INTERNAL_COLUMNS = ("brand", "model_key", "color_family", "updated_at")
+
+# Sortable fields for query()
+SORT_FIELDS = ("price", "year", "mileage")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    vin TEXT PRIMARY KEY,
+    id TEXT,
+    stock TEXT,
+    brand TEXT NOT NULL,
+    make TEXT,
+    model TEXT,
+    model_key TEXT,
+    year INTEGER,
+    trim TEXT,
+    price NUMERIC,
+    msrp NUMERIC,
+    mileage INTEGER,
+    color TEXT,
+    color_family TEXT,
+    body_style TEXT,
+    status TEXT NOT NULL DEFAULT 'available',
+    description TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vehicles_brand_model ON vehicles (brand, model_key, price);
+CREATE INDEX IF NOT EXISTS idx_vehicles_status_price ON vehicles (status, price);
+CREATE INDEX IF NOT EXISTS idx_vehicles_body_price ON vehicles (body_style, price);
+CREATE INDEX IF NOT EXISTS idx_vehicles_year ON vehicles (year);
+CREATE INDEX IF NOT EXISTS idx_vehicles_mileage ON vehicles (mileage);
+CREATE INDEX IF NOT EXISTS idx_vehicles_color ON vehicles (color_family);
+CREATE INDEX IF NOT EXISTS idx_vehicles_updated ON vehicles (brand, updated_at);
+CREATE TABLE IF NOT EXISTS offers (
+    id TEXT PRIMARY KEY,
+    brand TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    expires TEXT,
+    models TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_offers_brand_expires ON offers (brand, expires);
+"""
+
+# Full-text index over trim and description, kept in step by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS vehicles_fts USING fts5(
+    trim, description, content='vehicles', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS vehicles_fts_insert AFTER INSERT ON vehicles BEGIN
+    INSERT INTO vehicles_fts (rowid, trim, description) VALUES (new.rowid, new.trim, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS vehicles_fts_delete AFTER DELETE ON vehicles BEGIN
+    INSERT INTO vehicles_fts (vehicles_fts, rowid, trim, description)
+    VALUES ('delete', old.rowid, old.trim, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS vehicles_fts_update AFTER UPDATE OF trim, description ON vehicles BEGIN
+    INSERT INTO vehicles_fts (vehicles_fts, rowid, trim, description)
+    VALUES ('delete', old.rowid, old.trim, old.description);
+    INSERT INTO vehicles_fts (rowid, trim, description) VALUES (new.rowid, new.trim, new.description);
+END;
+"""
+
+_NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_BODY_WORDS = {word: style for style, words in BODY_STYLES.items() for word in words}
+
+
+def _header(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_")
+
+
+def _number(value: Any) -> Optional[float]:
+    """Parse a feed number such as "$48,995" or "12,034 mi" """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = _NUMBER.search(str(value))
+    if not match:
+        return None
+    number = float(match.group().replace(",", ""))
+    return int(number) if number.is_integer() else number
+
+
+def _text(value: Any) -> Optional[str]:
+    text = " ".join(str(value).split()) if value is not None else ""
+    return text or None
+
+
+def _color_family(color: Optional[str]) -> Optional[str]:
+    """Basic color named in a color such as "Mythos Black Metallic" """
+    for word in (color or "").lower().split():
+        if word in COLORS:
+            return COLORS[word]
+    return None
+
+
+def _body_style(body: Optional[str]) -> Optional[str]:
+    """Canonical body style for a feed value such as "SUV" or "4dr Sedan" """
+    words = (body or "").lower().split()
+    for word in words:
+        if word in _BODY_WORDS:
+            return _BODY_WORDS[word]
+    return " ".join(words) or None
+
+
+def _brand(make: Optional[str]) -> Optional[str]:
+    key = (make or "").strip().lower()
+    return BRAND_SYNONYMS.get(key, key) or None
+
+
+def _fts_query(text: str) -> str:
+    """Quote each word so user text can't use FTS5 query syntax"""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class InventoryStore:
+    """
+    Vehicle inventory and offers in a single SQLite file.
+
+    Feeds are upserted by VIN in batched transactions, and every filter the
+    chatbot uses is backed by an index, so lookups stay fast with tens of
+    thousands of vehicles. WAL mode lets the inventory service read while
+    a feed is loading.
+    """
+
+    def __init__(
+        self,
+        path: str = INVENTORY_DB_PATH,
+        batch_size: int = INVENTORY_BATCH_SIZE,
+        fts: bool = INVENTORY_FTS_ENABLED
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.fts = fts and self._create_fts()
+
+    def _create_fts(self) -> bool:
+        """Create the full-text index if this SQLite build has FTS5"""
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"Full-text search disabled: {str(e)}")
+            return False
+
+    def load_feed(self, path: str, full: bool = False) -> Dict[str, int]:
+        """
+        Load a dealer feed file
+
+        CSV feeds hold one vehicle per row. JSON feeds are either a list of
+        vehicles or an object with "vehicles" and optional "offers" lists.
+
+        Args:
+            path: Feed file (.csv or .json)
+            full: The feed is a complete inventory for its brands, so vehicles
+                  of those brands missing from it are removed
+
+        Returns:
+            Counts of vehicles loaded, skipped and removed, and offers loaded
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                return self.load_records(csv.DictReader(f), full=full)
+
+        with open(path, encoding="utf-8") as f:
+            feed = json.load(f)
+        if isinstance(feed, list):
+            return self.load_records(feed, full=full)
+        return self.load_records(feed.get("vehicles", []), feed.get("offers"), full=full)
+
+    def load_records(
+        self,
+        vehicles: Iterable[Dict[str, Any]],
+        offers: Optional[Iterable[Dict[str, Any]]] = None,
+        full: bool = False
+    ) -> Dict[str, int]:
+        """
+        Upsert vehicles (by VIN) and offers in batched transactions
+
+        Args:
+            vehicles: Vehicle records with feed or InventoryDB field names
+            offers: Offer records with a make or brand
+            full: Remove vehicles of the loaded brands that weren't in this load
+
+        Returns:
+            Counts of vehicles loaded, skipped and removed, and offers loaded
+        """
+        loaded_at = time.time()
+        counts = {"loaded": 0, "skipped": 0, "removed": 0, "offers": 0}
+        brands = set()
+
+        insert = (
+            f"INSERT INTO vehicles ({', '.join(VEHICLE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in VEHICLE_COLUMNS)}) "
+            f"ON CONFLICT(vin) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in VEHICLE_COLUMNS[1:])
+        )
+        for batch in self._batches(self._vehicle_rows(vehicles, loaded_at, counts)):
+            brands.update(row[3] for row in batch)
+            self._write(insert, batch)
+            counts["loaded"] += len(batch)
+
+        if full and brands:
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"DELETE FROM vehicles WHERE updated_at < ? AND brand IN ({', '.join('?' for _ in brands)})",
+                    (loaded_at, *sorted(brands))
+                )
+                counts["removed"] = cursor.rowcount
+
+        if offers is not None:
+            rows = [row for row in (self._offer_row(offer) for offer in offers) if row is not None]
+            self._write("INSERT OR REPLACE INTO offers (id, brand, title, description, expires, models) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            counts["offers"] = len(rows)
+
+        with self._lock:
+            # Refresh planner statistics so it keeps choosing the most selective index
+            self._conn.execute("PRAGMA optimize")
+        self.logger.info(f"Loaded inventory feed: {counts}")
+        return counts
+
+    def _batches(self, rows: Iterator[Tuple]) -> Iterator[List[Tuple]]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _write(self, sql: str, rows: List[Tuple]) -> None:
+        """Write rows in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _vehicle_rows(self, records: Iterable[Dict[str, Any]], loaded_at: float, counts: Dict[str, int]) -> Iterator[Tuple]:
+        for record in records:
+            fields = {}
+            for name, value in record.items():
+                field = FEED_COLUMNS.get(_header(name))
+                if field and value not in (None, ""):
+                    fields.setdefault(field, value)
+
+            key = _text(fields.get("vin") or fields.get("stock") or fields.get("id"))
+            brand = _brand(fields.get("make"))
+            if not key or not brand:
+                counts["skipped"] += 1
+                continue
+
+            model = _text(fields.get("model"))
+            color = _text(fields.get("color"))
+            row = {
+                "vin": key,
+                "id": _text(fields.get("id")) or key,
+                "stock": _text(fields.get("stock")),
+                "brand": brand,
+                "make": _text(fields.get("make")),
+                "model": model,
+                "model_key": model.lower() if model else None,
+                "year": _number(fields.get("year")),
+                "trim": _text(fields.get("trim")),
+                "price": _number(fields.get("price")),
+                "msrp": _number(fields.get("msrp")),
+                "mileage": _number(fields.get("mileage")),
+                "color": color,
+                "color_family": _color_family(color),
+                "body_style": _body_style(_text(fields.get("body_style"))),
+                "status": (_text(fields.get("status")) or "available").lower(),
+                "description": _text(fields.get("description")),
+                "updated_at": loaded_at
+            }
+            yield tuple(row[column] for column in VEHICLE_COLUMNS)
+
+    def _offer_row(self, offer: Dict[str, Any]) -> Optional[Tuple]:
+        brand = _brand(offer.get("brand") or offer.get("make"))
+        if not offer.get("id") or not brand:
+            return None
+        models = offer.get("models") or []
+        if isinstance(models, str):
+            models = [model.strip() for model in models.split(",") if model.strip()]
+        return (str(offer["id"]), brand, offer.get("title"), offer.get("description"),
+                offer.get("expires"), json.dumps(models))
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        page: int = 1,
+        per_page: int = 20,
+        sort: Optional[str] = None,
+        text: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Find vehicles matching every filter, one page at a time
+
+        Args:
+            filters: InventoryDB.query filter names (make, model, color, status,
+                     body_style, year, min/max year and price, max_mileage);
+                     equality filters also accept a list of values
+            page: Page number, from 1
+            per_page: Vehicles per page
+            sort: "price", "year" or "mileage", prefixed with "-" for descending
+            text: Words that must appear in the trim or description
+
+        Returns:
+            (vehicles on the page, total matching vehicles)
+
+        Raises:
+            ValueError: For an unknown filter or sort field
+        """
+        where, params = self._where(filters or {})
+        if text and text.strip():
+            if self.fts:
+                where.append("rowid IN (SELECT rowid FROM vehicles_fts WHERE vehicles_fts MATCH ?)")
+                params.append(_fts_query(text))
+            else:
+                for word in text.split():
+                    where.append("(trim LIKE ? OR description LIKE ?)")
+                    params.extend([f"%{word}%"] * 2)
+
+        order = "rowid"
+        if sort:
+            field = sort.lstrip("-")
+            if field not in SORT_FIELDS:
+                raise ValueError(f"Cannot sort by {field}")
+            # Written so an index on the field can supply the order (NULLs sort last either way)
+            order = f"{field} {'DESC' if sort.startswith('-') else 'ASC NULLS LAST'}, rowid"
+
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        offset = (max(page, 1) - 1) * per_page
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM vehicles{clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM vehicles{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                (*params, per_page, offset)
+            ).fetchall()
+        return [self._vehicle(row) for row in rows], total
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        where, params = [], []
+
+        def equals(column: str, values: List[Any]) -> None:
+            if len(values) == 1:
+                where.append(f"{column} = ?")
+            else:
+                where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+        for name, value in filters.items():
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if name == "make":
+                equals("brand", [_brand(str(v)) for v in values])
+            elif name == "model":
+                equals("model_key", [str(v).lower() for v in values])
+            elif name == "color":
+                colors = [str(v).lower() for v in values]
+                families = [_color_family(c) or c for c in colors]
+                where.append(
+                    f"(color_family IN ({', '.join('?' for _ in families)})"
+                    f" OR lower(color) IN ({', '.join('?' for _ in colors)}))"
+                )
+                params.extend(families + colors)
+            elif name == "status":
+                equals("status", [str(v).lower() for v in values])
+            elif name == "body_style":
+                equals("body_style", [_body_style(str(v)) for v in values])
+            elif name == "year":
+                equals("year", [int(v) for v in values])
+            elif name in ("min_year", "min_price"):
+                where.append(f"{name[4:]} >= ?")
+                params.append(value)
+            elif name in ("max_year", "max_price", "max_mileage"):
+                where.append(f"{name[4:]} <= ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unknown filter: {name}")
+        return where, params
+
+    def _vehicle(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {key: row[key] for key in row.keys() if key not in INTERNAL_COLUMNS}
+
+    def get_vehicle(self, vin: str) -> Optional[Dict[str, Any]]:
+        """Get one vehicle by VIN"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM vehicles WHERE vin = ?", (vin,)).fetchone()
+        return self._vehicle(row) if row is not None else None
+
+    def get_offers(self, make: str = None, model: str = None) -> List[Dict[str, Any]]:
+        """Get unexpired special offers, optionally for one make and model"""
+        sql = "SELECT * FROM offers WHERE (expires IS NULL OR expires >= ?)"
+        params: List[Any] = [datetime.now().date().isoformat()]
+        if make:
+            sql += " AND brand = ?"
+            params.append(_brand(make))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY expires", params).fetchall()
+
+        # Models are matched case-insensitively, like InventoryDB ("f-150" finds "F-150" offers)
+        wanted = model.lower() if model else None
+        offers = []
+        for row in rows:
+            offer = {key: row[key] for key in row.keys() if key != "brand"}
+            offer["models"] = json.loads(offer["models"])
+            if not wanted or not offer["models"] or wanted in (name.lower() for name in offer["models"]):
+                offers.append(offer)
+        return offers
+
+    def get_inventory_count(self, make: str = None, status: str = None) -> Dict[str, int]:
+        """Get vehicle counts by make, optionally only with one status"""
+        where, params = self._where({"make": make, "status": status})
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT brand, COUNT(*) FROM vehicles{clause} GROUP BY brand", params
+            ).fetchall()
+        counts = {brand: count for brand, count in rows}
+        if make:
+            return {make: counts.get(_brand(make), 0)}
+        return counts
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
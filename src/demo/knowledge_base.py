@@ -2,8 +2,16 @@
 Knowledge base for Jack Ingram Motors information
 """
 import json
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import threading
+from typing import Dict, Any, Optional, Union
+from response_cache import ResponseCache
+from query_normalizer import QueryNormalizer, NormalizedQuery, SimilarityIndex, BRAND_SYNONYMS
+from intent_matcher import IntentMatcher
+from fuzzy_index import FuzzyIndex
+from config import QUERY_SIMILARITY_ENABLED, QUERY_SIMILARITY_THRESHOLD, KB_CACHE_MAX_ENTRIES
+
+# Cache lookup tiers, from most to least specific
+CACHE_TIERS = ("exact", "normalized", "intent", "similar")
 
 class KnowledgeBase:
     """Manages dealership information and caches responses"""
@@ -107,8 +115,21 @@ class KnowledgeBase:
     
     def __init__(self):
         """Initialize knowledge base and response cache"""
-        self.response_cache = {}
-        self.cache_duration = timedelta(hours=24)  # Cache responses for 24 hours
+        self.response_cache = ResponseCache()
+        self.fuzzy_index = FuzzyIndex()
+        for spelling, brand in BRAND_SYNONYMS.items():
+            self.fuzzy_index.add(spelling, "make", brand)
+        for brand, info in self.DEALERSHIP_INFO["brands"].items():
+            for model in info["popular_models"]:
+                self.fuzzy_index.add(model, "model", brand)
+        self.intent_matcher = IntentMatcher({
+            brand: info["popular_models"] for brand, info in self.DEALERSHIP_INFO["brands"].items()
+        }, fuzzy=self.fuzzy_index)
+        self.normalizer = QueryNormalizer(self.intent_matcher)
+        self.similarity_index = SimilarityIndex(max_documents=KB_CACHE_MAX_ENTRIES) if QUERY_SIMILARITY_ENABLED else None
+        self._stats_lock = threading.Lock()
+        self._tier_hits = dict.fromkeys(CACHE_TIERS, 0)
+        self._lookups = 0
         
     def get_dealership_info(self, category: Optional[str] = None, 
                           brand: Optional[str] = None) -> Dict[str, Any]:
@@ -127,19 +148,78 @@ class KnowledgeBase:
         else:
             return {"brand_info": self.DEALERSHIP_INFO.get("brands", {}).get(brand, {})}
             
-    def get_cached_response(self, query: str) -> Optional[str]:
-        """Get cached response if available and not expired"""
-        if query in self.response_cache:
-            timestamp, response = self.response_cache[query]
-            if datetime.now() - timestamp < self.cache_duration:
-                return response
-            else:
-                del self.response_cache[query]
+    def normalize(self, query: Union[str, NormalizedQuery]) -> NormalizedQuery:
+        """Canonicalize a query for cache lookups"""
+        if isinstance(query, NormalizedQuery):
+            return query
+        return self.normalizer.normalize(query)
+        
+    def get_cached_response(self, query: Union[str, NormalizedQuery]) -> Optional[str]:
+        """
+        Get cached response if available and not expired
+        
+        Tries the exact, normalized and intent keys in turn, then falls back to
+        the nearest previously answered question in the similarity index.
+        """
+        normalized = self.normalize(query)
+        
+        for tier, key in normalized.keys():
+            if key:
+                response = self.response_cache.get(key)
+                if response is not None:
+                    self._record_lookup(tier)
+                    return response
+                    
+        if self.similarity_index is not None and normalized.text:
+            match = self.similarity_index.search(normalized.text, QUERY_SIMILARITY_THRESHOLD)
+            if match:
+                response = self.response_cache.get(match[0])
+                if response is not None:
+                    self._record_lookup("similar")
+                    return response
+                # The answer has been evicted from the cache
+                self.similarity_index.remove(match[0])
+                
+        self._record_lookup(None)
         return None
         
-    def cache_response(self, query: str, response: str) -> None:
-        """Cache a response with current timestamp"""
-        self.response_cache[query] = (datetime.now(), response)
+    def cache_response(self, query: Union[str, NormalizedQuery], response: str) -> None:
+        """
+        Cache a response under every canonical form of the query
+
+        The broad intent key and the similarity index only take answers to
+        pure dealership-information questions; anything else is cached
+        under its exact and normalized keys alone.
+        """
+        normalized = self.normalize(query)
+        for tier, key in normalized.keys():
+            if key:
+                self.response_cache.set(key, response)
+        if self.similarity_index is not None and normalized.text and normalized.knowledge_only:
+            self.similarity_index.add(normalized.normalized_key, normalized.text)
+            
+    def _record_lookup(self, tier: Optional[str]) -> None:
+        with self._stats_lock:
+            self._lookups += 1
+            if tier:
+                self._tier_hits[tier] += 1
+        
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get response cache counters and the hit rate of each lookup tier"""
+        stats = self.response_cache.stats()
+        with self._stats_lock:
+            lookups = self._lookups
+            tier_hits = dict(self._tier_hits)
+        hits = sum(tier_hits.values())
+        stats["lookups"] = lookups
+        stats["query_hit_rate"] = hits / lookups if lookups else 0.0
+        stats["tiers"] = {
+            tier: {"hits": count, "hit_rate": count / lookups if lookups else 0.0}
+            for tier, count in tier_hits.items()
+        }
+        if self.similarity_index is not None:
+            stats["similarity_documents"] = len(self.similarity_index)
+        return stats
         
     def get_brand_tone(self, brand: str) -> str:
         """Get brand-specific tone for responses"""
@@ -162,4 +242,29 @@ Sunday: {hours.get('sunday', 'Closed')}
     def get_brand_models(self, brand: str) -> list:
         """Get popular models for a specific brand"""
         brand_info = self.DEALERSHIP_INFO.get("brands", {}).get(brand.lower(), {})
-        return brand_info.get("popular_models", [])
\ No newline at end of file
+        return brand_info.get("popular_models", [])
+        
+    def format_prompt_context(self) -> str:
+        """Render the static dealership facts included in the cached system prompt"""
+        lines = ["Dealership reference information:"]
+        
+        main = self.DEALERSHIP_INFO.get("main", {})
+        lines.append(f"{main.get('name', '')}, {main.get('location', '')}. Phone: {main.get('phone', '')}. Website: {main.get('website', '')}")
+        lines.append(" ".join(main.get("about", "").split()))
+        
+        for department in self.DEALERSHIP_INFO.get("hours", {}):
+            lines.append(" ".join(self.format_hours(department).split()))
+        
+        lines.append("Brands:")
+        for brand_info in self.DEALERSHIP_INFO.get("brands", {}).values():
+            lines.append(
+                f"- {brand_info['name']} ({brand_info['location']}): "
+                f"specialties {', '.join(brand_info['specialties'])}; "
+                f"popular models {', '.join(brand_info['popular_models'])}; "
+                f"tone {brand_info['tone']}"
+            )
+        
+        for department, services in self.DEALERSHIP_INFO.get("services", {}).items():
+            lines.append(f"{department.title()}: {', '.join(services)}")
+        
+        return "\n".join(lines)
\ No newline at end of file
@@ -6,6 +6,8 @@ import aiohttp
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
+from http_pool import session_registry
+from singleflight import singleflight_registry, flight_key
 
 class PerplexityClient:
     """Client for Perplexity API integration"""
@@ -25,40 +27,47 @@ class PerplexityClient:
         Returns:
             Dict containing real-time information
         """
+        # Users asking the same question at the same moment share one lookup
+        return await singleflight_registry.get("perplexity").do(
+            flight_key(query), lambda: self._fetch_realtime_info(query)
+        )
+    
+    async def _fetch_realtime_info(self, query: str) -> Dict[str, Any]:
+        """Query Perplexity for real-time information"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "accept": "application/json",
-                        "content-type": "application/json",
-                        "Authorization": f"Bearer {self.api_key}"
-                    },
-                    json={
-                        "model": "sonar-pro",
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": f"""Current date: {datetime.now().strftime('%B %d, %Y')}
-                                Provide accurate, real-time information about Jack Ingram Motors dealerships."""
-                            },
-                            {
-                                "role": "user",
-                                "content": query
-                            }
-                        ]
-                    }
-                ) as response:
-                    response_data = await response.json()
-                    
-                    return {
-                        "response": response_data.get("choices", [{}])[0].get("message", {}).get("content", ""),
-                        "metadata": {
-                            "model": response_data.get("model", ""),
-                            "timestamp": datetime.now().isoformat()
+            session = session_registry.get("perplexity")
+            async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "accept": "application/json",
+                    "content-type": "application/json",
+                    "Authorization": f"Bearer {self.api_key}"
+                },
+                json={
+                    "model": "sonar-pro",
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": f"""Current date: {datetime.now().strftime('%B %d, %Y')}
+                            Provide accurate, real-time information about Jack Ingram Motors dealerships."""
+                        },
+                        {
+                            "role": "user",
+                            "content": query
                         }
+                    ]
+                }
+            ) as response:
+                response_data = await response.json()
+                
+                return {
+                    "response": response_data.get("choices", [{}])[0].get("message", {}).get("content", ""),
+                    "metadata": {
+                        "model": response_data.get("model", ""),
+                        "timestamp": datetime.now().isoformat()
                     }
-                    
+                }
+                
         except Exception as e:
             self.logger.error(f"Perplexity API error: {str(e)}")
             return {
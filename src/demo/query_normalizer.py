@@ -0,0 +1,245 @@
+"""
+Query canonicalization and near-duplicate matching for the response cache
+"""
+
+import re
+import math
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+# Canonical brand keys match KnowledgeBase.DEALERSHIP_INFO["brands"]
+BRAND_SYNONYMS = {
+    "audi": "audi",
+    "mercedes": "mercedes",
+    "mercedes-benz": "mercedes",
+    "mercedesbenz": "mercedes",
+    "merc": "mercedes",
+    "mercs": "mercedes",
+    "benz": "mercedes",
+    "mb": "mercedes",
+    "amg": "mercedes",
+    "nissan": "nissan",
+    "porsche": "porsche",
+    "porshe": "porsche",
+    "porsch": "porsche",
+    "volkswagen": "volkswagen",
+    "vw": "volkswagen",
+    "vdub": "volkswagen",
+    "volvo": "volvo"
+}
+
+# Chat shorthand expanded before matching
+SHORTHAND = {
+    "r": "are",
+    "u": "you",
+    "ur": "your",
+    "ya": "you",
+    "hrs": "hours",
+    "hr": "hours",
+    "pls": "please",
+    "plz": "please",
+    "thx": "thanks",
+    "tmrw": "tomorrow",
+    "tmr": "tomorrow",
+    "wknd": "weekend",
+    "sat": "saturday",
+    "sun": "sunday",
+    "addr": "address",
+    "svc": "service",
+    "info": "information"
+}
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did can could would will shall should
+i me my we our you your he she it its they them their this that these those
+what whats which who whom when where why how hi hello hey please thanks thank
+of at by for with about to from in on up out any some there here just tell
+""".split())
+
+# Keywords that map a question onto a knowledge base category; when several
+# match, the first category in CATEGORY_PRIORITY wins
+CATEGORY_PRIORITY = ("hours", "services", "main")
+CATEGORY_KEYWORDS = {
+    "hours": "hours",
+    "services": "services",
+    "location": "main",
+    "contact": "main",
+    "about": "main"
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+class NormalizedQuery:
+    """Canonical forms of a user query, from most to least specific"""
+
+    __slots__ = ("exact", "tokens", "text", "brand", "category", "intent")
+
+    def __init__(
+        self,
+        exact: str,
+        tokens: List[str],
+        brand: Optional[str],
+        category: Optional[str],
+        intent: Any = None
+    ):
+        self.exact = exact
+        self.tokens = tokens
+        self.text = " ".join(tokens)
+        self.brand = brand
+        self.category = category
+        # QueryIntent from the intent matcher, when one is configured
+        self.intent = intent
+
+    @property
+    def normalized_key(self) -> str:
+        """Order-insensitive key over the meaningful words"""
+        return "norm:" + " ".join(sorted(set(self.tokens)))
+
+    @property
+    def knowledge_only(self) -> bool:
+        """True when the query only asks for knowledge base information, with no vehicle or other intent"""
+        if not self.category:
+            return False
+        return self.intent is None or self.intent.knowledge_only
+
+    @property
+    def intent_key(self) -> Optional[str]:
+        """Key for answers fully determined by knowledge base category and brand"""
+        if not self.knowledge_only:
+            return None
+        return f"intent:{self.category}:{self.brand or '*'}"
+
+    def keys(self) -> List[Tuple[str, Optional[str]]]:
+        """Cache keys to try, as (tier, key) pairs in lookup order"""
+        return [
+            ("exact", self.exact),
+            ("normalized", self.normalized_key),
+            ("intent", self.intent_key)
+        ]
+
+class QueryNormalizer:
+    """Canonicalizes user queries so equivalent questions share cache keys"""
+
+    def __init__(self, matcher=None):
+        """
+        Args:
+            matcher: Optional IntentMatcher; when set, brand and category come
+                from its single-pass extraction instead of keyword lookups
+        """
+        self.matcher = matcher
+
+    def normalize(self, message: str) -> NormalizedQuery:
+        """
+        Canonicalize a user message
+
+        Args:
+            message: Raw user message
+
+        Returns:
+            NormalizedQuery with exact, normalized and intent forms
+        """
+        exact = " ".join(message.lower().split())
+        tokens = []
+        brand = None
+        categories = set()
+
+        for word in _TOKEN_PATTERN.findall(exact):
+            word = SHORTHAND.get(word, word)
+            if word in BRAND_SYNONYMS:
+                word = BRAND_SYNONYMS[word]
+                brand = brand or word
+            if word in CATEGORY_KEYWORDS:
+                categories.add(CATEGORY_KEYWORDS[word])
+            if word not in STOPWORDS:
+                tokens.append(word)
+
+        # Treat a trailing plural the same as its singular ("offers" / "offer")
+        tokens = [t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t for t in tokens]
+
+        if self.matcher is not None:
+            intent = self.matcher.match(message)
+            return NormalizedQuery(exact, tokens, intent.make, intent.category, intent)
+
+        category = next((c for c in CATEGORY_PRIORITY if c in categories), None)
+        return NormalizedQuery(exact, tokens, brand, category)
+
+class SimilarityIndex:
+    """
+    Local near-duplicate index over hashed character n-gram vectors.
+
+    Documents are L2-normalized sparse vectors kept in an inverted index, so a
+    query only touches documents that share at least one n-gram with it. The
+    oldest documents are dropped once max_documents is reached.
+    """
+
+    def __init__(self, ngram_size: int = 3, dimensions: int = 1 << 18, max_documents: int = 10000):
+        self.ngram_size = ngram_size
+        self.dimensions = dimensions
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[str, Dict[int, float]]" = OrderedDict()
+        self._postings: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def vectorize(self, text: str) -> Dict[int, float]:
+        """Hash the character n-grams of a text into a unit-length sparse vector"""
+        padded = f" {text} "
+        counts: Dict[int, float] = {}
+        for i in range(max(1, len(padded) - self.ngram_size + 1)):
+            feature = zlib.crc32(padded[i:i + self.ngram_size].encode()) % self.dimensions
+            counts[feature] = counts.get(feature, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {feature: value / norm for feature, value in counts.items()}
+
+    def add(self, key: str, text: str) -> None:
+        """Index a document under a key, replacing any previous version"""
+        vector = self.vectorize(text)
+        with self._lock:
+            self._remove(key)
+            self._documents[key] = vector
+            for feature, weight in vector.items():
+                self._postings.setdefault(feature, {})[key] = weight
+            while len(self._documents) > self.max_documents:
+                self._remove(next(iter(self._documents)))
+
+    def remove(self, key: str) -> None:
+        """Remove a document from the index"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        vector = self._documents.pop(key, None)
+        if vector is None:
+            return
+        for feature in vector:
+            posting = self._postings.get(feature)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self._postings[feature]
+
+    def search(self, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed document
+
+        Args:
+            text: Query text
+            threshold: Minimum cosine similarity to accept
+
+        Returns:
+            (key, similarity) of the best match, or None
+        """
+        vector = self.vectorize(text)
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for feature, weight in vector.items():
+                for key, doc_weight in self._postings.get(feature, {}).items():
+                    scores[key] = scores.get(key, 0.0) + weight * doc_weight
+        if not scores:
+            return None
+        key, score = max(scores.items(), key=lambda item: item[1])
+        return (key, score) if score >= threshold else None
+
+    def __len__(self) -> int:
+        return len(self._documents)
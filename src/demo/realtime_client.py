@@ -2,19 +2,36 @@
 Real-time data client combining multiple LLMs and data sources
 """
 
+import asyncio
 import aiohttp
 import logging
 from datetime import datetime
 import pytz
 from typing import Dict, Any, Optional
 import json
+from http_pool import session_registry
+from singleflight import singleflight_registry, flight_key
+from web_scraper import IncrementalScraper
+from config import TIMEZONE
 
 class RealtimeClient:
     """Client for fetching real-time information"""
     
-    def __init__(self, perplexity_key: str = "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"):
+    # Dealership pages scraped for vehicle cards and offers
+    WEB_PAGES = [
+        "https://www.jackingram.com/new-inventory/",
+        "https://www.jackingram.com/service-specials/",
+        "https://www.jackingram.com/current-offers/"
+    ]
+    
+    def __init__(
+        self,
+        perplexity_key: str = "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",
+        scraper: Optional[IncrementalScraper] = None
+    ):
         self.perplexity_key = perplexity_key
         self.logger = logging.getLogger(__name__)
+        self.scraper = scraper if scraper is not None else IncrementalScraper()
         
     async def get_realtime_info(self, query: str) -> Dict[str, Any]:
         """
@@ -27,13 +44,15 @@ class RealtimeClient:
             Dict containing real-time information
         """
         try:
-            current_time = datetime.now(pytz.timezone('America/Chicago'))
+            current_time = datetime.now(pytz.timezone(TIMEZONE))
             
-            # Get real-time data from Perplexity
-            perplexity_data = await self._get_perplexity_data(query, current_time)
+            # Get real-time data from Perplexity; identical concurrent queries share one call
+            perplexity_data = await singleflight_registry.get("realtime_perplexity").do(
+                flight_key(query), lambda: self._get_perplexity_data(query, current_time)
+            )
             
-            # Get web data
-            web_data = await self._get_web_data(query)
+            # Get web data; the scraped pages don't depend on the query
+            web_data = await self.get_web_data()
             
             # Combine all real-time info
             return {
@@ -52,63 +71,69 @@ class RealtimeClient:
     async def _get_perplexity_data(self, query: str, current_time: datetime) -> Dict[str, Any]:
         """Get real-time data from Perplexity API"""
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "accept": "application/json",
-                    "content-type": "application/json",
-                    "authorization": f"Bearer {self.perplexity_key}"
-                }
-                
-                # Add time context to query
-                enhanced_query = f"""Current time: {current_time.strftime('%B %d, %Y %H:%M:%S %Z')}
-                Question about Jack Ingram Motors in Montgomery, AL: {query}"""
-                
-                payload = {
-                    "model": "sonar-medium-online",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a real-time information assistant for Jack Ingram Motors. Always include current date/time in responses."
-                        },
-                        {
-                            "role": "user",
-                            "content": enhanced_query
-                        }
-                    ]
-                }
+            session = session_registry.get("perplexity")
+            headers = {
+                "accept": "application/json",
+                "content-type": "application/json",
+                "authorization": f"Bearer {self.perplexity_key}"
+            }
+            
+            # Add time context to query
+            enhanced_query = f"""Current time: {current_time.strftime('%B %d, %Y %H:%M:%S %Z')}
+            Question about Jack Ingram Motors in Montgomery, AL: {query}"""
+            
+            payload = {
+                "model": "sonar-medium-online",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "You are a real-time information assistant for Jack Ingram Motors. Always include current date/time in responses."
+                    },
+                    {
+                        "role": "user",
+                        "content": enhanced_query
+                    }
+                ]
+            }
+            
+            async with session.post(
+                "https://api.perplexity.ai/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
+                return await response.json()
                 
-                async with session.post(
-                    "https://api.perplexity.ai/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    return await response.json()
-                    
         except Exception as e:
             self.logger.error(f"Perplexity API error: {str(e)}")
             return {"error": str(e)}
     
-    async def _get_web_data(self, query: str) -> Dict[str, Any]:
-        """Get real-time data from web scraping"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                # Scrape dealership website for current info
-                urls = [
-                    "https://www.jackingram.com/new-inventory/",
-                    "https://www.jackingram.com/service-specials/",
-                    "https://www.jackingram.com/current-offers/"
-                ]
-                
-                data = {}
-                for url in urls:
-                    async with session.get(url) as response:
-                        html = await response.text()
-                        # Parse HTML and extract relevant info
-                        # TODO: Implement proper scraping
-                        data[url] = "Web data placeholder"
-                        
-                return data
-                
-        except Exception as e:
-            self.logger.error(f"Web scraping error: {str(e)}")
-            return {"error": str(e)}
\ No newline at end of file
+    async def get_web_data(self) -> Dict[str, Any]:
+        """
+        Get structured vehicle and offer records from the dealership pages
+        
+        Pages are fetched concurrently; unchanged pages are answered from the
+        scraper's last extraction. Concurrent callers share one scrape.
+        
+        Returns:
+            Dict keyed by URL with {"vehicles": [...], "offers": [...]} per
+            page, or {"error": ...} for a page that failed
+        """
+        return await singleflight_registry.get("web").do(
+            flight_key("dealership_pages"), self._scrape_pages
+        )
+    
+    async def _scrape_pages(self) -> Dict[str, Any]:
+        session = session_registry.get("web")
+        pages = await asyncio.gather(
+            *(self.scraper.scrape(session, url) for url in self.WEB_PAGES),
+            return_exceptions=True
+        )
+        
+        data = {}
+        for url, page in zip(self.WEB_PAGES, pages):
+            if isinstance(page, Exception):
+                self.logger.error(f"Web scraping error for {url}: {str(page)}")
+                data[url] = {"error": str(page)}
+            else:
+                data[url] = page
+        return data
@@ -0,0 +1,255 @@
+"""
+Similar in-stock vehicles by weighted feature-vector distance
+"""
+
+import math
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from inventory_db import InventoryDB
+from intent_matcher import BODY_STYLES
+from query_normalizer import BRAND_SYNONYMS
+
+# Brand tier of each make: 0 mainstream, 1 premium, 2 luxury
+BRAND_TIERS = {
+    "nissan": 0,
+    "volkswagen": 0,
+    "volvo": 1,
+    "audi": 1,
+    "mercedes": 2,
+    "porsche": 2
+}
+
+POWERTRAINS = ("gas", "hybrid", "plug_in", "electric")
+
+# Models that are electric-only, and trim/model words that mark a hybrid or plug-in
+ELECTRIC_MODELS = frozenset((
+    "e-tron", "q4 e-tron", "q8 e-tron", "taycan", "id.4", "id.buzz", "ariya", "leaf",
+    "eqb", "eqe", "eqs", "ex30", "ex90", "c40 recharge", "xc40 recharge"
+))
+PLUG_IN_WORDS = ("plug-in", "phev", "e-hybrid", "recharge", "t8", "tfsi e")
+HYBRID_WORDS = ("hybrid",)
+
+# Range used to scale price (log) and model year to 0..1
+PRICE_RANGE = (15000, 250000)
+YEAR_RANGE = (2000, 2030)
+
+BODY_NAMES = tuple(BODY_STYLES) + ("other",)
+
+# Features compared by distance (scaled to 0..1) and by category (equal or not),
+# with their weights. A segment is a brand tier and body style pair.
+NUMERIC_FEATURES = ("tier", "price", "year")
+CATEGORY_FEATURES = ("body_style", "segment", "powertrain")
+FEATURE_WEIGHTS = {
+    "tier": 1.5,
+    "price": 4.0,
+    "year": 1.0,
+    "body_style": 2.0,
+    "segment": 1.0,
+    "powertrain": 1.5
+}
+NUMERIC_WEIGHTS = np.array([FEATURE_WEIGHTS[name] for name in NUMERIC_FEATURES])
+CATEGORY_WEIGHTS = np.array([FEATURE_WEIGHTS[name] for name in CATEGORY_FEATURES])
+
+# Category code of an unknown value; it never equals a known one
+UNKNOWN = -1
+
+
+def powertrain(vehicle: Dict[str, Any]) -> str:
+    """Powertrain from the record, or inferred from the model and trim names"""
+    declared = (vehicle.get("powertrain") or vehicle.get("fuel_type") or "").lower().replace("-", "_")
+    if declared in POWERTRAINS:
+        return declared
+    if declared in ("ev", "electricity"):
+        return "electric"
+    model = (vehicle.get("model") or "").lower()
+    names = f"{model} {(vehicle.get('trim') or '').lower()}"
+    if model in ELECTRIC_MODELS:
+        return "electric"
+    if any(word in names for word in PLUG_IN_WORDS):
+        return "plug_in"
+    if any(word in names for word in HYBRID_WORDS):
+        return "hybrid"
+    return "gas"
+
+
+def _scale(value: float, low: float, high: float) -> float:
+    return min(max((value - low) / (high - low), 0.0), 1.0)
+
+
+def encode(vehicle: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Feature vector for a vehicle or partial description
+
+    Args:
+        vehicle: Record with any of make, model, trim, body_style, price,
+                 year and powertrain
+
+    Returns:
+        (numeric values, category codes, numeric weights, category weights);
+        features that are not known get a weight of 0
+    """
+    numeric = np.zeros(len(NUMERIC_FEATURES))
+    codes = np.full(len(CATEGORY_FEATURES), UNKNOWN, dtype=np.int16)
+
+    make = (vehicle.get("make") or "").lower()
+    tier = BRAND_TIERS.get(BRAND_SYNONYMS.get(make, make))
+    body = vehicle.get("body_style")
+    if body:
+        codes[0] = BODY_NAMES.index(body if body in BODY_STYLES else "other")
+    if tier is not None:
+        numeric[0] = tier / 2
+        if body:
+            codes[1] = tier * len(BODY_NAMES) + codes[0]
+    if vehicle.get("price"):
+        numeric[1] = _scale(math.log(float(vehicle["price"])), *map(math.log, PRICE_RANGE))
+    if vehicle.get("year"):
+        numeric[2] = _scale(float(vehicle["year"]), *YEAR_RANGE)
+    if vehicle.get("model") or vehicle.get("powertrain") or vehicle.get("fuel_type"):
+        codes[2] = POWERTRAINS.index(powertrain(vehicle))
+
+    known = np.array([tier is not None, bool(vehicle.get("price")), bool(vehicle.get("year"))])
+    return numeric, codes, NUMERIC_WEIGHTS * known, CATEGORY_WEIGHTS * (codes != UNKNOWN)
+
+
+class VehicleRecommender:
+    """
+    Finds the closest available vehicles to a reference vehicle.
+
+    Every inventory vehicle is encoded once into a slot of preallocated
+    arrays (numeric features, category codes) that grow by doubling; the
+    recommender listens to InventoryDB, so adding, re-pricing or selling a
+    unit rewrites one slot and freed slots are reused. Category features are
+    stored as small integer codes rather than one-hot columns, since the
+    squared distance between one-hot vectors only depends on whether the
+    codes are equal. A query therefore makes a few in-place passes over
+    six narrow columns, and a batch of references shares one top-k
+    selection over a references x vehicles distance matrix. Features
+    unknown for a reference (say, no price) get zero weight for that
+    reference.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.logger = logging.getLogger(__name__)
+        # One row per feature, so each feature's values are contiguous
+        self._numeric = np.zeros((len(NUMERIC_FEATURES), capacity), dtype=np.float32)
+        self._codes = np.full((len(CATEGORY_FEATURES), capacity), UNKNOWN, dtype=np.int16)
+        self._available = np.zeros(capacity, dtype=bool)
+        self._vehicles: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+
+    @classmethod
+    def for_inventory(cls, inventory: InventoryDB) -> "VehicleRecommender":
+        """Create a recommender that follows an inventory's changes"""
+        recommender = cls(capacity=max(1024, 2 * len(inventory.vehicles)))
+        inventory.add_listener(recommender)
+        return recommender
+
+    def add_vehicle(self, vehicle: Dict[str, Any]) -> None:
+        """Encode a vehicle into its row (a new row, or a freed one)"""
+        row = self._rows.get(vehicle["id"])
+        if row is None:
+            row = self._free.pop() if self._free else self._next_row()
+            self._rows[vehicle["id"]] = row
+        numeric, codes, _, _ = encode(vehicle)
+        self._numeric[:, row] = numeric
+        self._codes[:, row] = codes
+        self._available[row] = vehicle.get("status", "available") == "available"
+        self._vehicles[row] = vehicle
+
+    def remove_vehicle(self, vehicle: Dict[str, Any]) -> None:
+        """Free a vehicle's row"""
+        row = self._rows.pop(vehicle["id"], None)
+        if row is None:
+            return
+        self._available[row] = False
+        self._vehicles[row] = None
+        self._free.append(row)
+
+    def _next_row(self) -> int:
+        if self._size == len(self._available):
+            grow = len(self._available)
+            self._numeric = np.hstack([self._numeric, np.zeros((len(NUMERIC_FEATURES), grow), dtype=np.float32)])
+            self._codes = np.hstack([
+                self._codes, np.full((len(CATEGORY_FEATURES), grow), UNKNOWN, dtype=np.int16)
+            ])
+            self._available = np.concatenate([self._available, np.zeros(grow, dtype=bool)])
+            self._vehicles.extend([None] * grow)
+        self._size += 1
+        return self._size - 1
+
+    def similar_batch(
+        self,
+        references: List[Dict[str, Any]],
+        k: int = 5,
+        exclude: Optional[List[str]] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Top-k available vehicles for several references at once
+
+        Args:
+            references: Vehicle records or partial descriptions
+            k: Alternatives per reference
+            exclude: Vehicle IDs never returned
+
+        Returns:
+            For each reference, (vehicle, similarity from 0 to 1) pairs, best first
+        """
+        candidates = self._available[:self._size].copy()
+        for vehicle_id in exclude or ():
+            if vehicle_id in self._rows:
+                candidates[self._rows[vehicle_id]] = False
+        count = min(k, int(candidates.sum()))
+        if not references or count == 0:
+            return [[] for _ in references]
+
+        numeric, codes, numeric_weights, category_weights = (
+            np.stack(columns) for columns in zip(*(encode(reference) for reference in references))
+        )
+        numeric = numeric.astype(np.float32)
+        # references x vehicles: sum of w * (x - q)^2, plus w for every differing category
+        distances = np.zeros((len(references), self._size), dtype=np.float32)
+        gaps = np.empty(self._size, dtype=np.float32)
+        differs = np.empty(self._size, dtype=bool)
+        for i in range(len(references)):
+            # In place, so each feature costs a few passes over one column and no temporaries
+            for column in np.flatnonzero(numeric_weights[i]):
+                np.subtract(self._numeric[column, :self._size], numeric[i, column], out=gaps)
+                np.multiply(gaps, gaps, out=gaps)
+                np.multiply(gaps, np.float32(numeric_weights[i, column]), out=gaps)
+                np.add(distances[i], gaps, out=distances[i])
+            for column in np.flatnonzero(category_weights[i]):
+                np.not_equal(self._codes[column, :self._size], codes[i, column], out=differs)
+                np.multiply(differs, np.float32(category_weights[i, column]), out=gaps)
+                np.add(distances[i], gaps, out=distances[i])
+        distances[:, ~candidates] = np.inf
+
+        top = np.argpartition(distances, count - 1, axis=1)[:, :count]
+        totals = np.maximum(numeric_weights.sum(axis=1) + category_weights.sum(axis=1), 1e-9)
+        results = []
+        for i in range(len(references)):
+            rows = top[i][np.argsort(distances[i, top[i]], kind="stable")]
+            results.append([
+                (self._vehicles[row], round(1 - min(float(distances[i, row] / totals[i]), 1.0), 3))
+                for row in rows
+            ])
+        return results
+
+    def similar(
+        self,
+        reference: Dict[str, Any],
+        k: int = 5,
+        exclude: Optional[List[str]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k available vehicles closest to one reference"""
+        return self.similar_batch([reference], k, exclude)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get row counts"""
+        return {
+            "vehicles": len(self._rows),
+            "available": int(self._available[:self._size].sum()),
+            "capacity": len(self._available)
+        }
@@ -0,0 +1,176 @@
+"""
+Bounded LRU cache with TTL expiry and hit/miss metrics
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from config import (
+    KB_CACHE_MAX_ENTRIES,
+    KB_CACHE_MAX_BYTES,
+    KB_CACHE_TTL,
+    KB_CACHE_SWEEP_INTERVAL
+)
+
+# Approximate fixed cost of a cache entry beyond its key and value
+ENTRY_OVERHEAD = 96
+
+# Expired entries checked at the LRU end on every write
+SWEEP_BATCH = 4
+
+
+class _Entry:
+    """Cached value with its expiry time and approximate size"""
+
+    __slots__ = ("value", "expires_at", "size")
+
+    def __init__(self, value: Any, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache bounded by entry count and approximate byte size.
+
+    Lookups, inserts and evictions are O(1). Entries expire after a fixed TTL:
+    expired entries are dropped when looked up, a few are reclaimed from the
+    LRU end on every write, and a full sweep runs at most once per sweep
+    interval, so expiry cost is amortized over normal traffic.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = KB_CACHE_MAX_ENTRIES,
+        max_bytes: int = KB_CACHE_MAX_BYTES,
+        ttl: float = KB_CACHE_TTL,
+        sweep_interval: float = KB_CACHE_SWEEP_INTERVAL
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at <= now:
+                self._remove(key, entry)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def set(self, key: str, value: Any) -> None:
+        """Cache a value, evicting least recently used entries to stay within bounds"""
+        now = time.monotonic()
+        size = sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._remove(key, existing)
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = _Entry(value, now + self.ttl, size)
+            self._bytes += size
+
+            self._expire(now)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_entry = next(iter(self._entries.items()))
+                self._remove(old_key, old_entry)
+                self._evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove a key if present"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._remove(key, entry)
+
+    def clear(self) -> None:
+        """Remove every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """
+        Drop every expired entry
+
+        Returns:
+            Number of entries removed
+        """
+        now = time.monotonic()
+        with self._lock:
+            return self._sweep(now)
+
+    def _remove(self, key: str, entry: _Entry) -> None:
+        del self._entries[key]
+        self._bytes -= entry.size
+
+    def _expire(self, now: float) -> None:
+        """Reclaim expired entries incrementally (lock held)"""
+        if now >= self._next_sweep:
+            self._sweep(now)
+            return
+
+        for _ in range(SWEEP_BATCH):
+            if not self._entries:
+                break
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._remove(key, entry)
+            self._expirations += 1
+
+    def _sweep(self, now: float) -> int:
+        """Full expiry pass (lock held)"""
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key, self._entries[key])
+        self._expirations += len(expired)
+        self._next_sweep = now + self.sweep_interval
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
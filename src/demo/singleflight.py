@@ -0,0 +1,112 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Callable, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+def flight_key(*parts: Any) -> str:
+    """Build a coalescing key from request parts, ignoring case and extra whitespace"""
+    return "|".join(" ".join(str(part).lower().split()) for part in parts)
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call among concurrent callers with the same key.
+
+    The first caller for a key starts the upstream call as its own task and
+    later callers await the same task. Each caller waits through
+    asyncio.shield, so a caller that times out or is cancelled only stops
+    waiting while others still want the result; when the last waiter
+    leaves, the shared call is cancelled so its connection is released and
+    the cancellation reaches the upstream's circuit breaker. Results are
+    not cached: once the call finishes the next caller starts a new one.
+    """
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        # Callers still waiting on each shared call
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Coalescing key (see flight_key)
+            fn: Zero-argument coroutine function performing the call
+
+        Returns:
+            The shared call's result (exceptions are raised to every caller)
+        """
+        task = self._calls.get(key)
+        # Tasks from another event loop (e.g. a restarted loop in tests) can't be awaited here
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._started += 1
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+        else:
+            self._coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # Nobody wants the result any more
+                if not task.done():
+                    task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter already gave up
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.debug(f"Shared {self.name} call {key} failed: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get started/coalesced counters and calls currently in flight"""
+        calls = self._started + self._coalesced
+        return {
+            "started": self._started,
+            "coalesced": self._coalesced,
+            "coalesce_rate": self._coalesced / calls if calls else 0.0,
+            "in_flight": len(self._calls)
+        }
+
+
+class SingleFlightRegistry:
+    """Process-wide single-flight groups, one per upstream client"""
+
+    def __init__(self):
+        self._groups: Dict[str, SingleFlight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> SingleFlight:
+        """Get the group for a name, creating it on first use"""
+        with self._lock:
+            group = self._groups.get(name)
+            if group is None:
+                group = self._groups[name] = SingleFlight(name)
+            return group
+
+    def stats(self) -> Dict[str, Any]:
+        """Get stats for every group"""
+        with self._lock:
+            groups = dict(self._groups)
+        return {name: group.stats() for name, group in sorted(groups.items())}
+
+# Shared registry used by every client in the process
+singleflight_registry = SingleFlightRegistry()
@@ -0,0 +1,114 @@
+"""
+Versioned snapshot of crawled dealership site data
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+from config import SNAPSHOT_PATH
+
+
+class Snapshot:
+    """Immutable crawl result with its version and creation time"""
+
+    __slots__ = ("version", "created_at", "data")
+
+    def __init__(self, version: int, created_at: float, data: Dict[str, Any]):
+        self.version = version
+        self.created_at = created_at
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": self.version, "created_at": self.created_at, "data": self.data}
+
+
+class SnapshotStore:
+    """
+    Holds the latest crawl snapshot in memory and mirrors it to disk.
+
+    Readers get the current snapshot with a single attribute read; publishing
+    swaps in a new Snapshot object rather than mutating the old one, so a
+    reader never sees a half-written crawl. The on-disk copy is replaced
+    atomically and lets restarted or follower processes start from the last
+    crawl instead of an empty snapshot.
+    """
+
+    def __init__(self, path: Optional[str] = SNAPSHOT_PATH):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._latest = Snapshot(0, 0.0, {})
+        self._lock = threading.Lock()
+
+    def latest(self) -> Snapshot:
+        """Get the current snapshot (never None; version 0 means nothing crawled yet)"""
+        return self._latest
+
+    def publish(self, data: Dict[str, Any]) -> Snapshot:
+        """
+        Publish a new snapshot and persist it
+
+        Args:
+            data: Crawl results keyed by site
+
+        Returns:
+            The published snapshot
+        """
+        with self._lock:
+            snapshot = Snapshot(self._latest.version + 1, time.time(), data)
+            self._write(snapshot)
+            self._latest = snapshot
+        self.logger.info(f"Published site snapshot v{snapshot.version}")
+        return snapshot
+
+    def load(self) -> bool:
+        """
+        Load the on-disk snapshot if it is newer than the one in memory
+
+        Returns:
+            True if a newer snapshot was loaded
+        """
+        if not self.path:
+            return False
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error loading site snapshot: {str(e)}")
+            return False
+
+        with self._lock:
+            if stored.get("version", 0) <= self._latest.version:
+                return False
+            self._latest = Snapshot(stored["version"], stored.get("created_at", 0.0), stored.get("data", {}))
+        return True
+
+    def _write(self, snapshot: Snapshot) -> None:
+        """Atomically replace the on-disk snapshot"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot.to_dict(), f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"Error writing site snapshot: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the current version and its age"""
+        snapshot = self._latest
+        return {
+            "version": snapshot.version,
+            "age_seconds": round(time.time() - snapshot.created_at, 1) if snapshot.version else None,
+            "sites": sorted(snapshot.data)
+        }
+
+# Shared snapshot read by the chat hot path and written by the crawl scheduler
+snapshot_store = SnapshotStore()
@@ -0,0 +1,161 @@
+"""
+Persistent stale-while-revalidate cache for vehicle specs and safety ratings
+"""
+
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+from config import SPEC_CACHE_PATH, SPEC_CACHE_TTL, SPEC_CACHE_MAX_STALE
+from query_normalizer import BRAND_SYNONYMS
+
+# Entry freshness labels
+FRESH = "fresh"
+STALE = "stale"
+
+_KEY_PART = re.compile(r"[^a-z0-9]+")
+
+
+def spec_key(kind: str, make: Optional[str], model: Optional[str], year: Optional[Any] = None) -> str:
+    """
+    Build a normalized cache key for a vehicle
+
+    Args:
+        kind: Data kind ("specs" or "safety")
+        make: Vehicle make
+        model: Vehicle model
+        year: Model year, or None for any year
+
+    Returns:
+        Key such as "safety:mercedes:cclass:2024"
+    """
+    make = (make or "").lower()
+    make = BRAND_SYNONYMS.get(make, make)
+    parts = [_KEY_PART.sub("", part.lower()) for part in (make, model or "")]
+    return ":".join([kind] + parts + [str(year) if year else "any"])
+
+
+class SpecCache:
+    """
+    SQLite-backed cache for slowly changing vehicle reference data.
+
+    Entries are fresh for the TTL and may be served stale for up to the
+    max-stale age while a refresh runs in the background. The data lives in
+    a single SQLite file so it survives restarts and is shared by every
+    worker process on the host.
+    """
+
+    def __init__(
+        self,
+        path: str = SPEC_CACHE_PATH,
+        ttl: float = SPEC_CACHE_TTL,
+        max_stale: float = SPEC_CACHE_MAX_STALE
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL lets several worker processes read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spec_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, str]]:
+        """
+        Look up an entry
+
+        Args:
+            key: Key from spec_key()
+
+        Returns:
+            (value, FRESH or STALE), or None if missing or past the max-stale age
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fetched_at FROM spec_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+
+            age = time.time() - row[1]
+            if age > self.max_stale:
+                self._misses += 1
+                return None
+            if age > self.ttl:
+                self._stale_hits += 1
+                return json.loads(row[0]), STALE
+            self._hits += 1
+            return json.loads(row[0]), FRESH
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Servable (fresh or stale) value for a key without counting a lookup"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fetched_at FROM spec_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.max_stale:
+            return None
+        return json.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a servable (fresh or stale) entry exists, without counting a lookup"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM spec_cache WHERE key = ?", (key,)
+            ).fetchone()
+            return row is not None and time.time() - row[0] <= self.max_stale
+
+    def set(self, key: str, value: Any) -> None:
+        """Store an entry, stamping it as fetched now"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spec_cache (key, value, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+
+    def purge(self) -> int:
+        """
+        Delete entries past the max-stale age
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM spec_cache WHERE fetched_at < ?", (time.time() - self.max_stale,)
+            )
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spec_cache").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get entry count and fresh/stale/miss counters"""
+        entries = len(self)
+        with self._lock:
+            return {
+                "path": self.path,
+                "entries": entries,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses
+            }
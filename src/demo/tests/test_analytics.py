@@ -0,0 +1,213 @@
+"""
+Tests for the buffered analytics writer and the columnar analytics store
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.analytics_sink import AnalyticsSink, list_segments
+from src.demo.analytics_store import AnalyticsStore
+from src.demo.knowledge_base import KnowledgeBase
+
+def read_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+class TestAnalyticsSink(unittest.TestCase):
+    """Test batching, rotation, compression and overflow"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chatbot_analytics.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def wait_for(self, sink, written):
+        deadline = time.monotonic() + 5
+        while sink.stats()["written"] < written and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def test_close_writes_every_queued_event_in_batches(self):
+        sink = AnalyticsSink(self.path, batch_size=50, flush_interval=5)
+        for i in range(120):
+            self.assertTrue(sink.emit({"n": i}))
+        sink.close()
+
+        self.assertEqual([event["n"] for event in read_lines(self.path)], list(range(120)))
+        stats = sink.stats()
+        self.assertEqual((stats["written"], stats["dropped"]), (120, 0))
+        self.assertLessEqual(stats["batches"], 4)
+        self.assertFalse(sink.emit({"n": 120}))
+
+    def test_size_rotation_compresses_segments(self):
+        sink = AnalyticsSink(self.path, batch_size=1, flush_interval=0.01, max_bytes=200, compression="gzip")
+        for i in range(20):
+            sink.emit({"n": i, "padding": "x" * 40})
+        sink.close()
+
+        segments = list_segments(self.path)
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(segment.endswith(".gz") for segment in segments))
+        events = [event["n"] for segment in segments for event in read_lines(segment)] + \
+                 [event["n"] for event in read_lines(self.path)]
+        self.assertEqual(events, list(range(20)))
+        self.assertEqual(sink.stats()["rotations"], len(segments))
+
+    def test_daily_rotation_names_segment_by_its_day(self):
+        with open(self.path, "w") as f:
+            f.write(json.dumps({"n": 0}) + "\n")
+        yesterday = datetime.now() - timedelta(days=1)
+        os.utime(self.path, (yesterday.timestamp(), yesterday.timestamp()))
+
+        sink = AnalyticsSink(self.path, flush_interval=0.01, compression="none")
+        sink.emit({"n": 1})
+        sink.close()
+
+        self.assertEqual(list_segments(self.path), [f"{self.path}.{yesterday.strftime('%Y%m%d')}.1"])
+        self.assertEqual(read_lines(self.path), [{"n": 1}])
+
+    def test_reopens_log_rotated_by_another_process(self):
+        sink = AnalyticsSink(self.path, flush_interval=0.01, compression="none")
+        sink.emit({"n": 0})
+        self.wait_for(sink, 1)
+        os.rename(self.path, self.path + ".elsewhere")
+
+        sink.emit({"n": 1})
+        sink.close()
+
+        self.assertEqual(read_lines(self.path), [{"n": 1}])
+        self.assertEqual(sink.stats()["reopened"], 1)
+
+    def test_full_queue_drops_and_counts(self):
+        with patch.object(AnalyticsSink, "start"):
+            dropping = AnalyticsSink(self.path, queue_size=2)
+            blocking = AnalyticsSink(self.path, queue_size=2, overflow="block")
+            results = [dropping.emit({"n": i}) for i in range(5)]
+            for i in range(3):
+                blocking.emit({"n": i})
+
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual((dropping.stats()["dropped"], dropping.stats()["queued"]), (3, 2))
+        self.assertEqual((blocking.stats()["blocked"], blocking.stats()["dropped"]), (1, 1))
+
+    def test_async_emit_waits_off_the_event_loop(self):
+        """A blocking put from a coroutine leaves the event loop free"""
+        async def emit_while_ticking(sink):
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.001)
+
+            ticker = asyncio.create_task(tick())
+            queued = await sink.emit_async({"n": 1})
+            ticker.cancel()
+            return queued, ticks
+
+        with patch.object(AnalyticsSink, "start"):
+            sink = AnalyticsSink(self.path, queue_size=1, overflow="block")
+            sink.emit({"n": 0})
+            queued, ticks = asyncio.run(emit_while_ticking(sink))
+
+        self.assertFalse(queued)
+        self.assertGreater(ticks, 5)
+        self.assertEqual((sink.stats()["blocked"], sink.stats()["dropped"]), (1, 1))
+
+class TestAnalyticsStore(unittest.TestCase):
+    """Test compaction into day partitions and column queries"""
+
+    MESSAGES = ["How much is the Rogue?", "Any lease deals on the Audi Q5?", "What are your hours?"]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.matcher = KnowledgeBase().intent_matcher
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = os.path.join(self.directory, "chatbot_analytics.log")
+        self.store = AnalyticsStore(os.path.join(self.directory, "store"), self.log, self.matcher)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_log(self, count, start=datetime(2026, 10, 16, 23, 0)):
+        """Log count events a minute apart through a sink that rotates every few events"""
+        sink = AnalyticsSink(self.log, batch_size=1, flush_interval=0.01, max_bytes=1000)
+        for i in range(count):
+            sink.emit({
+                "timestamp": (start + timedelta(minutes=i)).isoformat(),
+                "user_message": self.MESSAGES[i % 3],
+                "assistant_response": f"Answer {i}",
+                "metadata": {"conversation_id": f"conv_{i // 4}", "user_agent": "test",
+                             "usage": {"input_tokens": 100, "output_tokens": 10 * (i % 3)}}
+            })
+        sink.close()
+
+    def test_compaction_is_incremental_and_idempotent(self):
+        self.write_log(90)
+        first = self.store.compact()
+        self.write_log(30, start=datetime(2026, 10, 17, 2, 0))
+        second = self.store.compact()
+
+        closed_rows = sum(len(read_lines(segment)) for segment in list_segments(self.log))
+        self.assertEqual(first["skipped"], 0)
+        self.assertEqual(second["skipped"], first["segments"])
+        self.assertEqual(first["rows"] + second["rows"], closed_rows)
+
+        # Losing the manifest re-compacts every segment into the same parts, without duplicates
+        os.remove(os.path.join(self.store.root, "_manifest.json"))
+        self.assertEqual(self.store.compact()["rows"], closed_rows)
+        self.assertEqual(self.store.stats()["rows"], closed_rows)
+        self.assertEqual(len(self.store.read(["timestamp"])["timestamp"]), closed_rows)
+
+    def test_queries_by_day_and_category(self):
+        self.write_log(120)
+        self.store.compact()
+        rows = len(self.store.read(["timestamp"])["timestamp"])
+
+        # Events logged across midnight land in both day partitions
+        self.assertEqual(self.store.days(), ["2026-10-16", "2026-10-17"])
+        self.assertEqual(len(self.store.read(["timestamp"], end=datetime(2026, 10, 16).date())["timestamp"]), 60)
+        brands = self.store.count_by("brand")
+        self.assertEqual(set(brands), {"nissan", "audi"})
+        self.assertEqual(sum(self.store.count_by("intent").values()), rows)
+        usage = self.store.token_usage(by="brand")
+        self.assertEqual(usage["audi"]["output_tokens"], 10 * brands["audi"])
+        self.assertEqual(self.store.token_usage()["all"]["input_tokens"], 100 * rows)
+        daily = self.store.daily()
+        self.assertEqual(daily["2026-10-16"], {"messages": 60, "conversations": 15})
+
+    def test_reads_only_requested_columns(self):
+        self.write_log(40)
+        self.store.compact()
+        for root, _, files in os.walk(self.store.root):
+            for name in files:
+                if name.startswith("assistant_response"):
+                    os.remove(os.path.join(root, name))
+
+        columns = self.store.read(["conversation_id", "user_message"])
+
+        self.assertEqual(columns["conversation_id"][0], "conv_0")
+        self.assertEqual(columns["user_message"][0], self.MESSAGES[0])
+        with self.assertRaises(ValueError):
+            self.store.read(["nonexistent"])
+
+if __name__ == '__main__':
+    unittest.main()
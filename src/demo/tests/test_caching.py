@@ -0,0 +1,183 @@
+"""
+Tests for the knowledge base response cache and query normalization
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.response_cache import ResponseCache
+from src.demo.query_normalizer import QueryNormalizer, SimilarityIndex
+from src.demo.knowledge_base import KnowledgeBase
+from src.demo.spec_cache import SpecCache, spec_key, FRESH, STALE
+from src.demo.api_gateway import APIGateway
+from src.demo.inventory_db import InventoryDB
+
+class TestResponseCache(unittest.TestCase):
+    """Test bounds, expiry and metrics of the response cache"""
+
+    def test_lru_eviction_by_entry_count(self):
+        """The least recently used entry is evicted first"""
+        cache = ResponseCache(max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_byte_ceiling(self):
+        """Total size stays under the byte ceiling"""
+        cache = ResponseCache(max_bytes=2048)
+        for i in range(50):
+            cache.set(f"question {i}", "x" * 200)
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 2048)
+        self.assertLess(stats["entries"], 50)
+
+    def test_entries_expire_without_being_requeried(self):
+        """Expired entries are reclaimed by writes even if never looked up again"""
+        cache = ResponseCache(ttl=10, sweep_interval=1000)
+        with patch('time.monotonic', return_value=100.0):
+            cache.set("stale", "old answer")
+        with patch('time.monotonic', return_value=200.0):
+            cache.set("fresh", "new answer")
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_hit_miss_counters(self):
+        """Hits and misses are counted"""
+        cache = ResponseCache()
+        cache.set("hours", "9-7")
+        cache.get("hours")
+        cache.get("location")
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+class TestQueryNormalization(unittest.TestCase):
+    """Test canonical cache keys and near-duplicate matching"""
+
+    def setUp(self):
+        self.normalizer = QueryNormalizer()
+
+    def test_shorthand_and_punctuation_share_a_key(self):
+        """Chat shorthand and punctuation don't change the normalized key"""
+        first = self.normalizer.normalize("What are your hours?")
+        second = self.normalizer.normalize("what r ur hours")
+
+        self.assertNotEqual(first.exact, second.exact)
+        self.assertEqual(first.normalized_key, second.normalized_key)
+
+    def test_brand_synonyms(self):
+        """Brand nicknames resolve to the knowledge base brand key"""
+        for message in ["merc service hours", "Mercedes-Benz service hours", "benz service hours"]:
+            query = self.normalizer.normalize(message)
+            self.assertEqual(query.brand, "mercedes")
+            self.assertEqual(query.intent_key, "intent:hours:mercedes")
+
+    def test_similarity_index(self):
+        """Near-duplicate questions match and unrelated ones don't"""
+        index = SimilarityIndex()
+        index.add("doc", "service special oil change")
+
+        self.assertEqual(index.search("service specials oil change", 0.8)[0], "doc")
+        self.assertIsNone(index.search("porsche cayenne lease", 0.8))
+
+    def test_hit_rate_per_tier(self):
+        """Knowledge base lookups report which tier served them"""
+        knowledge = KnowledgeBase()
+        knowledge.cache_response("What are your hours?", "Sales: 9-7")
+
+        self.assertEqual(knowledge.get_cached_response("What are your hours?"), "Sales: 9-7")
+        self.assertEqual(knowledge.get_cached_response("what r ur hours"), "Sales: 9-7")
+        self.assertIsNone(knowledge.get_cached_response("Do you have a Q5?"))
+
+        tiers = knowledge.cache_stats()["tiers"]
+        self.assertEqual(tiers["exact"]["hits"], 1)
+        self.assertEqual(tiers["normalized"]["hits"], 1)
+        self.assertAlmostEqual(knowledge.cache_stats()["query_hit_rate"], 2 / 3)
+
+    def test_vehicle_questions_skip_the_broad_tiers(self):
+        """Only pure dealership questions are cached under the intent key and in the similarity index"""
+        knowledge = KnowledgeBase()
+        mixed = knowledge.normalize("What are your hours, and is the Rogue under $30k?")
+        knowledge.cache_response(mixed, "Sales: 9-7")
+
+        self.assertIsNone(mixed.intent_key)
+        self.assertEqual(len(knowledge.similarity_index), 0)
+        self.assertEqual(knowledge.get_cached_response(mixed), "Sales: 9-7")
+        self.assertIsNone(knowledge.get_cached_response("When do you close?"))
+
+        knowledge.cache_response("What are your hours?", "Sales: 9-7")
+        self.assertEqual(len(knowledge.similarity_index), 1)
+        self.assertEqual(knowledge.get_cached_response("When do you close?"), "Sales: 9-7")
+
+class TestSpecCache(unittest.IsolatedAsyncioTestCase):
+    """Test the persistent stale-while-revalidate spec cache"""
+
+    def setUp(self):
+        self.gateway = APIGateway(spec_cache=SpecCache(":memory:", ttl=60, max_stale=3600))
+        self.gateway._fetch_car_specs = AsyncMock(return_value={"hp": 300})
+        self.query = {"make": "mercedes", "model": "C-Class", "year": 2024}
+
+    def test_keys_are_normalized(self):
+        self.assertEqual(
+            spec_key("specs", "Mercedes-Benz", "C-Class", 2024),
+            spec_key("specs", "mercedes", "c class", 2024)
+        )
+
+    def test_entries_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "specs.sqlite3")
+            cache = SpecCache(path)
+            cache.set("specs:audi:q5:2024", {"hp": 261})
+            cache.close()
+
+            reopened = SpecCache(path)
+            self.assertEqual(reopened.get("specs:audi:q5:2024"), ({"hp": 261}, FRESH))
+            reopened.close()
+
+    async def test_fresh_entries_skip_the_network(self):
+        await self.gateway.get_car_specs(None, self.query)
+        await self.gateway.get_car_specs(None, self.query)
+
+        self.gateway._fetch_car_specs.assert_awaited_once()
+
+    async def test_stale_entries_are_served_while_refreshing(self):
+        self.gateway.spec_cache.set(spec_key("specs", "mercedes", "C-Class", 2024), {"hp": 250})
+
+        with patch("time.time", return_value=time.time() + 120):
+            value = await self.gateway.get_car_specs(None, self.query)
+            self.assertEqual(value, {"hp": 250})
+            await asyncio.gather(*self.gateway._refreshing.values())
+
+        self.assertEqual(self.gateway.spec_cache.get(spec_key("specs", "mercedes", "C-Class", 2024)), ({"hp": 300}, FRESH))
+
+    @patch('src.demo.api_gateway.session_registry')
+    async def test_prewarm_fills_every_inventory_vehicle(self, mock_registry):
+        self.gateway._fetch_safety_ratings = AsyncMock(return_value={"Results": [{"OverallRating": "5"}]})
+        vehicles = InventoryDB().get_inventory()
+
+        result = await self.gateway.prewarm_specs(vehicles)
+
+        self.assertEqual(result["failed"], 0)
+        self.assertEqual(len(self.gateway.spec_cache), 2 * result["vehicles"])
+        for car in vehicles:
+            self.assertIn(spec_key("safety", car["make"], car["model"], car["year"]), self.gateway.spec_cache)
+
+if __name__ == "__main__":
+    unittest.main()
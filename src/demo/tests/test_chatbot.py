@@ -5,18 +5,33 @@ Test script for the Jack Ingram Motors Chatbot Demo with corrected imports
 import os
 import sys
 import json
+import aiohttp
 import unittest
-import requests
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
-# Add the parent directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Now import the modules
 from src.demo.claude_client import ClaudeClient
 from src.demo.config import ANTHROPIC_API_KEY, ANTHROPIC_API_URL
 
-class TestClaudeClient(unittest.TestCase):
+def mock_session(status=200, body=None, error=None):
+    """Build a mock pooled aiohttp session whose post() yields the given response"""
+    response = MagicMock()
+    response.status = status
+    response.json = AsyncMock(return_value=body or {})
+    
+    post_context = MagicMock()
+    post_context.__aenter__ = AsyncMock(return_value=response, side_effect=error)
+    post_context.__aexit__ = AsyncMock(return_value=False)
+    
+    session = MagicMock()
+    session.post.return_value = post_context
+    return session
+
+class TestClaudeClient(unittest.IsolatedAsyncioTestCase):
     """Test the Claude API client functionality"""
     
     def setUp(self):
@@ -24,48 +39,81 @@ class TestClaudeClient(unittest.TestCase):
         self.client = ClaudeClient()
         self.test_message = "Test message"
     
-    @patch('requests.post')
-    def test_send_message_success(self, mock_post):
+    @patch('src.demo.claude_client.session_registry')
+    async def test_send_message_success(self, mock_registry):
         """Test successful message sending"""
         # Mock successful response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        session = mock_session(body={
             "id": "test_id",
             "model": "claude-3-opus-20240229",
-            "content": [{"text": "Test response"}],
+            "content": [{"type": "text", "text": "Test response"}],
             "usage": {"input_tokens": 10, "output_tokens": 5}
-        }
-        mock_post.return_value = mock_response
+        })
+        mock_registry.get.return_value = session
         
         # Call the method
-        response = self.client.send_message(self.test_message)
+        response = await self.client.send_message(self.test_message)
         
         # Assertions
         self.assertEqual(response["response"], "Test response")
         self.assertEqual(response["model"], "claude-3-opus-20240229")
+        self.assertEqual(response["usage"], {"input_tokens": 10, "output_tokens": 5})
         self.assertEqual(len(self.client.conversation_history), 2)  # User + assistant messages
         
         # Verify API call
-        mock_post.assert_called_once()
-        call_args = mock_post.call_args
+        session.post.assert_called_once()
+        call_args = session.post.call_args
         self.assertEqual(call_args[0][0], ANTHROPIC_API_URL)
         self.assertIn("x-api-key", call_args[1]["headers"])
         self.assertEqual(call_args[1]["headers"]["x-api-key"], ANTHROPIC_API_KEY)
     
-    @patch('requests.post')
-    def test_send_message_error(self, mock_post):
+    @patch('src.demo.claude_client.session_registry')
+    async def test_prompt_caching(self, mock_registry):
+        """Test the static prompt is marked cacheable and cache usage is counted"""
+        session = mock_session(body={
+            "content": [{"type": "text", "text": "Test response"}],
+            "usage": {"input_tokens": 20, "cache_read_input_tokens": 900, "output_tokens": 5}
+        })
+        mock_registry.get.return_value = session
+        
+        await self.client.send_message(self.test_message)
+        
+        system = session.post.call_args[1]["json"]["system"]
+        self.assertEqual(system[0]["cache_control"], {"type": "ephemeral"})
+        self.assertNotIn("cache_control", system[1])
+        self.assertIn("Today's date is", system[1]["text"])
+        
+        stats = self.client.cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["cache_read_input_tokens"], 900)
+        self.assertEqual(stats["hit_rate"], 1.0)
+    
+    @patch('src.demo.claude_client.session_registry')
+    async def test_send_message_error(self, mock_registry):
         """Test error handling in message sending"""
-        # Mock error response
-        mock_post.side_effect = requests.exceptions.RequestException("Test error")
+        # Mock connection error
+        mock_registry.get.return_value = mock_session(error=aiohttp.ClientError("Test error"))
         
         # Call the method
-        response = self.client.send_message(self.test_message)
+        response = await self.client.send_message(self.test_message)
         
         # Assertions
-        self.assertIn("I'm sorry", response["response"])
+        self.assertIn("trouble connecting", response["response"])
         self.assertIn("error", response)
-        self.assertEqual(len(self.client.conversation_history), 1)  # Only user message
+        self.assertEqual(len(self.client.conversation_history), 0)  # Failed turns are not stored
+    
+    @patch('src.demo.claude_client.session_registry')
+    async def test_send_message_http_error(self, mock_registry):
+        """Test API error responses are surfaced with their status code"""
+        mock_registry.get.return_value = mock_session(
+            status=529,
+            body={"error": {"type": "overloaded_error", "message": "Overloaded"}}
+        )
+        
+        response = await self.client.send_message(self.test_message)
+        
+        self.assertEqual(response["status_code"], 529)
+        self.assertEqual(response["error"], "Overloaded")
     
     def test_reset_conversation(self):
         """Test conversation reset"""
@@ -81,7 +129,35 @@ class TestClaudeClient(unittest.TestCase):
         # Assert history is empty
         self.assertEqual(len(self.client.conversation_history), 0)
 
-class TestSecurityFeatures(unittest.TestCase):
+    @patch('src.demo.claude_client.session_registry')
+    async def test_stream_message(self, mock_registry):
+        """Test streamed deltas are yielded and history is finalized at the end"""
+        events = [
+            {"type": "message_start", "message": {"id": "msg_1", "model": "claude-3-sonnet-20240229", "usage": {"input_tokens": 12}}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hello"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": " there"}},
+            {"type": "message_delta", "usage": {"output_tokens": 2}},
+            {"type": "message_stop"}
+        ]
+        lines = []
+        for event in events:
+            lines += [f"event: {event['type']}\n".encode(), f"data: {json.dumps(event)}\n".encode(), b"\n"]
+        
+        session = mock_session()
+        response = session.post.return_value.__aenter__.return_value
+        response.content.__aiter__.return_value = lines
+        mock_registry.get.return_value = session
+        
+        received = [event async for event in self.client.stream_message(self.test_message)]
+        
+        self.assertEqual([e["text"] for e in received if e["type"] == "delta"], ["Hello", " there"])
+        self.assertEqual(received[-1]["type"], "done")
+        self.assertEqual(received[-1]["response"], "Hello there")
+        self.assertEqual(received[-1]["usage"], {"input_tokens": 12, "output_tokens": 2})
+        self.assertTrue(session.post.call_args[1]["json"]["stream"])
+        self.assertEqual(self.client.conversation_history[-1]["content"], "Hello there")
+
+class TestSecurityFeatures(unittest.IsolatedAsyncioTestCase):
     """Test security features of the chatbot demo"""
     
     def test_api_key_handling(self):
@@ -101,7 +177,7 @@ class TestSecurityFeatures(unittest.TestCase):
         
         self.assertEqual(api_key_count, 0, "API key should not be exposed in client attributes")
     
-    def test_input_validation(self):
+    async def test_input_validation(self):
         """Test input validation for security"""
         client = ClaudeClient()
         
@@ -117,15 +193,12 @@ class TestSecurityFeatures(unittest.TestCase):
             # No exceptions should be raised
             try:
                 # We're not actually sending to API, just checking handling
-                with patch('requests.post') as mock_post:
-                    mock_response = MagicMock()
-                    mock_response.status_code = 200
-                    mock_response.json.return_value = {
-                        "content": [{"text": "Response"}]
-                    }
-                    mock_post.return_value = mock_response
+                with patch('src.demo.claude_client.session_registry') as mock_registry:
+                    mock_registry.get.return_value = mock_session(body={
+                        "content": [{"type": "text", "text": "Response"}]
+                    })
                     
-                    client.send_message(test_input)
+                    await client.send_message(test_input)
                     # If we get here, no exception was raised
                     self.assertTrue(True)
             except Exception as e:
@@ -0,0 +1,146 @@
+"""
+Tests for the vectorized vehicle comparison engine
+"""
+
+import os
+import sys
+import unittest
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.inventory_db import InventoryDB
+from src.demo.spec_cache import SpecCache, spec_key
+from src.demo.comparison_engine import ComparisonEngine, spec_row, format_comparison
+from src.demo.recommender import VehicleRecommender, encode, powertrain
+from src.demo.api_router import APIRouter
+
+class TestComparisonEngine(unittest.TestCase):
+    """Test rankings, winners and class leaders"""
+
+    def setUp(self):
+        self.db = InventoryDB()
+        self.engine = ComparisonEngine(self.db)
+
+    def test_n_way_ranks_and_differences(self):
+        comparison = self.engine.compare(["N2", "A1", "M1"])
+
+        self.assertEqual(comparison["vehicles"][0], "2024 Nissan Rogue SV")
+        price = comparison["attributes"]["price"]
+        self.assertEqual(price["rank"], [1, 2, 3])
+        self.assertEqual(price["diff_from_best"], [0, 19810, 37810])
+        self.assertEqual(comparison["attributes"]["horsepower"]["rank"], [3, 2, 1])
+        # Ties share the best rank and every tied vehicle wins
+        self.assertEqual(comparison["attributes"]["seating"]["rank"], [1, 1, 1])
+        self.assertEqual(len(comparison["winners"]["seating"]), 3)
+        # Unknown values are left unranked rather than counted as worst
+        self.assertEqual(comparison["attributes"]["safety_stars"]["rank"], [1, None, None])
+        self.assertNotIn("range_miles", comparison["attributes"])
+
+    def test_spec_cache_fills_missing_attributes(self):
+        cache = SpecCache(":memory:")
+        cache.set(spec_key("safety", "Audi", "Q5", 2024), {"Results": [{"OverallRating": "5"}]})
+        cache.set(spec_key("specs", "Audi", "Q5", 2024), {"mpg_city": 23, "mpg_highway": 28, "horsepower": 999})
+        engine = ComparisonEngine(self.db, cache)
+
+        comparison = engine.compare(["A1", "M1"])
+
+        # Inventory values win over cached documents; gaps are filled from the cache
+        self.assertEqual(comparison["attributes"]["horsepower"]["values"], [261, 375])
+        self.assertEqual(comparison["attributes"]["safety_stars"]["values"], [5, None])
+        self.assertEqual(cache.stats()["misses"], 0)
+
+    def test_class_leaders_follow_inventory_changes(self):
+        self.assertEqual(self.engine.class_leaders("suv")["price"]["vehicle"], "2024 Nissan Rogue SV")
+
+        self.db.mark_sold("N2")
+        self.db.add_vehicle({"id": "V1", "make": "Volkswagen", "model": "Tiguan", "year": 2024, "price": 28995,
+                             "body_style": "suv", "status": "available", "horsepower": 184})
+
+        leaders = self.engine.class_leaders("suv")
+        self.assertEqual(leaders["price"], {"vehicle": "2024 Volkswagen Tiguan", "value": 28995})
+        self.assertEqual(leaders["horsepower"]["vehicle"], "2024 Mercedes-Benz GLE 450 4MATIC")
+
+    def test_mpg_from_city_and_highway(self):
+        self.assertEqual(spec_row({"mpg_city": 30, "mpg_highway": 37})[1], 33.5)
+
+    def test_router_adds_comparison_for_two_models(self):
+        router = APIRouter()
+        intent = router.knowledge.intent_matcher.match("Rogue vs Altma, which is better?")
+
+        comparison = router.compare_vehicles(intent)
+
+        self.assertEqual(intent.intent, "compare")
+        self.assertEqual(comparison["vehicles"], ["2024 Nissan Rogue SV", "2024 Nissan Altima SR"])
+        self.assertIn("price ($) | 29990 | 26890*", format_comparison(comparison))
+        self.assertIsNone(router.compare_vehicles(router.knowledge.intent_matcher.match("Tell me about the Rogue")))
+
+class TestVehicleRecommender(unittest.TestCase):
+    """Test nearest in-stock alternatives"""
+
+    def setUp(self):
+        self.db = InventoryDB()
+        self.recommender = VehicleRecommender.for_inventory(self.db)
+
+    def test_sold_out_rogue_suggests_closest_suv(self):
+        self.db.mark_sold("N2")
+
+        alternatives = self.recommender.similar(self.db.vehicles["N2"], k=2)
+
+        # Another mainstream SUV near the price beats a cheaper sedan and premium SUVs
+        self.db.add_vehicle({"id": "V1", "make": "Volkswagen", "model": "Tiguan", "year": 2024, "price": 28995,
+                             "body_style": "suv", "status": "available"})
+        self.assertEqual([car["id"] for car, _ in alternatives], ["A1", "M1"])
+        self.assertEqual(self.recommender.similar(self.db.vehicles["N2"], k=1)[0][0]["id"], "V1")
+
+    def test_matrix_follows_inventory_changes(self):
+        self.db.update_vehicle("A1", status="pending")
+        ids = [car["id"] for car, _ in self.recommender.similar({"make": "Audi", "body_style": "suv"}, k=5)]
+        self.assertNotIn("A1", ids)
+
+        self.db.remove_vehicle("M1")
+        for i in range(2000):
+            self.db.add_vehicle({"id": f"X{i}", "make": "Porsche", "model": "Macan", "year": 2023,
+                                 "price": 65000 + i, "body_style": "suv", "status": "available"})
+
+        stats = self.recommender.stats()
+        self.assertEqual(stats["vehicles"], 2003)
+        self.assertEqual(stats["available"], 2002)
+        self.assertGreaterEqual(stats["capacity"], 2003)
+        best, similarity = self.recommender.similar({"make": "Porsche", "model": "Macan", "price": 65000})[0]
+        self.assertEqual(best["id"], "X0")
+        self.assertEqual(similarity, 1.0)
+
+    def test_batch_matches_single_queries(self):
+        references = [self.db.vehicles["N1"], {"make": "Mercedes-Benz", "price": 70000}]
+
+        batch = self.recommender.similar_batch(references, k=2, exclude=["N1"])
+
+        for reference, result in zip(references, batch):
+            self.assertEqual(result, self.recommender.similar(reference, k=2, exclude=["N1"]))
+        self.assertNotIn("N1", [car["id"] for car, _ in batch[0]])
+        self.assertEqual(batch[1][0][0]["id"], "M1")
+
+    def test_unknown_features_are_ignored(self):
+        _, _, numeric_weights, category_weights = encode({"make": "Volvo"})
+        self.assertEqual(list(numeric_weights > 0), [True, False, False])
+        self.assertFalse(category_weights.any())
+        self.assertEqual(powertrain({"model": "Cayenne", "trim": "E-Hybrid"}), "plug_in")
+        self.assertEqual(powertrain({"model": "Taycan"}), "electric")
+        self.assertEqual(powertrain({"model": "Q5", "fuel_type": "Hybrid"}), "hybrid")
+
+    def test_router_offers_alternatives_for_out_of_stock_model(self):
+        router = APIRouter()
+        router.inventory.mark_sold("N2")
+
+        alternatives = router.find_alternatives({"make": "nissan", "model": "Rogue"})
+        answer = router.format_inventory_count(router.knowledge.intent_matcher.match("How many Rogues do you have?"))
+
+        self.assertEqual(alternatives[0]["id"], "A1")
+        self.assertIn("similarity", alternatives[0])
+        self.assertIn("Similar vehicles in stock: 2024 Audi Q5", answer)
+        self.assertIsNone(router.find_alternatives({"make": "nissan", "model": "Altima"}))
+
+if __name__ == '__main__':
+    unittest.main()
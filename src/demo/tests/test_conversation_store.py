@@ -0,0 +1,107 @@
+"""
+Tests for the per-conversation history store
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.conversation_store import ConversationStore
+from src.demo.context_window import ContextWindow
+
+class TestConversationStore(unittest.TestCase):
+    """Test isolation and eviction in the conversation store"""
+
+    def test_conversations_are_isolated(self):
+        """Each conversation ID keeps its own history"""
+        store = ConversationStore(shards=4)
+        store.append_turn("conv_a", "Hi from A", "Hello A")
+        store.append_turn("conv_b", "Hi from B", "Hello B")
+
+        self.assertEqual(store.get_history("conv_a"), [
+            {"role": "user", "content": "Hi from A"},
+            {"role": "assistant", "content": "Hello A"}
+        ])
+
+        store.reset("conv_b")
+        self.assertEqual(store.get_history("conv_b"), [])
+        self.assertEqual(len(store.get_history("conv_a")), 2)
+
+    def test_memory_ceiling_evicts_least_recently_used(self):
+        """Conversations are evicted in LRU order once the ceiling is hit"""
+        store = ConversationStore(shards=1, max_bytes=4096)
+        for i in range(10):
+            store.append_turn(f"conv_{i}", "x" * 200, "y" * 200)
+
+        stats = store.stats()
+        self.assertLessEqual(stats["bytes"], 4096)
+        self.assertGreater(stats["evictions"], 0)
+        self.assertIn("conv_9", store)
+        self.assertNotIn("conv_0", store)
+
+    def test_idle_conversations_expire(self):
+        """Conversations idle past the TTL are dropped"""
+        store = ConversationStore(shards=1, idle_ttl=60)
+        with patch('time.monotonic', return_value=1000.0):
+            store.append("conv_a", "user", "Hello")
+        with patch('time.monotonic', return_value=1100.0):
+            self.assertEqual(store.get_history("conv_a"), [])
+        self.assertEqual(store.stats()["expirations"], 1)
+
+    def test_message_cap_trims_oldest(self):
+        """Only the most recent messages are kept per conversation"""
+        store = ConversationStore(shards=1, max_messages=4)
+        for i in range(5):
+            store.append_turn("conv_a", f"q{i}", f"a{i}")
+
+        history = store.get_history("conv_a")
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history[0]["content"], "q3")
+
+class TestContextWindow(unittest.IsolatedAsyncioTestCase):
+    """Test token-budgeted windowing and summary compaction"""
+
+    def setUp(self):
+        self.store = ConversationStore(shards=1)
+        self.summaries = []
+
+        async def summarizer(summary, messages):
+            self.summaries.append(len(messages))
+            return f"{summary}|{len(messages)} folded"
+
+        self.window = ContextWindow(self.store, summarizer, budget=200, compact_target=0.5)
+
+    async def test_short_history_is_sent_verbatim(self):
+        """No summary is built while the history fits the budget"""
+        self.store.append_turn("conv_a", "Do you have a Q5?", "Yes, we have one in Mythos Black.")
+
+        window = await self.window.build("conv_a")
+
+        self.assertEqual(window["summary"], "")
+        self.assertEqual(len(window["messages"]), 2)
+        self.assertEqual(self.summaries, [])
+
+    async def test_overflow_folds_oldest_turns_into_summary(self):
+        """Older turns are summarized once and the window starts on a user turn"""
+        for i in range(8):
+            self.store.append_turn("conv_a", f"question {i} " + "x" * 80, f"answer {i} " + "y" * 80)
+
+        window = await self.window.build("conv_a")
+
+        self.assertEqual(len(self.summaries), 1)
+        self.assertTrue(window["summary"].endswith("folded"))
+        self.assertEqual(window["messages"][0]["role"], "user")
+        self.assertTrue(window["messages"][-1]["content"].startswith("answer 7"))
+
+        # The stored summary is reused while the shrunken window still fits
+        self.store.append("conv_a", "user", "one more question")
+        await self.window.build("conv_a")
+        self.assertEqual(len(self.summaries), 1)
+
+if __name__ == "__main__":
+    unittest.main()
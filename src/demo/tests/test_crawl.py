@@ -0,0 +1,197 @@
+"""
+Tests for background site crawling and the snapshot store
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.firecrawl_client import FireCrawlClient
+from src.demo.snapshot_store import SnapshotStore
+from src.demo.crawl_scheduler import CrawlScheduler
+from src.demo.claude_client import ClaudeClient
+from src.demo.web_scraper import IncrementalScraper, extract_records
+
+INVENTORY_PAGE = b"""<html><body><div class="listing">
+<div class="vehicle-card" data-vin="WA1ABC123">
+  <h3 class="vehicle-title"><a href="/new/audi-q5">2025 Audi Q5 Premium</a></h3>
+  <span class="final-price">$48,995</span><br><img src="q5.jpg">
+  <p class="mileage">12 mi
+</div>
+<div class="offer-card"><h4 class="offer-title">0.9% APR on Q3</h4>
+<span class="expiration-date">10/31/2026</span></div>
+</div></body></html>"""
+
+class FakeResponse:
+    """Minimal aiohttp response that streams a fixed body"""
+
+    def __init__(self, status, body=b"", headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.charset = "utf-8"
+        self.content = Mock()
+        self.content.iter_chunked = lambda size: self._chunks(body, size)
+
+    async def _chunks(self, body, size):
+        for start in range(0, len(body), size):
+            yield body[start:start + size]
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    """Returns queued responses and records the request headers"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, headers=None):
+        self.headers.append(headers or {})
+        return self.responses.pop(0)
+
+class TestCrawlScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test concurrent crawling and snapshot publishing"""
+
+    @patch('src.demo.firecrawl_client.session_registry')
+    async def test_pages_crawl_concurrently_within_limit(self, mock_registry):
+        crawler = FireCrawlClient()
+        in_flight = 0
+        peak = 0
+
+        async def crawl_page(session, url, selectors):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"url": url}
+
+        crawler._crawl_page = crawl_page
+        results = await crawler.crawl_dealership_sites(concurrency=3)
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(set(results), set(FireCrawlClient.SITES))
+        self.assertEqual(results["audi"]["offers"], {"url": "https://www.jackingramaudi.com/specials"})
+
+    async def test_failed_sites_keep_previous_data(self):
+        store = SnapshotStore(path=None)
+        store.publish({"audi": {"offers": {"old": True}}, "volvo": {"offers": {"old": True}}})
+        crawler = FireCrawlClient()
+        crawler.crawl_dealership_sites = AsyncMock(return_value={"audi": {"offers": {"new": True}}})
+
+        await CrawlScheduler(store, crawler).crawl_once()
+
+        snapshot = store.latest()
+        self.assertEqual(snapshot.version, 2)
+        self.assertEqual(snapshot.data["audi"]["offers"], {"new": True})
+        self.assertEqual(snapshot.data["volvo"]["offers"], {"old": True})
+
+    def test_snapshot_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.json")
+            SnapshotStore(path).publish({"main": {"offers": {"count": 3}}})
+
+            restarted = SnapshotStore(path)
+            self.assertTrue(restarted.load())
+            self.assertEqual(restarted.latest().version, 1)
+            self.assertEqual(restarted.latest().data["main"]["offers"], {"count": 3})
+
+    async def test_chat_reads_brand_snapshot_without_crawling(self):
+        store = SnapshotStore(path=None)
+        store.publish({"porsche": {"offers": {"offers": ["Macan lease special"]}}})
+        client = ClaudeClient(snapshots=store)
+
+        payload = await client._build_payload(
+            "Any Macan deals?", 256, "conv", {"vehicle_query": {"make": "porsche"}}
+        )
+
+        self.assertIn("Macan lease special", payload["messages"][-1]["content"])
+
+    async def test_scraped_records_reach_the_prompt(self):
+        store = SnapshotStore(path=None)
+        store.publish({"main": {"website": {"https://www.jackingram.com/new-inventory/": extract_records([INVENTORY_PAGE])}}})
+        client = ClaudeClient(snapshots=store)
+
+        audi = await client._build_payload("Any Q5s?", 256, "conv", {"vehicle_query": {"make": "audi"}})
+        volvo = await client._build_payload("Any XC90s?", 256, "conv", {"vehicle_query": {"make": "volvo"}})
+
+        self.assertIn("- Vehicle: 2025 Audi Q5 Premium, $48,995", audi["messages"][-1]["content"])
+        self.assertIn("- Offer: 0.9% APR on Q3 (expires 10/31/2026)", audi["messages"][-1]["content"])
+        self.assertNotIn("Audi Q5 Premium", volvo["messages"][-1]["content"])
+
+class TestIncrementalScraper(unittest.IsolatedAsyncioTestCase):
+    """Test conditional fetches and streaming card extraction"""
+
+    def setUp(self):
+        self.scraper = IncrementalScraper(chunk_size=16, executor=ThreadPoolExecutor(max_workers=1))
+
+    def tearDown(self):
+        self.scraper.shutdown()
+
+    def test_extracts_cards_from_chunked_malformed_html(self):
+        chunks = [INVENTORY_PAGE[i:i + 7] for i in range(0, len(INVENTORY_PAGE), 7)]
+
+        records = extract_records(chunks)
+
+        self.assertEqual(records["vehicles"], [{
+            "vin": "WA1ABC123", "url": "/new/audi-q5", "title": "2025 Audi Q5 Premium",
+            "price": 48995, "mileage": 12, "year": 2025
+        }])
+        self.assertEqual(records["offers"][0]["title"], "0.9% APR on Q3")
+        self.assertEqual(records["offers"][0]["expires"], "10/31/2026")
+
+    async def test_not_modified_reuses_records(self):
+        session = FakeSession(
+            FakeResponse(200, INVENTORY_PAGE, {"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 08:00:00 GMT"}),
+            FakeResponse(304)
+        )
+
+        first = await self.scraper.scrape(session, "https://example.com/inventory")
+        second = await self.scraper.scrape(session, "https://example.com/inventory")
+
+        self.assertIs(second, first)
+        self.assertEqual(session.headers[1], {
+            "If-None-Match": '"v1"', "If-Modified-Since": "Sat, 17 Oct 2026 08:00:00 GMT"
+        })
+        self.assertEqual(self.scraper.stats()["not_modified"], 1)
+
+    async def test_unchanged_body_skips_parse(self):
+        """Without validators the body is hashed and identical pages aren't re-parsed"""
+        session = FakeSession(FakeResponse(200, INVENTORY_PAGE), FakeResponse(200, INVENTORY_PAGE))
+
+        with patch('src.demo.web_scraper.extract_records', wraps=extract_records) as parse:
+            await self.scraper.scrape(session, "https://example.com/inventory")
+            records = await self.scraper.scrape(session, "https://example.com/inventory")
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(len(records["vehicles"]), 1)
+        self.assertEqual(self.scraper.stats()["unchanged"], 1)
+
+    async def test_changed_body_is_parsed_again(self):
+        updated = INVENTORY_PAGE.replace(b"$48,995", b"$46,500")
+        session = FakeSession(FakeResponse(200, INVENTORY_PAGE), FakeResponse(200, updated))
+
+        await self.scraper.scrape(session, "https://example.com/inventory")
+        records = await self.scraper.scrape(session, "https://example.com/inventory")
+
+        self.assertEqual(records["vehicles"][0]["price"], 46500)
+        self.assertEqual(self.scraper.stats()["parsed"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for offer term parsing and the payment table
+"""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.inventory_db import InventoryDB
+from src.demo.finance_engine import FinanceEngine, parse_offer_terms, amortization_factors
+from src.demo.api_router import APIRouter
+
+class TestOfferTerms(unittest.TestCase):
+    """Test parsing offer descriptions into plans"""
+
+    def test_sample_offers(self):
+        finance = parse_offer_terms({"description": "$2000 Customer Cash + 1.9% APR for 60 months"})
+        lease = parse_offer_terms({"description": "Lease for $299/mo for 36 months, $3999 down"})
+
+        self.assertEqual(finance, [{"kind": "finance", "months": 60, "apr": 1.9, "cash": 2000.0,
+                                    "monthly": None, "due": None}])
+        self.assertEqual(lease[0]["kind"], "lease")
+        self.assertEqual((lease[0]["monthly"], lease[0]["months"], lease[0]["due"]), (299.0, 36, 3999.0))
+        self.assertEqual(parse_offer_terms({"description": "Special lease and finance offers on select models"}), [])
+
+    def test_apr_without_term_covers_standard_terms(self):
+        plans = parse_offer_terms({"description": "0% APR on all 2024 models"})
+        self.assertGreater(len(plans), 1)
+        self.assertEqual({plan["apr"] for plan in plans}, {0.0})
+
+    def test_amortization(self):
+        factors = amortization_factors(np.array([6.0, 0.0]), np.array([60.0, 48.0]))
+        self.assertAlmostEqual(30000 * factors[0], 579.98, places=2)
+        self.assertAlmostEqual(48000 * factors[1], 1000.0)
+
+class TestFinanceEngine(unittest.TestCase):
+    """Test the precomputed payment table"""
+
+    def setUp(self):
+        self.db = InventoryDB()
+        self.engine = FinanceEngine(self.db)
+
+    def test_offer_payments(self):
+        altima = self.engine.payments_for(model="Altima", months=60)
+        rogue = self.engine.payments_for(model="Rogue", down=3999)
+
+        # $26,890 less $2,000 cash at 1.9% beats standard financing
+        self.assertEqual(altima[0]["offer_id"], "NO1")
+        self.assertAlmostEqual(altima[0]["payment"], 435.18, places=2)
+        self.assertEqual((rogue[0]["kind"], rogue[0]["payment"]), ("lease", 299.0))
+        self.assertEqual(self.engine.payments_for(make="audi")[0]["vehicle_id"], "A1")
+
+    def test_down_payments_off_the_grid(self):
+        grid = self.engine.payments_for(vehicle_ids=["M1"], down=5000, months=60)[0]
+        custom = self.engine.payments_for(vehicle_ids=["M1"], down=5500, months=60)[0]
+
+        self.assertLess(custom["payment"], grid["payment"])
+        factor = amortization_factors(np.array([6.9]), np.array([60.0]))[0]
+        self.assertAlmostEqual(custom["payment"], (67800 - 5500) * factor, delta=0.01)
+        self.assertEqual(self.engine.payments_for(model="Rogue", max_payment=1)[:1], [])
+
+    def test_table_follows_inventory_and_offers(self):
+        self.engine.refresh()
+        self.engine.payments_for(model="Rogue")
+        self.assertEqual(self.engine.rebuilds, 1)
+
+        self.db.update_vehicle("N1", price=24890)
+        self.assertAlmostEqual(self.engine.payments_for(model="Altima", months=60)[0]["payment"], 400.21, places=2)
+        self.db.remove_offer("NO2")
+        self.assertNotIn("lease", [row["kind"] for row in self.engine.payments_for(model="Rogue")])
+        self.db.mark_sold("N2")
+        self.assertEqual(self.engine.payments_for(model="Rogue"), [])
+        self.assertEqual(self.engine.rebuilds, 4)
+
+class TestPaymentQuestions(unittest.TestCase):
+    """Test payment questions routed to the table"""
+
+    def setUp(self):
+        self.router = APIRouter()
+
+    def test_down_payment_is_not_a_price(self):
+        intent = self.router.knowledge.intent_matcher.match("What's my payment on a Rogue with $3,000 down for 36 months?")
+
+        self.assertEqual(intent.intent, "financing")
+        self.assertEqual((intent.down_payment, intent.term_months, intent.max_price), (3000.0, 36, None))
+
+    def test_payment_question_is_answered_locally(self):
+        response = self.router.answer_locally("What would my payment be on the Rogue with $3999 down?")
+
+        self.assertEqual(response["source"], "finance")
+        self.assertIn("2024 Nissan Rogue SV: $299.00/mo (Rogue Summer Event lease, 36 months, $3,999 down)",
+                      response["response"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+"""
+Tests for the indexed inventory database
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.inventory_db import InventoryDB
+from src.demo.api_router import APIRouter
+from src.demo.inventory_store import InventoryStore
+from src.demo import inventory_service
+
+FEED_CSV = """VIN,Stock #,Make,Model,Year,Trim,Internet Price,Odometer,Exterior Color,Body,Description
+WA1AAAF70PD000001,AQ5001,Audi,Q5,2023,Premium Plus,"$44,900","8,120 mi",Mythos Black Metallic,SUV,Panoramic sunroof and Bang & Olufsen audio
+WA1AAAF70PD000002,AQ5002,Audi,Q5,2024,S line,"$51,300",12,Glacier White,SUV,Sport package
+1N4BL4DV5PN000003,NA3003,Nissan,Altima,2023,SR,"$24,750","15,400",Super Black,4dr Sedan,Heated seats
+,NX0004,Nissan,Rogue,2024,SV,"$29,990",10,Gun Metallic,SUV,
+"""
+
+def vehicle(vehicle_id, make, model, price, year=2024, color="Black", body_style="suv", mileage=10):
+    return {
+        "id": vehicle_id, "make": make, "model": model, "year": year, "price": price,
+        "color": color, "body_style": body_style, "mileage": mileage, "status": "available"
+    }
+
+class TestInventoryQuery(unittest.TestCase):
+    """Test indexed filters and incremental index updates"""
+
+    def setUp(self):
+        self.db = InventoryDB()
+        self.db.add_vehicle(vehicle("V1", "Volkswagen", "Atlas", 41500, 2023, "Deep Black Pearl"))
+        self.db.add_vehicle(vehicle("V2", "Volkswagen", "Tiguan", 33900, 2022, "Pure White"))
+        self.db.add_vehicle(vehicle("V3", "Volkswagen", "Jetta", 23400, 2024, "Black", "sedan"))
+
+    def ids(self, vehicles):
+        return [car["id"] for car in vehicles]
+
+    def test_combined_range_and_equality_filters(self):
+        """"SUV under $45k, 2023 or newer, in black\""""
+        vehicles = self.db.query(body_style="suv", max_price=45000, min_year=2023, color="black")
+
+        self.assertEqual(self.ids(vehicles), ["V1"])
+
+    def test_make_synonyms_and_value_lists(self):
+        self.assertEqual(self.ids(self.db.query(make="Mercedes-Benz")), ["M1"])
+        self.assertEqual(self.ids(self.db.query(make="vw", model=["atlas", "jetta"])), ["V1", "V3"])
+
+    def test_sorted_and_limited(self):
+        vehicles = self.db.query(make="volkswagen", sort="-price", limit=2)
+
+        self.assertEqual(self.ids(vehicles), ["V1", "V2"])
+
+    def test_repricing_and_sales_update_indexes(self):
+        self.db.update_vehicle("V1", price=46500)
+        self.assertEqual(self.ids(self.db.query(make="vw", max_price=45000)), ["V2", "V3"])
+
+        self.db.mark_sold("V2")
+        self.assertEqual(self.ids(self.db.query(make="vw", status="available")), ["V1", "V3"])
+        self.assertEqual(self.ids(self.db.query(status="sold")), ["V2"])
+
+        self.db.remove_vehicle("V3")
+        self.assertEqual(self.db.get_inventory_count("volkswagen"), {"volkswagen": 2})
+        self.assertEqual(self.db.query(max_price=24000), [])
+
+    def test_router_counts_with_every_filter(self):
+        router = APIRouter()
+        router.inventory = self.db
+        intent = router.knowledge.intent_matcher.match("How many black SUVs under $45k do you have?")
+
+        self.assertEqual(intent.color, "black")
+        self.assertEqual(router.format_inventory_count(intent), "We currently have 1 vehicle available.")
+
+class TestOfferExpiry(unittest.TestCase):
+    """Test the offer indexes and lazy expiry"""
+
+    def setUp(self):
+        self.db = InventoryDB()
+        self.today = datetime.now().date()
+
+    def offer(self, offer_id, days, models=()):
+        return {"id": offer_id, "title": offer_id, "expires": (self.today + timedelta(days=days)).isoformat(),
+                "models": list(models)}
+
+    def later(self, days):
+        """Patch InventoryDB's clock forward by days"""
+        mock = patch('src.demo.inventory_db.datetime')
+        mock_datetime = mock.start()
+        self.addCleanup(mock.stop)
+        mock_datetime.now.return_value = datetime.now() + timedelta(days=days)
+        mock_datetime.strptime = datetime.strptime
+
+    def test_expired_offers_are_evicted_on_every_path(self):
+        """Once the sample offers run out they are evicted, including for the no-make lookup"""
+        self.assertEqual(len(self.db.get_offers()), 4)
+        self.db.add_offer(self.offer("VW1", 90), "Volkswagen")
+        self.later(60)
+
+        self.assertEqual([offer["id"] for offer in self.db.get_offers()], ["VW1"])
+        self.assertEqual(len(self.db.offers), 1)
+        self.assertEqual(len(self.db._expiry_heap), 1)
+
+    def test_brand_and_model_lookups(self):
+        self.db.add_offer(self.offer("P1", 10, ["Macan"]), "Porsche")
+        self.db.add_offer(self.offer("P2", 10), "porsche")
+        self.db.add_offer(self.offer("P3", 10, ["Cayenne"]), "Porsche")
+
+        self.assertEqual([offer["id"] for offer in self.db.get_offers("porsche", "macan")], ["P1", "P2"])
+        self.assertEqual([offer["id"] for offer in self.db.get_offers("Porsche")], ["P1", "P2", "P3"])
+
+    def test_offers_expiring_soon(self):
+        self.db.add_offer(self.offer("A1", 20), "Audi")
+        self.db.add_offer(self.offer("A2", 2), "Audi")
+        self.db.add_offer(self.offer("A3", 0), "Audi")
+        self.db.add_offer(self.offer("N1", 5), "Nissan")
+        # Replacing an offer leaves its old heap entry behind; it must be ignored
+        self.db.add_offer(self.offer("A1", 6), "Audi")
+
+        self.assertEqual([o["id"] for o in self.db.get_expiring_offers(7)], ["A3", "A2", "N1", "A1"])
+        self.assertEqual([o["id"] for o in self.db.get_expiring_offers(3, make="audi")], ["A3", "A2"])
+
+        self.later(3)
+        self.assertEqual([o["id"] for o in self.db.get_offers("audi")], ["AO1", "A1"])
+
+class TestInventoryStore(unittest.TestCase):
+    """Test feed ingestion and SQL-backed queries"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = InventoryStore(os.path.join(self.directory.name, "inventory.sqlite3"), batch_size=2)
+        self.feed = os.path.join(self.directory.name, "feed.csv")
+        with open(self.feed, "w") as f:
+            f.write(FEED_CSV)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_csv_feed_loads_in_batches(self):
+        counts = self.store.load_feed(self.feed)
+
+        self.assertEqual(counts["loaded"], 4)
+        vehicle = self.store.get_vehicle("WA1AAAF70PD000001")
+        self.assertEqual(vehicle["price"], 44900)
+        self.assertEqual(vehicle["mileage"], 8120)
+        self.assertEqual(vehicle["body_style"], "suv")
+        # Without a VIN the stock number identifies the vehicle
+        self.assertEqual(self.store.get_vehicle("NX0004")["model"], "Rogue")
+
+    def test_filters_pagination_and_text_search(self):
+        self.store.load_feed(self.feed)
+
+        vehicles, total = self.store.query({"body_style": "suv", "max_price": 45000, "min_year": 2023, "color": "black"})
+        self.assertEqual((total, [car["vin"] for car in vehicles]), (1, ["WA1AAAF70PD000001"]))
+
+        page, total = self.store.query({"make": ["audi", "nissan"]}, page=2, per_page=3, sort="-price")
+        self.assertEqual((total, [car["price"] for car in page]), (4, [24750]))
+
+        vehicles, _ = self.store.query(text="sunroof")
+        self.assertEqual([car["stock"] for car in vehicles], ["AQ5001"])
+
+    def test_full_feed_removes_missing_vehicles(self):
+        self.store.load_feed(self.feed)
+        feed = os.path.join(self.directory.name, "audi.json")
+        with open(feed, "w") as f:
+            json.dump({
+                "vehicles": [{"vin": "WA1AAAF70PD000002", "make": "Audi", "model": "Q5", "price": 49900}],
+                "offers": [{"id": "AO1", "make": "Audi", "title": "Q5 APR", "expires": "2099-01-01", "models": ["Q5"]}]
+            }, f)
+
+        counts = self.store.load_feed(feed, full=True)
+
+        self.assertEqual(counts["removed"], 1)
+        self.assertEqual(self.store.get_inventory_count(), {"audi": 1, "nissan": 2})
+        self.assertEqual(self.store.get_vehicle("WA1AAAF70PD000002")["price"], 49900)
+        self.assertEqual([offer["id"] for offer in self.store.get_offers("audi", "Q5")], ["AO1"])
+        self.assertEqual([offer["id"] for offer in self.store.get_offers("Audi", "q5")], ["AO1"])
+
+class TestInventoryService(unittest.IsolatedAsyncioTestCase):
+    """Test the /vehicles endpoint the API gateway calls"""
+
+    async def test_vehicles_endpoint_filters_and_paginates(self):
+        store = InventoryStore(":memory:")
+        store.load_records(InventoryDB().get_inventory())
+
+        with patch('src.demo.inventory_service.store', store):
+            client = inventory_service.app.test_client()
+            response = await client.get("/vehicles?body_style=suv&max_price=50000.0&per_page=1&topic=inventory")
+            body = await response.get_json()
+            bad = await client.get("/vehicles?min_year=soon")
+
+        self.assertEqual(body["total"], 2)
+        self.assertEqual(body["pages"], 2)
+        self.assertEqual(body["vehicles"][0]["model"], "Rogue")
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_store_calls_run_off_the_event_loop(self):
+        store = InventoryStore(":memory:")
+        store.load_records(InventoryDB().get_inventory())
+        threads = []
+        lookup = store.get_vehicle
+
+        def get_vehicle(vin):
+            threads.append(threading.current_thread())
+            return lookup(vin)
+
+        with patch('src.demo.inventory_service.store', store), patch.object(store, "get_vehicle", get_vehicle):
+            response = await inventory_service.app.test_client().get("/vehicles/unknown")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(threading.current_thread(), threads)
+
+if __name__ == '__main__':
+    unittest.main()
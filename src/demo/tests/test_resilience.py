@@ -0,0 +1,174 @@
+"""
+Tests for upstream circuit breakers and degraded-mode answers
+"""
+
+import os
+import sys
+import time
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from src.demo.api_router import APIRouter
+from src.demo.singleflight import SingleFlight, flight_key
+from src.demo.fan_out import FanOutScheduler
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+    """Test breaker state transitions"""
+
+    async def fail(self):
+        raise RuntimeError("upstream down")
+
+    async def succeed(self):
+        return {"ok": True}
+
+    async def test_opens_after_repeated_failures(self):
+        breaker = CircuitBreaker("test", min_failures=3, failure_rate=0.5)
+        for _ in range(3):
+            with self.assertRaises(RuntimeError):
+                await breaker.call(self.fail)
+
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            await breaker.call(self.succeed)
+        self.assertEqual(breaker.stats()["rejected"], 1)
+
+    async def test_failure_rate_must_be_reached(self):
+        """Occasional failures among many successes keep the breaker closed"""
+        breaker = CircuitBreaker("test", min_failures=3, failure_rate=0.5)
+        for _ in range(10):
+            await breaker.call(self.succeed)
+        for _ in range(3):
+            with self.assertRaises(RuntimeError):
+                await breaker.call(self.fail)
+
+        self.assertEqual(breaker.state, CLOSED)
+
+    async def test_half_open_probe(self):
+        """After the cooldown one probe is allowed; success closes the breaker"""
+        breaker = CircuitBreaker("test", min_failures=1, open_duration=60)
+        with self.assertRaises(RuntimeError):
+            await breaker.call(self.fail)
+
+        with patch("time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(breaker.state, HALF_OPEN)
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record(True, 0.01)
+            self.assertEqual(breaker.state, CLOSED)
+
+    async def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker("test", min_failures=2, slow_call_threshold=0.01)
+
+        async def slow():
+            await asyncio.sleep(0.02)
+
+        await breaker.call(slow)
+        await breaker.call(slow)
+        self.assertEqual(breaker.state, OPEN)
+
+class TestDegradedMode(unittest.IsolatedAsyncioTestCase):
+    """Test brownout context and local fallback answers"""
+
+    def setUp(self):
+        self.router = APIRouter()
+        self.router.perplexity.get_realtime_info = AsyncMock(return_value={})
+
+    async def test_brownout_uses_local_inventory(self):
+        """With every vehicle backend tripped, context comes from InventoryDB"""
+        self.router.gateway.vehicle_sources = Mock(return_value={})
+
+        context = await self.router.gather_context("Tell me about the Audi Q5", intent=None)
+
+        self.assertTrue(context["brownout"])
+        self.assertEqual(context["sources"]["specs"], "circuit_open")
+        vehicles = context["vehicle_data"]["inventory"]["vehicles"]
+        self.assertEqual([car["model"] for car in vehicles], ["Q5"])
+
+    async def test_claude_failure_falls_back_to_local_answer(self):
+        self.router.gateway.vehicle_sources = Mock(return_value={})
+        self.router.claude.send_message = AsyncMock(return_value={"response": "error", "error": "timeout"})
+
+        result = await self.router.process_request("Tell me about the Nissan Rogue")
+
+        self.assertTrue(result["degraded"])
+        self.assertEqual(result["source"], "local_fallback")
+        self.assertIn("Rogue", result["response"])
+        self.assertIn("(334) 277-5700", result["response"])
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test coalescing of identical concurrent calls"""
+
+    async def test_concurrent_calls_share_one_upstream_call(self):
+        group = SingleFlight("test")
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return {"model": "Q5"}
+
+        results = await asyncio.gather(*(
+            group.do(flight_key("Audi  Q5"), fetch) for _ in range(10)
+        ))
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [{"model": "Q5"}] * 10)
+        self.assertEqual(group.stats()["coalesced"], 9)
+        self.assertEqual(group.stats()["in_flight"], 0)
+
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        group = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        impatient = asyncio.ensure_future(asyncio.wait_for(group.do("key", fetch), 0.01))
+        patient = asyncio.ensure_future(group.do("key", fetch))
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await impatient
+        self.assertEqual(await patient, "done")
+
+    async def test_last_waiter_leaving_cancels_the_call(self):
+        group = SingleFlight("test")
+        breaker = CircuitBreaker("slow")
+        cancelled = asyncio.Event()
+
+        async def fetch():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        scheduler = FanOutScheduler(deadline=0.02)
+        result = await scheduler.run({"specs": group.do("key", lambda: breaker.call(fetch))})
+        await asyncio.sleep(0)
+
+        self.assertEqual(result["sources"], {"specs": "timed_out"})
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(breaker.stats()["failures"], 1)
+        self.assertEqual(group.stats()["in_flight"], 0)
+
+    async def test_errors_reach_every_waiter(self):
+        group = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("503")
+
+        results = await asyncio.gather(group.do("k", fetch), group.do("k", fetch), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(group.stats()["started"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+"""
+Tests for intent extraction and request routing
+"""
+
+import os
+import sys
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+# Add the project root and demo directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.demo.api_router import APIRouter
+from src.demo.knowledge_base import KnowledgeBase
+from src.demo.fan_out import FanOutScheduler
+from src.demo.fuzzy_index import FuzzyIndex, edit_distance
+from src.demo.inventory_db import InventoryDB
+
+class TestIntentMatcher(unittest.TestCase):
+    """Test single-pass entity and intent extraction"""
+
+    def setUp(self):
+        self.matcher = KnowledgeBase().intent_matcher
+
+    def test_vehicle_entities(self):
+        """Make, model, year and price range come out of one message"""
+        intent = self.matcher.match("Any 2024 merc c class under $45k?")
+        self.assertEqual(intent.make, "mercedes")
+        self.assertEqual(intent.model, "C-Class")
+        self.assertEqual(intent.year, 2024)
+        self.assertEqual(intent.max_price, 45000)
+        self.assertEqual(intent.intent, "price")
+
+    def test_model_implies_make(self):
+        """A model name alone resolves its brand"""
+        intent = self.matcher.match("I'd like to test drive an XC 90")
+        self.assertEqual(intent.make, "volvo")
+        self.assertEqual(intent.model, "XC90")
+        self.assertEqual(intent.intent, "test_drive")
+
+    def test_price_range_and_year_floor(self):
+        """Ranges and "or newer" qualifiers set both ends correctly"""
+        intent = self.matcher.match("SUV between $30,000 and $40k, 2022 or newer")
+        self.assertEqual(intent.body_style, "suv")
+        self.assertEqual((intent.min_price, intent.max_price), (30000, 40000))
+        self.assertEqual(intent.min_year, 2022)
+        self.assertIsNone(intent.year)
+
+    def test_cheap_intents(self):
+        """Date/time, hours, location and inventory counts are recognized"""
+        cases = {
+            "what's the date today?": "date_time",
+            "What time do you open Saturday?": "hours",
+            "where are you located": "location",
+            "How many Audis do you have in stock?": "inventory_count",
+            "Any updates on the Q5?": None
+        }
+        for message, expected in cases.items():
+            self.assertEqual(self.matcher.match(message).intent, expected, message)
+
+    def test_dates_of_other_things_are_not_today(self):
+        """Only a question about today's date is answered with it"""
+        for message in ["What is the date of the sales event?", "What's the date for the Porsche track day?",
+                        "What is the date the Rogue lease offer ends?"]:
+            self.assertNotIn("date_time", self.matcher.match(message).intents, message)
+        for message in ["What is the date?", "what's today's date", "What day is it today?"]:
+            self.assertEqual(self.matcher.match(message).intent, "date_time", message)
+
+    def test_how_many_only_counts_stock(self):
+        """"How many" about anything but stock is not an inventory count"""
+        for message in ["How many miles does the Cayenne get?", "How many mpg does the Rogue get?",
+                        "How many seats does the Atlas have?"]:
+            self.assertNotIn("inventory_count", self.matcher.match(message).intents, message)
+        for message in ["How many Rogues are there?", "how many used SUVs under $30k", "How many do you have?"]:
+            self.assertIn("inventory_count", self.matcher.match(message).intents, message)
+
+    def test_open_and_close_outside_schedules(self):
+        """"Open" and "close" only mean store hours in schedule questions"""
+        for message in ["I want an SUV close to $40k", "Are you open to trade-ins on a Rogue?",
+                        "Can I test drive it in an hour?", "Is the sunroof open or closed?"]:
+            self.assertNotIn("hours", self.matcher.match(message).intents, message)
+        for message in ["Are you open on Sunday?", "what are your service hours", "is the dealership open?",
+                        "When does the service department close?"]:
+            self.assertEqual(self.matcher.match(message).intent, "hours", message)
+
+class TestFuzzyIndex(unittest.TestCase):
+    """Test typo-tolerant make/model lookup"""
+
+    def setUp(self):
+        self.knowledge = KnowledgeBase()
+        self.matcher = self.knowledge.intent_matcher
+
+    def test_misspelled_models_resolve(self):
+        for message, expected in {
+            "Is the rouge available?": ("nissan", "Rogue"),
+            "price on a cayene": ("porsche", "Cayenne"),
+            "mercedes gle450 lease": ("mercedes", "GLE"),
+            "volkswagon atlas deals": ("volkswagen", "Atlas"),
+            "Do you have the ID4?": ("volkswagen", "ID.4")
+        }.items():
+            intent = self.matcher.match(message)
+            self.assertEqual((intent.make, intent.model), expected, message)
+
+    def test_ordinary_words_are_not_corrected(self):
+        """Words already recognized (like the color "gold") and short words need exact matches"""
+        self.knowledge.fuzzy_index.add("Golf", "model", "volkswagen")
+        intent = self.matcher.match("Any gold cars under 30k?")
+        self.assertIsNone(intent.model)
+        self.assertEqual(intent.color, "gold")
+
+    def test_everyday_words_and_places_are_not_vehicles(self):
+        """Typos are only corrected in vehicle questions, and never at the start of a word"""
+        for message in ["Is the audio system good?", "Do you deliver to Macon?", "Is that color in vogue?",
+                        "Do you offer a class for new drivers?", "Can I bring it around the bend?"]:
+            intent = self.matcher.match(message)
+            self.assertEqual((intent.make, intent.model), (None, None), message)
+        self.assertEqual(self.matcher.match("any nisan deals").make, "nissan")
+
+    def test_trims_need_a_make_or_model(self):
+        """Trim names from inventory only resolve next to their make or model"""
+        matcher = APIRouter().knowledge.intent_matcher
+        for message in ["is the SR good", "what is a premium plus"]:
+            intent = matcher.match(message)
+            self.assertEqual((intent.make, intent.model), (None, None), message)
+        intent = matcher.match("Nissan SR price")
+        self.assertEqual((intent.make, intent.model), ("nissan", "Altima"))
+
+    def test_transposition_is_one_edit(self):
+        self.assertEqual(edit_distance("rouge", "rogue", 2), 1)
+        self.assertEqual(edit_distance("cayenne", "macan", 2), 3)
+
+    def test_index_follows_inventory_changes(self):
+        index = FuzzyIndex()
+        db = InventoryDB(search_index=index)
+        db.add_vehicle({"id": "P1", "make": "Porsche", "model": "Panamera", "trim": "4S", "price": 110000})
+        db.add_vehicle({"id": "P2", "make": "Porsche", "model": "Panamera", "trim": "GTS", "price": 140000})
+
+        self.assertEqual(index.search("panamara")[0].value, "Panamera")
+        self.assertEqual([car["id"] for car in db.get_inventory("porsche", "panamara")], ["P1", "P2"])
+
+        db.remove_vehicle("P1")
+        self.assertEqual(index.search("panamara")[0].value, "Panamera")
+        db.remove_vehicle("P2")
+        self.assertEqual(index.search("panamara"), [])
+
+class TestEarlyRouting(unittest.IsolatedAsyncioTestCase):
+    """Test that cheap intents never reach the upstream clients"""
+
+    def setUp(self):
+        self.router = APIRouter()
+        self.router.claude.send_message = AsyncMock()
+        self.router.gateway.vehicle_sources = Mock(return_value={})
+        self.router.perplexity.get_realtime_info = AsyncMock()
+
+    def assert_no_upstream_calls(self):
+        self.router.claude.send_message.assert_not_called()
+        self.router.gateway.vehicle_sources.assert_not_called()
+        self.router.perplexity.get_realtime_info.assert_not_called()
+
+    async def test_date_time_is_answered_locally(self):
+        result = await self.router.process_request("What is the date today?")
+        self.assertEqual(result["source"], "realtime")
+        self.assert_no_upstream_calls()
+
+    async def test_inventory_count_is_answered_locally(self):
+        result = await self.router.process_request("How many Nissan vehicles are in stock?")
+        self.assertEqual(result["source"], "inventory")
+        self.assertIn("Nissan", result["response"])
+        self.assert_no_upstream_calls()
+
+    async def test_hours_are_answered_locally(self):
+        result = await self.router.process_request("when do you close?")
+        self.assertIn("Sales Hours", result["response"])
+        self.assert_no_upstream_calls()
+
+    def test_hours_with_a_vehicle_question_goes_to_the_model(self):
+        """Dealership info is only answered locally when nothing else is asked"""
+        for message in ["Are you open to trade-ins on a Rogue?", "I want an SUV close to $40k",
+                        "What are your hours, and is the Rogue under $30k?"]:
+            self.assertIsNone(self.router.answer_locally(message), message)
+        self.assertEqual(self.router.answer_locally("Audi service hours")["source"], "knowledge_base")
+
+    def test_how_many_miles_goes_to_the_model(self):
+        self.assertIsNone(self.router.answer_locally("How many miles does the Cayenne get?"))
+
+    def test_vehicle_params_are_scalar(self):
+        """Search parameters can be sent upstream as query strings"""
+        params = self.router.extract_vehicle_params("Porsche Macan around $70k")
+        self.assertEqual(params["make"], "porsche")
+        self.assertEqual(params["model"], "Macan")
+        self.assertEqual(params["topic"], "price")
+        for value in params.values():
+            self.assertIsInstance(value, (str, int, float))
+
+class TestFanOut(unittest.IsolatedAsyncioTestCase):
+    """Test deadline-bounded enrichment fan-out"""
+
+    async def test_sources_run_concurrently(self):
+        """Total latency is the slowest source, not the sum"""
+        async def source(value):
+            await asyncio.sleep(0.05)
+            return value
+
+        scheduler = FanOutScheduler(deadline=1)
+        result = await scheduler.run({name: source(name) for name in ("a", "b", "c")})
+
+        self.assertEqual(result["results"], {"a": "a", "b": "b", "c": "c"})
+        self.assertLess(result["elapsed_ms"], 120)
+
+    async def test_deadline_returns_partial_results(self):
+        """Stragglers are cancelled and reported, failures are isolated"""
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def broken():
+            raise RuntimeError("upstream down")
+
+        async def fast():
+            return {"vin": "123"}
+
+        scheduler = FanOutScheduler(deadline=0.05)
+        result = await scheduler.run({"fast": fast(), "slow": slow(), "broken": broken()})
+
+        self.assertEqual(result["results"], {"fast": {"vin": "123"}})
+        self.assertEqual(result["sources"], {"fast": "arrived", "slow": "timed_out", "broken": "failed"})
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(scheduler.stats()["sources"]["slow"]["timed_out"], 1)
+
+    async def test_router_records_sources(self):
+        """Chat responses say which enrichment sources made it in time"""
+        async def slow_specs():
+            await asyncio.sleep(5)
+
+        router = APIRouter()
+        router.fan_out.deadline = 0.05
+        router.gateway.vehicle_sources = Mock(return_value={
+            "inventory": AsyncMock(return_value={"count": 2})(),
+            "specs": slow_specs(),
+            "safety": AsyncMock(side_effect=RuntimeError("503"))()
+        })
+        router.perplexity.get_realtime_info = AsyncMock(return_value={"response": "news"})
+        router.claude.send_message = AsyncMock(return_value={"response": "Here you go", "usage": {}})
+
+        result = await router.process_request("Tell me about the Nissan Rogue")
+
+        self.assertEqual(result["sources"], {
+            "inventory": "arrived", "specs": "timed_out", "safety": "failed", "perplexity": "arrived"
+        })
+        context = router.claude.send_message.call_args.kwargs["context"]
+        self.assertEqual(context["vehicle_data"], {"inventory": {"count": 2}})
+
+if __name__ == '__main__':
+    unittest.main()
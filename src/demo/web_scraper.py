@@ -0,0 +1,335 @@
+"""
+Incremental, conditional scraping of dealership pages into structured records
+"""
+
+import re
+import codecs
+import asyncio
+import hashlib
+import logging
+from html.parser import HTMLParser
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import aiohttp
+from config import SCRAPE_WORKERS, SCRAPE_CHUNK_SIZE, SCRAPE_MAX_PAGE_BYTES
+
+# Card container classes and the record list they go into
+CARD_CLASSES = {
+    "vehicle-card": "vehicles",
+    "offer-card": "offers",
+    "special-offer": "offers"
+}
+
+# Field classes inside a card and the record field they fill
+FIELD_CLASSES = {
+    "title": "title",
+    "vehicle-title": "title",
+    "offer-title": "title",
+    "price": "price",
+    "final-price": "price",
+    "sale-price": "price",
+    "msrp": "msrp",
+    "year": "year",
+    "make": "make",
+    "model": "model",
+    "trim": "trim",
+    "stock": "stock",
+    "stock-number": "stock",
+    "vin": "vin",
+    "mileage": "mileage",
+    "exterior-color": "color",
+    "expiration-date": "expires",
+    "offer-details": "details",
+    "disclaimer": "disclaimer"
+}
+
+# data-* attributes on cards that map straight to record fields
+DATA_ATTRIBUTES = {
+    "data-vin": "vin",
+    "data-year": "year",
+    "data-make": "make",
+    "data-model": "model",
+    "data-trim": "trim",
+    "data-price": "price",
+    "data-stock": "stock",
+    "data-expires": "expires"
+}
+
+NUMERIC_FIELDS = ("price", "msrp", "mileage")
+
+VOID_ELEMENTS = frozenset(
+    "area base br col embed hr img input link meta param source track wbr".split()
+)
+
+_YEAR = re.compile(r"\b(19[89]\d|20[0-4]\d)\b")
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+class CardExtractor(HTMLParser):
+    """
+    Streaming extractor for vehicle-card and offer cards.
+
+    Pages are fed in chunks and no document tree is built: only the text of
+    the configured field elements inside card containers is kept, so memory
+    stays proportional to the extracted records rather than the page.
+    Unclosed elements are tolerated by unwinding the open-tag stack to the
+    matching start tag.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records: Dict[str, List[Dict[str, Any]]] = {"vehicles": [], "offers": []}
+        self._stack: List[str] = []
+        # (kind, depth, fields) of the card being read
+        self._card: Optional[Tuple[str, int, Dict[str, Any]]] = None
+        # Open field elements inside the card: [field, depth, text parts]
+        self._fields: List[List[Any]] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in VOID_ELEMENTS:
+            return
+        self._stack.append(tag)
+        attributes = dict(attrs)
+        classes = (attributes.get("class") or "").split()
+
+        if self._card is None:
+            kind = next((CARD_CLASSES[c] for c in classes if c in CARD_CLASSES), None)
+            if kind:
+                fields = {
+                    DATA_ATTRIBUTES[name]: value
+                    for name, value in attributes.items() if name in DATA_ATTRIBUTES and value
+                }
+                self._card = (kind, len(self._stack), fields)
+            return
+
+        fields = self._card[2]
+        for name, value in attributes.items():
+            if name in DATA_ATTRIBUTES and value:
+                fields.setdefault(DATA_ATTRIBUTES[name], value)
+        if tag == "a" and attributes.get("href"):
+            fields.setdefault("url", attributes["href"])
+
+        field = next((FIELD_CLASSES[c] for c in classes if c in FIELD_CLASSES), None)
+        if field:
+            self._fields.append([field, len(self._stack), []])
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag not in VOID_ELEMENTS:
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in self._stack:
+            return
+        # Implicitly close anything left open inside this element
+        while self._stack:
+            depth = len(self._stack)
+            while self._fields and self._fields[-1][1] >= depth:
+                self._close_field()
+            if self._card is not None and self._card[1] >= depth:
+                self._close_card()
+            if self._stack.pop() == tag:
+                break
+
+    def handle_data(self, data: str) -> None:
+        if self._fields:
+            self._fields[-1][2].append(data)
+
+    def _close_field(self) -> None:
+        field, _, parts = self._fields.pop()
+        text = " ".join("".join(parts).split())
+        if text and self._card is not None:
+            self._card[2].setdefault(field, text)
+
+    def _close_card(self) -> None:
+        kind, _, fields = self._card
+        self._card = None
+        if fields:
+            self.records[kind].append(normalize_record(fields))
+
+    def close(self) -> None:
+        super().close()
+        while self._fields:
+            self._close_field()
+        if self._card is not None:
+            self._close_card()
+
+
+def normalize_record(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert extracted text fields to typed values"""
+    record = dict(fields)
+    for field in NUMERIC_FIELDS:
+        if isinstance(record.get(field), str):
+            match = _NUMBER.search(record[field])
+            record[field] = float(match.group().replace(",", "")) if match else None
+            if record[field] is not None and record[field].is_integer():
+                record[field] = int(record[field])
+
+    year = record.get("year") or record.get("title")
+    if isinstance(year, str):
+        match = _YEAR.search(year)
+        if match:
+            record["year"] = int(match.group())
+    return record
+
+
+def extract_records(chunks: List[bytes], encoding: str = "utf-8") -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Extract vehicle and offer records from a page's raw chunks
+
+    Runs in a worker process, so it only takes and returns plain data.
+
+    Args:
+        chunks: Page body as received, in order
+        encoding: Character encoding of the body
+
+    Returns:
+        {"vehicles": [...], "offers": [...]}
+    """
+    parser = CardExtractor()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.records
+
+
+def format_records(pages: Dict[str, Dict[str, List[Dict[str, Any]]]], brand: Optional[str] = None,
+                   limit: int = 20) -> str:
+    """
+    Scraped vehicle and offer records as prompt lines
+
+    Args:
+        pages: Records keyed by page URL, as published in the site snapshot
+        brand: Only vehicles whose make or title names this brand
+        limit: Maximum number of lines
+
+    Returns:
+        One line per record, or "" when there are none
+    """
+    lines = []
+    for records in pages.values():
+        for vehicle in records.get("vehicles", []):
+            name = vehicle.get("title") or " ".join(
+                str(vehicle[field]) for field in ("year", "make", "model", "trim") if vehicle.get(field)
+            )
+            if brand and brand not in f"{vehicle.get('make', '')} {name}".lower():
+                continue
+            price = f", ${vehicle['price']:,}" if isinstance(vehicle.get("price"), (int, float)) else ""
+            lines.append(f"- Vehicle: {name}{price}")
+        for offer in records.get("offers", []):
+            details = f": {offer['details']}" if offer.get("details") else ""
+            expires = f" (expires {offer['expires']})" if offer.get("expires") else ""
+            lines.append(f"- Offer: {offer.get('title', '')}{details}{expires}")
+    return "\n".join(lines[:limit])
+
+
+class _PageState:
+    """Validators and last extraction for one URL"""
+
+    __slots__ = ("etag", "last_modified", "digest", "records")
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], digest: str, records: Dict[str, Any]):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.records = records
+
+
+class IncrementalScraper:
+    """
+    Fetches pages with conditional requests and re-parses only what changed.
+
+    Each URL's ETag and Last-Modified are sent back on the next fetch, so an
+    unchanged page costs a 304 with no body. Servers that don't support
+    validators still send the body, but it is hashed while streaming and the
+    parse is skipped when the hash matches the last one. Changed pages are
+    parsed in a process pool so the event loop is never blocked by HTML
+    parsing.
+    """
+
+    def __init__(
+        self,
+        workers: int = SCRAPE_WORKERS,
+        chunk_size: int = SCRAPE_CHUNK_SIZE,
+        max_page_bytes: int = SCRAPE_MAX_PAGE_BYTES,
+        executor: Optional[Executor] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_page_bytes = max_page_bytes
+        self._executor = executor
+        self._pages: Dict[str, _PageState] = {}
+        self._counts = {"not_modified": 0, "unchanged": 0, "parsed": 0, "errors": 0}
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def scrape(self, session: aiohttp.ClientSession, url: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the current records for a page
+
+        Args:
+            session: Pooled session to fetch with
+            url: Page URL
+
+        Returns:
+            {"vehicles": [...], "offers": [...]} extracted from the page
+        """
+        state = self._pages.get(url)
+        headers = {}
+        if state is not None:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and state is not None:
+                    self._counts["not_modified"] += 1
+                    return state.records
+                response.raise_for_status()
+
+                digest = hashlib.sha256()
+                chunks: List[bytes] = []
+                size = 0
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    digest.update(chunk)
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_page_bytes:
+                        self.logger.warning(f"Truncated {url} at {size} bytes")
+                        break
+                encoding = response.charset or "utf-8"
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception:
+            self._counts["errors"] += 1
+            raise
+
+        hexdigest = digest.hexdigest()
+        if state is not None and state.digest == hexdigest:
+            self._counts["unchanged"] += 1
+            self._pages[url] = _PageState(etag, last_modified, hexdigest, state.records)
+            return state.records
+
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(self._pool(), extract_records, chunks, encoding)
+        self._counts["parsed"] += 1
+        self._pages[url] = _PageState(etag, last_modified, hexdigest, records)
+        return records
+
+    def shutdown(self) -> None:
+        """Stop the parser worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get conditional-fetch and parse counters"""
+        return {"pages": len(self._pages), **self._counts}